@@ -4,6 +4,9 @@ class BaseAlignment:
         self.mpi=None
     def Run(self,cluster):
         raise NotImplemented()
+    def RunBatch(self,clusters):
+        #align a list of clusters, aligners that can amortize work across clusters override this
+        return [self.Run(c) for c in clusters]
     @property
     def mpi(self):
         return self._mpi
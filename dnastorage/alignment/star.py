@@ -0,0 +1,103 @@
+from dnastorage.alignment.basealignment import *
+import Levenshtein as ld
+import multiprocessing
+import random
+
+"""
+In-process center-star multiple sequence alignment, no temporary files or external binaries.
+The strand with the smallest total edit distance to the rest of the cluster is picked as the center,
+every other strand is aligned pairwise to the center (optimal edit path from Levenshtein.editops),
+and the pairwise alignments are merged into one MSA by padding the insertion slots between center
+columns to the widest insertion any strand made there.
+"""
+
+def _center_index(strands):
+    best_index=0
+    best_distance=None
+    for i,s in enumerate(strands):
+        distance = sum(ld.distance(s,t) for j,t in enumerate(strands) if j!=i)
+        if best_distance is None or distance<best_distance:
+            best_index=i
+            best_distance=distance
+    return best_index
+
+def _align_to_center(center,strand):
+    #columns[i] is the base of strand aligned to center[i] ('-' if deleted), inserts[i] are bases inserted before center[i]
+    columns = ["-"]*len(center)
+    inserts = [[] for _ in range(len(center)+1)]
+    i=0
+    j=0
+    for op,op_i,op_j in ld.editops(center,strand):
+        while i<op_i: #matching run up to the edit
+            columns[i]=strand[j]
+            i+=1
+            j+=1
+        if op=="replace":
+            columns[i]=strand[j]
+            i+=1
+            j+=1
+        elif op=="delete":
+            i+=1
+        else:
+            inserts[i].append(strand[j])
+            j+=1
+    while i<len(center):
+        columns[i]=strand[j]
+        i+=1
+        j+=1
+    inserts[len(center)].extend(strand[j:])
+    return columns,inserts
+
+def center_star_alignment(strands):
+    #strands is a list of DNA strings, returns the list of gapped strings in the same order
+    if len(strands)<2:
+        return list(strands)
+    center = strands[_center_index(strands)]
+    pairwise = [_align_to_center(center,s) for s in strands]
+    widths = [max(len(inserts[i]) for _,inserts in pairwise) for i in range(len(center)+1)]
+    aligned=[]
+    for columns,inserts in pairwise:
+        row=[]
+        for i in range(len(center)+1):
+            if widths[i]>0:
+                row.append("".join(inserts[i]).ljust(widths[i],"-"))
+            if i<len(center):
+                row.append(columns[i])
+        aligned.append("".join(row))
+    return aligned
+
+"""
+num_strands: maximum number of strands to use in multi sequence alignment
+processes: worker processes used by RunBatch, only the DNA strings are shipped to the workers
+"""
+class CenterStarAlign(BaseAlignment):
+    def __init__(self,num_strands,processes=1):
+        BaseAlignment.__init__(self)
+        self._num_strands = num_strands
+        self._processes = processes
+
+    def _sample(self,cluster):
+        if len(cluster)>self._num_strands:
+            return random.choices(cluster,k=self._num_strands)
+        return cluster
+
+    def _write_back(self,aligned_strands,cluster_to_align):
+        aligned_cluster = []
+        for aligned_strand,strand in zip(aligned_strands,cluster_to_align):
+            strand.dna_strand=aligned_strand
+            aligned_cluster.append(strand) #write into the dna strands their aligned versions
+        return aligned_cluster
+
+    def Run(self, cluster):
+        cluster_to_align = self._sample(cluster)
+        return self._write_back(center_star_alignment([s.dna_strand for s in cluster_to_align]),cluster_to_align)
+
+    def RunBatch(self, clusters):
+        to_align = [self._sample(c) for c in clusters]
+        dna = [[s.dna_strand for s in c] for c in to_align]
+        if self._processes>1 and len(dna)>1:
+            with multiprocessing.Pool(self._processes) as pool:
+                aligned = pool.map(center_star_alignment,dna,chunksize=max(1,len(dna)//(self._processes*4)))
+        else:
+            aligned = [center_star_alignment(d) for d in dna]
+        return [self._write_back(a,c) for a,c in zip(aligned,to_align)]
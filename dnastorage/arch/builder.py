@@ -3,8 +3,9 @@ from dnastorage.exceptions import * #import special exceptions
 from dnastorage.fi.probes import * #probes import
 
 
-#muscle alignment import
+#alignment imports
 from dnastorage.alignment.muscle import * 
+from dnastorage.alignment.star import *
 
 #imports for consolidators
 from dnastorage.codec.DNAConsolidatemodels import *
@@ -73,14 +74,20 @@ def ReedSolomon_Base4_Pipeline(pf,**kwargs):
     lsh_sim = kwargs.get("lsh_sim",0.5) #simularity of strands
     lsh_sig_samples = kwargs.get("lsh_sig_samples",4) #samples to make on signatures
     lsh_sample_length = kwargs.get("lsh_sample_length",100000)  #length of strand to consider when hashing
+    lsh_workers = kwargs.get("lsh_workers",1) #workers verifying candidate pairs, 0 uses every core
     align_num_strands = kwargs.get("align_num_strands",15)
+    aligner = kwargs.get("aligner","star") #"star" aligns in process, "muscle" calls out to the muscle binary
+    align_processes = kwargs.get("align_processes",1) #worker processes for the in process aligner
     cw_consolidator = SimpleMajorityVote()
     if using_DNA_consolidator:
         if using_DNA_consolidator=="lsh":
-            cluster = LocalitySensitiveHashCluster(lsh_m_sigs,lsh_kmer,lsh_sig_samples,int(1/(lsh_sim**lsh_sig_samples)),lsh_sample_length)
+            cluster = LocalitySensitiveHashCluster(lsh_m_sigs,lsh_kmer,lsh_sig_samples,int(1/(lsh_sim**lsh_sig_samples)),lsh_sample_length,workers=lsh_workers)
         if using_DNA_consolidator=="ideal":
             cluster = IdealCluster()
-        align = MuscleAlign(align_num_strands)
+        if aligner=="muscle":
+            align = MuscleAlign(align_num_strands)
+        else:
+            align = CenterStarAlign(align_num_strands,processes=align_processes)
         dna_consolidator = BasicDNAClusterModel(cluster,align,name=pipeline_title)
   
 
@@ -153,6 +160,7 @@ def Basic_Hedges_Pipeline(pf,**kwargs):
     hedges_pad_bits=kwargs.get("hedges_pad",8)
     hedges_previous = kwargs.get("hedge_prev_bits",8)
     hedges_guesses = kwargs.get("hedges_guesses",100000)
+    hedges_threads = kwargs.get("hedges_threads",1) #native threads for batched hedges decoding, 0 uses every core
     try_reverse = kwargs.get("try_reverse",False) #should the reverse be tried, for hedges decoding, set this if primer3/primer5 are not used
     
 
@@ -163,7 +171,10 @@ def Basic_Hedges_Pipeline(pf,**kwargs):
     lsh_sim = kwargs.get("lsh_sim",0.5) #simularity of strands
     lsh_sig_samples = kwargs.get("lsh_sig_samples",4) #samples to make on signatures
     lsh_sample_length = kwargs.get("lsh_sample_length",100000)  #length of strand to consider when hashing
+    lsh_workers = kwargs.get("lsh_workers",1) #workers verifying candidate pairs, 0 uses every core
     align_num_strands = kwargs.get("align_num_strands",15)
+    aligner = kwargs.get("aligner","star") #"star" aligns in process, "muscle" calls out to the muscle binary
+    align_processes = kwargs.get("align_processes",1) #worker processes for the in process aligner
     cw_consolidator = SimpleMajorityVote()
 
 
@@ -172,10 +183,13 @@ def Basic_Hedges_Pipeline(pf,**kwargs):
     
     if using_DNA_consolidator:
         if using_DNA_consolidator=="lsh":
-            cluster = LocalitySensitiveHashCluster(lsh_m_sigs,lsh_kmer,lsh_sig_samples,int(1/(lsh_sim**lsh_sig_samples)),lsh_sample_length)
+            cluster = LocalitySensitiveHashCluster(lsh_m_sigs,lsh_kmer,lsh_sig_samples,int(1/(lsh_sim**lsh_sig_samples)),lsh_sample_length,workers=lsh_workers)
         if using_DNA_consolidator=="ideal":
             cluster = IdealCluster()
-        align = MuscleAlign(align_num_strands)
+        if aligner=="muscle":
+            align = MuscleAlign(align_num_strands)
+        else:
+            align = CenterStarAlign(align_num_strands,processes=align_processes)
         dna_consolidator = BasicDNAClusterModel(cluster,align,name=pipeline_title)
     else:
         dna_consolidator=None
@@ -196,7 +210,7 @@ def Basic_Hedges_Pipeline(pf,**kwargs):
         out_pipeline=(BaseOuterCodec(int(math.ceil(blockSizeInBytes/strandSizeInBytes))),)
 
   
-    hedges = FastHedgesPipeline(rate=hedges_rate,pad_bits=hedges_pad_bits,prev_bits=hedges_previous,try_reverse=try_reverse,guess_limit=hedges_guesses)
+    hedges = FastHedgesPipeline(rate=hedges_rate,pad_bits=hedges_pad_bits,prev_bits=hedges_previous,try_reverse=try_reverse,guess_limit=hedges_guesses,decode_threads=hedges_threads)
 
     if crc_type=="strand": crc = CRC8()
     elif crc_type=="index":
@@ -1,8 +1,68 @@
 import numpy as np
 import Levenshtein as ld
+import multiprocessing
 from dnastorage.cluster.basecluster import *
 from dnastorage.util.mpi_utils import *
 
+try: #rapidfuzz backs newer python-Levenshtein releases and gives bounded, multithreaded pairwise distances
+    from rapidfuzz import process as rf_process
+    from rapidfuzz.distance import Levenshtein as rf_levenshtein
+except ImportError:
+    rf_process = None
+
+
+def _pair_distances(pairs):
+    return [ld.distance(a,b) for a,b in pairs]
+
+def bounded_pair_distances(a,b,cutoff,workers=1):
+    '''
+    Edit distance of a[i] and b[i] for every i. Distances above cutoff are only known to be above it, the
+    comparison stops early once the cutoff is exceeded (when rapidfuzz is available).
+    '''
+    if len(a)==0: return np.zeros(0,dtype=np.int64)
+    if rf_process is not None:
+        return np.asarray(rf_process.cpdist(a,b,scorer=rf_levenshtein.distance,score_cutoff=cutoff,workers=workers if workers>0 else -1),dtype=np.int64)
+    pairs = list(zip(a,b))
+    if workers==1 or len(pairs)<1000:
+        return np.array(_pair_distances(pairs),dtype=np.int64)
+    workers = workers if workers>0 else multiprocessing.cpu_count()
+    chunk = -(-len(pairs)//workers)
+    with multiprocessing.Pool(workers) as pool:
+        distances = pool.map(_pair_distances,[pairs[i:i+chunk] for i in range(0,len(pairs),chunk)])
+    return np.array([d for c in distances for d in c],dtype=np.int64)
+
+'''
+Array backed union-find with path halving and union by size, merges never recurse.
+'''
+class UnionFind:
+    def __init__(self,n):
+        self._parent = list(range(n))
+        self._size = [1]*n
+
+    def find(self,x):
+        parent = self._parent
+        while parent[x]!=x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self,x,y):
+        x = self.find(x)
+        y = self.find(y)
+        if x==y: return x
+        if self._size[x]<self._size[y]:
+            x,y = y,x
+        self._parent[y] = x
+        self._size[x] += self._size[y]
+        return x
+
+    def groups(self):
+        #list of index lists, one per set
+        roots = np.array([self.find(i) for i in range(len(self._parent))],dtype=np.int64)
+        order = np.argsort(roots,kind="stable")
+        splits = np.flatnonzero(np.diff(roots[order]))+1
+        return [g.tolist() for g in np.split(order,splits)] if len(order)>0 else []
+
 '''
 Clusters strands based on locality sensitive hashing based on algorithm from ***Low cost DNA data storage using
 photolithographic synthesis and advanced information reconstruction and error correction***.
@@ -12,11 +72,15 @@ k: kmer length to calculate shingles for
 k_lsh: number of min hashes to use per band
 ell_lsh: total number of bands to try out
 l: sub-strand length to use for calculating kmers
+workers: threads/processes used to verify candidate pairs, 0 uses every core
 '''
 class LocalitySensitiveHashCluster(BaseCluster):
     base_table = {"A":0,"G":1,"C":2,"T":3}
-    def __init__(self,m,k,k_lsh,ell_lsh,l):
+    code_table = bytes("AGCT".index(chr(c)) if chr(c) in "AGCT" else 4 for c in range(256)) #bytes.translate table for 2-bit base codes, 4 marks anything else
+    gather_budget = 1<<24 #max entries of the (m x kmers) gather done per chunk of strands
+    def __init__(self,m,k,k_lsh,ell_lsh,l,workers=1):
         BaseCluster.__init__(self)
+        self._workers = workers
         self._m = m
         self._k = k
         self._k_lsh = k_lsh
@@ -36,62 +100,88 @@ class LocalitySensitiveHashCluster(BaseCluster):
             strands = object_gather(strands,self.mpi)
         #let rank 0 process bands for each strand
         if not self.is_mpi_master: return []
-        clusters={} #need to make sure clusters do not have any repeats
-        for pairs in self.calculate_pairs(strands):
-            for pair in pairs:
-                p0 = min(pair,key=id)
-                p1 = max(pair,key=id)
-                if p0  in clusters:
-                    clusters[p0].add(p1)
-                if p1 in clusters:
-                    clusters[p1].add(p0)
-                if p0 not in clusters and p1 not in clusters:
-                    clusters[p0]=set([p0])
-        #merge clusters
-        dead_set=set([])
-        return_list=[]
-        for c in clusters:
-            if c in dead_set: continue
-            merged_cluster=set([])
-            self._hcluster(clusters,c,dead_set,merged_cluster)
-            if len(merged_cluster)>3: return_list.append(list(merged_cluster))
-        return return_list
-
-
-    def _hcluster(self,clusters,c,dead_set,merged_cluster):
-        merged_cluster.add(c)
-        if c in dead_set or c not in clusters: return
-        dead_set.add(c)
-        for strand in clusters[c]:
-            if strand is c: continue
-            self._hcluster(clusters,strand,dead_set,merged_cluster)
-
-    def calculate_pairs(self,strand_and_sigs):
+        dna_strands = [s for s,_ in strands]
+        signatures = np.array([min_hashes for _,min_hashes in strands],dtype=np.int64)
+        clusters = UnionFind(len(dna_strands))
+        verified = {} #(representative,member) -> passed, the same pair collides in many bands
+        for representatives,members in self.calculate_pairs(signatures):
+            to_check = []
+            for r,m in zip(representatives.tolist(),members.tolist()):
+                if (r,m) in verified:
+                    if verified[(r,m)]: clusters.union(r,m)
+                elif clusters.find(r)!=clusters.find(m): #already merged by an earlier band, no need to verify
+                    to_check.append((r,m))
+            for (r,m),passed in zip(to_check,self.verify_pairs(dna_strands,to_check)):
+                verified[(r,m)] = passed
+                if passed: clusters.union(r,m)
+        return [[dna_strands[i] for i in c] for c in clusters.groups() if len(c)>3]
+
+    def verify_pairs(self,dna_strands,pairs):
+        #pair (r,m) passes when the edit distance is below 0.338 of the representative's length
+        if len(pairs)==0: return []
+        a = [dna_strands[r].dna_strand for r,_ in pairs]
+        b = [dna_strands[m].dna_strand for _,m in pairs]
+        thresholds = 0.338*np.array([len(x) for x in a])
+        cutoff = int(np.ceil(thresholds.max()))
+        return (bounded_pair_distances(a,b,cutoff,self._workers)<thresholds).tolist()
+
+    def calculate_pairs(self,signatures):
+        #signatures is the strands x m matrix of min hashes, yields (representative,member) index arrays of candidate pairs for each band
+        n = signatures.shape[0]
+        key_bits = int(4**self._k).bit_length() #min hashes are at most 4**k
         for i in range(self._ell_lsh):
             min_sig_indexes = self._rng.permutation(self._m)[:self._k_lsh]
-            d = {}
-            for strand, min_hashes in strand_and_sigs:
-                lsh_hash = 0
-                for i,index in enumerate(min_sig_indexes):
-                    lsh_hash += min_hashes[index]*(4**self._k)**i
-                d[lsh_hash] = d.get(lsh_hash,[]) + [strand]
-            #make candidate pairs
-            pairs = set()
-            for group in d.values():
-                s_group = sorted(group,key=id)
-                g0 = s_group[0]
-                pairs=pairs.union(set([(g0,_) for _ in s_group[1::] if ld.distance(g0.dna_strand,_.dna_strand)<0.338*len(g0.dna_strand)]))
-            yield pairs
-                
+            band = signatures[:,min_sig_indexes]
+            if key_bits*self._k_lsh<63: #pack the band into one int64 key
+                keys = np.zeros(n,dtype=np.int64)
+                for j in range(self._k_lsh):
+                    keys |= band[:,j]<<(key_bits*j)
+                _,bucket = np.unique(keys,return_inverse=True)
+            else:
+                _,bucket = np.unique(band,axis=0,return_inverse=True)
+            bucket = bucket.reshape(-1)
+            #the lowest strand index of each bucket stands in for the bucket, every other member is paired with it
+            representative = np.full(bucket.max()+1,n,dtype=np.int64)
+            np.minimum.at(representative,bucket,np.arange(n))
+            members = np.flatnonzero(representative[bucket]!=np.arange(n))
+            yield representative[bucket[members]],members
+
     def calculate_min_hashes(self,dna_strands):
-        tables = [self._rng.permutation(4**self._k) for i in range(self._m)]
+        tables = np.array([self._rng.permutation(4**self._k) for i in range(self._m)])
+        #extra column is hit by kmers that are not made of ACGT (or that run into the next strand), it sorts after every real kmer
+        no_kmer = 4**self._k
+        tables = np.hstack([tables,np.full((self._m,1),no_kmer)]).astype(np.min_scalar_type(no_kmer))
         min_hashes = []
-        for s in dna_strands:
-            kmers = self.calculate_kmers(s.dna_strand[:self._length])
-            kmers = [self.convert_dna_to_index(_) for _ in kmers] #convert kmers to indexes
-            min_hashes.append((s,[min([table[_] for _ in kmers]) for table in tables]))
+        start=0
+        while start<len(dna_strands):
+            #bound the (m x kmers) gather so a big sequencing run does not blow up memory
+            end=start
+            windows=0
+            while end<len(dna_strands) and (end==start or (windows+self._length+1)*self._m<=LocalitySensitiveHashCluster.gather_budget):
+                windows+=min(len(dna_strands[end].dna_strand),self._length)+1
+                end+=1
+            chunk = dna_strands[start:end]
+            signatures = self._min_hash_matrix([s.dna_strand[:self._length] for s in chunk],tables,no_kmer)
+            min_hashes.extend(zip(chunk,signatures.tolist()))
+            start=end
         return min_hashes
 
+    def _min_hash_matrix(self,strands,tables,no_kmer):
+        #every strand is followed by one separator, so strand i owns kmer windows [offsets[i],offsets[i+1]) and has at least one window
+        lengths = np.array([len(s) for s in strands],dtype=np.int64)
+        offsets = np.concatenate([[0],np.cumsum(lengths+1)[:-1]])
+        joined = ("\x00".join(strands)+"\x00").encode("ascii","replace").translate(LocalitySensitiveHashCluster.code_table)
+        codes = np.frombuffer(joined+b"\x04"*(self._k-1),dtype=np.uint8)
+        n_windows = len(joined)
+        kmer_ids = np.zeros(n_windows,dtype=np.int64)
+        invalid = np.zeros(n_windows,dtype=bool)
+        for i in range(self._k): #base i of the kmer has weight 4**i, same as convert_dna_to_index
+            window = codes[i:i+n_windows]
+            kmer_ids += window.astype(np.int64)<<(2*i)
+            invalid |= window>3
+        kmer_ids[invalid] = no_kmer
+        return np.minimum.reduceat(tables[:,kmer_ids],offsets,axis=1).T
+
     def convert_dna_to_index(self,strand):
         index=0
         for i,base in enumerate(strand):
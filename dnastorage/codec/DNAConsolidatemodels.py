@@ -39,9 +39,10 @@ class BasicDNAClusterModel(DNAConsolidate,BaseCodec):
         #distribute clusters among ranks, cluster set must be in rank 0
         if self.mpi:
             clusters=object_scatter(clusters,self.mpi,100) 
-        for c in clusters:
-            consensus_ID = self._consensus_id(c)
-            consensus_strand = self._consensus_from_alignment(self._align.Run(c))
+        consensus_IDs = [self._consensus_id(c) for c in clusters]
+        alignments = self._align.RunBatch(clusters)
+        for c,consensus_ID,alignment in zip(clusters,consensus_IDs,alignments):
+            consensus_strand = self._consensus_from_alignment(alignment)
             new_strand = copy.copy(consensus_ID)
             new_strand.alignment_weight = len(c)
             new_strand.dna_strand = consensus_strand
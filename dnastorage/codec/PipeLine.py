@@ -1,6 +1,7 @@
 '''
 PipeLine Class file which builds the encoding/decoding pipeline based on a set of codecs. 
 '''
+import os
 import sys
 from dnastorage.codec.codecfile import *
 from dnastorage.codec.base import *
@@ -8,6 +9,7 @@ from dnastorage.exceptions import *
 from dnastorage.codec.base_conversion import *
 from dnastorage.strand_representation import *
 from dnastorage.primer.primer_util import *
+from dnastorage.codec.phys import PrependSequence,AppendSequence,ReversePipeline
 from dnastorage.util.mpi_utils import *
 from dnastorage.codec_types import *
 from io import *
@@ -38,7 +40,7 @@ def cascade_build(component_list):
 class PipeLine(EncodePacketizedFile,DecodePacketizedFile):
     def __init__(self,components,packetsize_bytes,
                  basestrand_bytes, DNA_upper_bound, final_decode_iterations,dna_consolidator=None,cw_consolidator=None,packetizedfile=None,
-                 barcode=tuple(),constant_index_bytes=None):
+                 barcode=tuple(),constant_index_bytes=None,batch_inner_decode=True,classify_orientation=True):
         
         EncodePacketizedFile.__init__(self,None)
         DecodePacketizedFile.__init__(self,None)
@@ -57,6 +59,7 @@ class PipeLine(EncodePacketizedFile,DecodePacketizedFile):
         self._decode_strands=[] #strands that will be decoded
         self._final_decode_iterations=final_decode_iterations #how many complete final decoding processes should be done
         self._index_bytes = constant_index_bytes #allow constant index_bytes to be used, useful for controlling for DNA strand size
+        self._batch_inner_decode = batch_inner_decode #hand all strands to each inner stage at once so codecs like hedges can decode in bulk
         
         #support the ability for 2 consolidators, dna consolidators may actually need a cw_consolidator to filter repeat indexes
         self._dna_consolidator = dna_consolidator 
@@ -113,6 +116,13 @@ class PipeLine(EncodePacketizedFile,DecodePacketizedFile):
         self._cw_to_DNA_cascade = cascade_build(self._cw_to_DNA)
         if len(self._DNA_to_DNA)==0: self._DNA_to_DNA.append(BaseCodec())
         self._dna_to_dna_cascade = cascade_build(self._DNA_to_DNA)
+        #orient reads from their primer k-mers up front so the DNA to DNA cascade runs once per read
+        self._orientation=None
+        primers=[c for c in self._DNA_to_DNA if isinstance(c,(PrependSequence,AppendSequence)) and c._seq!="" and not getattr(c,"_ignore",False)]
+        if classify_orientation and len(primers)>0 and not any(isinstance(c,ReversePipeline) for c in self._DNA_to_DNA):
+            self._orientation=PrimerOrientation([c._seq for c in primers if isinstance(c,PrependSequence)],
+                                                [c._seq for c in primers if isinstance(c,AppendSequence)],
+                                                max(c._search_range+len(c._seq) for c in primers))
 
         
     def _encode_pipeline(self,packet):
@@ -163,6 +173,10 @@ class PipeLine(EncodePacketizedFile,DecodePacketizedFile):
     def _inner_pipeline(self,strand):
         self._cw_to_DNA_cascade.decode(strand)
         self._inner_cascade.decode(strand)
+
+    def _inner_pipeline_batch(self,strands):
+        strands=self._cw_to_DNA_cascade.decode_batch(strands)
+        return self._inner_cascade.decode_batch(strands)
       
     def final_decode(self):
         #performs the final decode on the streamed in strands 
@@ -171,8 +185,10 @@ class PipeLine(EncodePacketizedFile,DecodePacketizedFile):
             self._dna_consolidator.mpi = self.mpi #hand off mpi to consolidator
             self._decode_strands = self._dna_consolidator.decode(self._decode_strands)
         after_inner=[]
+        if self._batch_inner_decode:
+            self._decode_strands=self._inner_pipeline_batch(self._decode_strands)
         for strand in self._decode_strands:
-            self._inner_pipeline(strand)
+            if not self._batch_inner_decode: self._inner_pipeline(strand)
             if not self._strand_valid_index(strand):
                 self.filter_strand(strand)
                 continue
@@ -225,42 +241,103 @@ class PipeLine(EncodePacketizedFile,DecodePacketizedFile):
         self.write()
 
     def decode(self,strand,skip=False):
-        if self._final_decode_run is True:
-            self._final_decode_run=False
-            self._decode_strands=[]
-            self._filtered_strands=[]
+        self._start_stream()
         strand.before_decode=strand.dna_strand
-        self._strand_count+=1
         strand.is_reversed=False
         if skip:
+            self._strand_count+=1
             self.filter_strand(strand) #skip if told to do so
             return 
+        if not self.trim(strand):
+            self._strand_count+=1
+            self.filter_strand(strand)
+            return
+        self.decode_trimmed(strand)
+
+    def _start_stream(self):
+        if self._final_decode_run is True:
+            self._final_decode_run=False
+            self._decode_strands=[]
+            self._filtered_strands=[]
+
+    def trim(self,strand):
         #perform the stream portion of the encoding pipeline, which processes the physical cascade. This should include stuff like removing physical portions
-        self._dna_to_dna_cascade.decode(strand)
-        if strand.dna_strand == None or len(strand.dna_strand.strip())==0:
-            strand.dna_strand=strand.before_decode
-            if not hasattr(strand,"is_RNA") or strand.is_RNA==False:
-                strand.is_reversed=True
-                try:
+        #returns False when the strand does not make it through, the strand is then left as it came in
+        return self.trim_batch([strand])[0]
+
+    def trim_batch(self,strands):
+        #trim() over many strands, the DNA to DNA cascade runs over the whole batch once per orientation tried
+        #(e.g. primers missing an exact match are located together by locate_primer_batch), returns whether each strand made it
+        orientations=[]
+        for strand in strands:
+            strand.before_decode=strand.dna_strand
+            strand.is_reversed=False
+            orientation=0
+            if self._orientation is not None and not getattr(strand,"is_RNA",False):
+                orientation=self._orientation.classify(strand.dna_strand)
+                if orientation<0:
+                    strand.is_reversed=True
                     strand.dna_strand=reverse_complement(strand.dna_strand)
-                except:
-                    logger.info(strand.dna_strand)
-                    exit(1)
-                #logger.info("Trying Reverse")
-                self._dna_to_dna_cascade.decode(strand)
-                if strand.dna_strand ==None or len(strand.dna_strand.strip())==0:
-                    #logger.info("Filtering Strand")
-                    #logger.info("Filtered Strands {}".format(strand.before_decode))
-                    self.filter_strand(strand)
-                    return
-            else:#no sense in doing reverse complements for RNA 
-                self.filter_strand(strand)
-                return
+            strand.orientation_known = orientation!=0 #lets later stages (e.g. hedges) skip their own orientation tests
+            orientations.append(orientation)
+        self._dna_to_dna_cascade.decode_batch(strands)
+        kept=[True]*len(strands)
+        reverse=[] #strands worth a second pass as their reverse complement
+        for i,(strand,orientation) in enumerate(zip(strands,orientations)):
+            if strand.dna_strand is not None and len(strand.dna_strand.strip())>0: continue
+            strand.dna_strand,strand.is_reversed=strand.before_decode,False
+            if orientation!=0 or getattr(strand,"is_RNA",False):
+                #the primers decided the orientation, the other one is not worth a second pass, and no sense in doing reverse complements for RNA
+                kept[i]=False
+                continue
+            strand.is_reversed=True
+            try:
+                strand.dna_strand=reverse_complement(strand.dna_strand)
+            except:
+                logger.info(strand.dna_strand)
+                exit(1)
+            reverse.append(i)
+        if len(reverse)>0:
+            self._dna_to_dna_cascade.decode_batch([strands[i] for i in reverse])
+        for i in reverse:
+            strand=strands[i]
+            if strand.dna_strand ==None or len(strand.dna_strand.strip())==0:
+                strand.dna_strand,strand.is_reversed=strand.before_decode,False
+                kept[i]=False
+        return kept
+
+    def decode_trimmed(self,strand):
+        #streams in a strand that already went through trim(), possibly the trim of another pipeline with the same DNA to DNA cascade
+        self._start_stream()
+        self._strand_count+=1
         #logger.info("Strand Kept {}".format(strand.is_reversed))
         strand.index_bytes = self._index_bytes
         strand.index_bit_set =  self._index_bit_set
         self._decode_strands.append(strand)
-   
+
+    def trim_key(self):
+        #pipelines with equal keys trim reads the same way, so a read only needs to be trimmed once for all of them
+        key=[]
+        for c in self._DNA_to_DNA:
+            key.append((type(c),tuple(sorted((k,v) for k,v in vars(c).items() if isinstance(v,(str,int,float,bool,type(None)))))))
+        return (tuple(key),self._orientation is not None)
+
+    def barcode_signature(self,probes=8):
+        #DNA that every strand of this pipeline starts with once its primers are removed, i.e. what the barcode encodes to.
+        #Found as the common prefix of a few probe strands that share only the barcode, empty without a barcode or index layout
+        if len(self._barcode)==0 or self._index_bytes is None or getattr(self,"_index_bit_set",None) is None: return ""
+        rng=random.Random(len(self._barcode))
+        dna=[]
+        for _ in range(probes):
+            index_ints=self._barcode+tuple(rng.randrange(2**b) for b in self._index_bit_set[len(self._barcode):])
+            index=pack_bits_to_bytes(index_ints,self._index_bit_set)
+            strand=BaseDNA(codewords=index+[0]*(self._index_bytes-len(index))+[rng.randrange(256) for _ in range(self._basestrand_bytes)],
+                           index_ints=index_ints)
+            strand.index_bytes=self._index_bytes
+            self._inner_cascade.encode(strand)
+            self._cw_to_DNA_cascade.encode(strand)
+            dna.append(strand.dna_strand)
+        return os.path.commonprefix(dna)
 
     def filter_strand(self,strand):
         strand.dna_strand=strand.before_decode #single point to revert filtered strand for future processing by pipelines
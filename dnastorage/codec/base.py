@@ -48,6 +48,21 @@ class BaseCodec(object):
             else:
                 return self._decode(s)
 
+    def _decode_batch(self, strands):
+        return [self._decode(s) for s in strands]
+    #batched counterpart of decode, codecs that can amortize work over many strands (e.g. native decoders) override _decode_batch
+    def decode_batch(self,strands):
+        if self.reverse:
+            strands = self._decode_batch(strands)
+            if self._Obj != None:
+                return self._Obj.decode_batch(strands)
+            else:
+                return strands
+        else:
+            if self._Obj != None:
+                strands = self._Obj.decode_batch(strands)
+            return self._decode_batch(strands)
+
     def _encode_header(self):
         return []
 
@@ -2,9 +2,11 @@ from dnastorage.codec.base import *
 from math import log, ceil
 from dnastorage.codec import base_conversion
 from dnastorage.codec.reedsolomon.rs import ReedSolomon,get_reed_solomon,ReedSolomonError
+from dnastorage.codec.reedsolomon.columnar import ColumnarReedSolomon
 from collections import Counter
 from dnastorage.strand_representation import *
 from dnastorage.codec_types import *
+import numpy as np
 import logging
 logger = logging.getLogger('dna.storage.codec.block')
 logger.addHandler(logging.NullHandler())
@@ -16,6 +18,8 @@ class ReedSolomonOuterPipeline(BaseOuterCodec):
         self._rs = get_reed_solomon(c_exp=c_exp)
         self._parity_packets=parity_packets
         assert(packet_divisor+parity_packets<=self._rs.field_charac)
+        #byte-wide fields can process whole sub-packets as uint8 arrays, wider fields stay on the per-column path
+        self._columnar = ColumnarReedSolomon(self._rs) if c_exp==8 else None
     def _encode(self,packets):
         parity_packets=[]
         #initialize parity_packets
@@ -31,6 +35,12 @@ class ReedSolomonOuterPipeline(BaseOuterCodec):
             assert(len(strand_set)>0)
             strand_length = len(strand_set[0].codewords)
             for i in range(0,self._parity_packets): parity_packets[i].append(BaseDNA(codewords=[])) #make a new strand in each parity packet
+            if self._columnar is not None:
+                #encode every byte column at once, row ei of ecc is the parity strand for parity packet ei
+                ecc = self._columnar.encode_columns([s.codewords for s in strand_set],self._parity_packets)
+                for ei in range(0,self._parity_packets):
+                    parity_packets[ei][-1].codewords=ecc[ei].tolist()
+                continue
             #go column by column, calculating a RS message and splitting the ECC across strands in each packet
             for k in range(0,strand_length):
                 message=[]
@@ -55,7 +65,7 @@ class ReedSolomonOuterPipeline(BaseOuterCodec):
                 strands.append(packets[j][i])
             #now get messages
             assert len(strands)>0
-            for byte_index in range(0,len(strands[0].codewords)):
+            for byte_index in self._fill_erasure_columns(strands):
                 message=[]
                 for strand_index in range(0,len(strands)):
                     message.append(strands[strand_index].codewords[byte_index])
@@ -84,4 +94,38 @@ class ReedSolomonOuterPipeline(BaseOuterCodec):
                 for s,m in zip(strands,corrected_message):
                     s.codewords[byte_index] = m
         return packets
-    
+
+    def _dirty_columns(self,codewords,erased):
+        #columns without erasures whose syndromes are not all zero, the others are already valid codewords; reads only
+        syndromes = self._columnar.calc_syndromes(codewords,self._parity_packets)
+        return np.flatnonzero(syndromes.any(axis=0) & ~erased.any(axis=0)).tolist()
+
+    def _fill_erasure_columns(self,strands):
+        #erasure-only columns are solved in bulk per erasure pattern and their corrected bytes are written into
+        #strands[i].codewords, returns the columns that still need Berlekamp-Massey (dirty or unsolved erasure columns)
+        strand_length = len(strands[0].codewords)
+        if self._columnar is None or any(len(s.codewords)!=strand_length for s in strands):
+            return range(0,strand_length)
+        message_matrix = np.array([s.codewords for s in strands],dtype=object).reshape(len(strands),strand_length)
+        erased = np.equal(message_matrix,None)
+        message_matrix[erased]=0
+        codewords = message_matrix.astype(np.uint8)
+        remaining = self._dirty_columns(codewords,erased)
+        erased_columns = erased.any(axis=0)
+        if not erased_columns.any(): return remaining
+        columns = np.flatnonzero(erased_columns)
+        patterns,pattern_ids = np.unique(erased[:,columns].T,axis=0,return_inverse=True)
+        pattern_ids = pattern_ids.reshape(-1)
+        data_strands = len(strands)-self._parity_packets
+        for pattern_index,pattern in enumerate(patterns):
+            pattern_columns = columns[pattern_ids==pattern_index]
+            erase_pos = tuple(np.flatnonzero(pattern).tolist())
+            filled,valid = self._columnar.correct_erasures(codewords[:,pattern_columns],self._parity_packets,erase_pos)
+            remaining+=pattern_columns[~valid].tolist()
+            #like the per-column decoder, only the data strands get corrected values written back
+            for strand_index in erase_pos:
+                if strand_index>=data_strands: break
+                row = strands[strand_index].codewords
+                for byte_index,value in zip(pattern_columns[valid].tolist(),filled[strand_index,valid].tolist()):
+                    row[byte_index]=value
+        return sorted(remaining)
@@ -55,75 +55,10 @@ fasthedges_decode2(PyObject *self, PyObject *args)
   return shared_decode(self,args);
 }
 
-static PyObject * decode_item(const char *strand, hedge &h, int guesses=1000000)
-{
-  std::string sstrand(strand);
-
-  std::vector<uint8_t> mess(h.message_bytes), seq(h.seq_bytes);
-  hedges::hedge::decode_return_t t = h.decode(sstrand,seq,mess,guesses);
-
-  // std::cout << "[";
-  // for(auto i : seq)
-  //   std::cout << int(i) << ", ";
-  // for(auto i : mess)
-  //   std::cout << int(i) << ", ";
-  // std::cout << "]" << std::endl;
-
-  uint32_t size = h.seq_bytes + h.message_bytes;
-  PyObject *list = PyList_New(size);
-  for(auto i=0; i<size; i++)
-    {
-      if (i<h.seq_bytes) {
-	PyObject *item = Py_BuildValue("i",seq[i]);
-	Py_INCREF(item);
-	PyList_SetItem(list,i,item);
-      } else {
-	PyObject *item = Py_BuildValue("i",mess[i-seq.size()]);
-	Py_INCREF(item);
-	PyList_SetItem(list,i,item);
-      }
-      
-    }
-  return list;
-}
-
- 
 static PyObject *
 fasthedges_bulk_decode(PyObject *self, PyObject *args)
 {
-    const char *strand;
-    PyObject *l;
-    PyObject *hObj;
-    int guesses = 1000000;
-    
-    if (PyArg_ParseTuple(args, "OO|i", &l, &hObj, &guesses)) {
-
-      hedge h = make_hedge_from_pyobject(hObj);
-      
-      if (l!=NULL && !PyList_Check(l)) {
-         PyErr_SetString(FasthedgesError, "Expected first argument to be a list of DNA strands.");
-         return NULL;	
-      }
-
-      PyObject *bulk_list = PyList_New(PyList_Size(l));
-
-      for(Py_ssize_t j=0; j<PyList_Size(l); j++)
-	{
-	  PyObject *item = PyList_GetItem(l, j);
-	  
-	  if (PyUnicode_Check(item))
-	    {
-	      const char *strand = PyUnicode_AsUTF8(item);
-	      PyObject *decoded_list = decode_item(strand, h);
-	      Py_INCREF(decoded_list);
-	      PyList_SetItem(bulk_list,j,decoded_list);	      
-	    }
-	}
-
-      return bulk_list;
-    }
-
-    return Py_BuildValue("s",NULL);
+  return shared_bulk_decode(self,args,FasthedgesError);
 }
 
 
@@ -144,7 +79,7 @@ fasthedges_echo(PyObject *self, PyObject *args)
 static PyMethodDef FasthedgesMethods[] = {
     {"encode",  fasthedges_encode2, METH_VARARGS, "Encode into DNA."},
     {"decode",  fasthedges_decode2, METH_VARARGS, "Decode from DNA back into bytes."},
-    {"bulk_decode",  fasthedges_bulk_decode, METH_VARARGS, "Bulk decode a list of strands from DNA back into bytes."},
+    {"bulk_decode",  fasthedges_bulk_decode, METH_VARARGS, "Bulk decode a list of strands from DNA back into bytes, optionally across native threads with the GIL released."},
     {"echo",  fasthedges_echo, METH_VARARGS, "Echo hedges configuration."},
     
     {NULL, NULL, 0, NULL}        /* Sentinel */
@@ -1,6 +1,9 @@
 #ifndef SHARED_HPP
 #define SHARED_HPP
 #include <Python.h>
+#include <algorithm>
+#include <atomic>
+#include <thread>
 #include "fast_hedges.hpp"
 #include "codeword_hedges.hpp"
 
@@ -62,6 +65,37 @@ static hedges::hedge make_hedge_from_pyobject(PyObject *object)
 
 
 
+template<typename Constraint = hedges::Constraint, typename Reward = hedges::Reward,  template <typename> class Context = hedges::context>
+static hedges::hedge::decode_return_t
+decode_strand(hedges::hedge &h, std::string &sstrand, std::vector<uint8_t> &seq, std::vector<uint8_t> &mess, int guesses)
+{
+  //pure C++ decode of a single strand, safe to call without holding the GIL
+  if(h.parity_period==0) return h. template decode<Constraint,Reward,Context,hedges::search_tree>(sstrand,seq,mess,guesses);
+  return h. template decode<Constraint,Reward,Context,hedges::search_tree_parity>(sstrand,seq,mess,guesses); //parity search tree considers parity data during decoding
+}
+
+static PyObject *
+decode_result_to_dict(std::vector<uint8_t> &seq, std::vector<uint8_t> &mess, hedges::hedge::decode_return_t &t)
+{
+  //bytes past return_bytes could not be recovered by the search and are returned as None
+  int sz = seq.size() + mess.size();
+  PyObject *list = PyList_New(sz);
+  for(auto i=0; i<sz; i++)
+    {
+      PyObject *item;
+      if (i >= (int)t.return_bytes) {
+	Py_INCREF(Py_None);
+	item = Py_None;
+      } else if (i<(int)seq.size()) {
+	item = PyLong_FromLong(seq[i]);
+      } else {
+	item = PyLong_FromLong(mess[i-seq.size()]);
+      }
+      PyList_SetItem(list,i,item);
+    }
+  return Py_BuildValue("{s:N,s:f}","return_bytes",list,"score",t.score);
+}
+
 template<typename Constraint = hedges::Constraint, typename Reward = hedges::Reward,  template <typename> class Context = hedges::context>
 static PyObject *
 shared_decode(PyObject *self, PyObject *args)
@@ -78,45 +112,79 @@ shared_decode(PyObject *self, PyObject *args)
 
       std::string sstrand(strand);
       
-      hedges::hedge::decode_return_t t(0,0);
-      if(h.parity_period==0) t = h. template decode<Constraint,Reward,Context,hedges::search_tree>(sstrand,seq,mess,guesses);
-      else t  = h. template decode<Constraint,Reward,Context,hedges::search_tree_parity>(sstrand,seq,mess,guesses); //parity search tree considers parity data during decoding
-      int sz = seq.size() + mess.size();
-      PyObject *list = PyList_New(sz);
-      for(auto i=0; i<sz; i++)
-	{	  
-	  if (i<seq.size()) {
-	    if (i >= t.return_bytes) {
-	      PyObject *item = Py_BuildValue("s",NULL);
-	      Py_INCREF(item);
-	      PyList_SetItem(list,i,item);
-
-	    } else {
-	      PyObject *item = Py_BuildValue("i",seq[i]);
-	      Py_INCREF(item);
-	      PyList_SetItem(list,i,item);
-	    }
-	  } else {
-	    if (i >= t.return_bytes) {
-	      PyObject *item = Py_BuildValue("s",NULL);
-	      Py_INCREF(item);
-	      PyList_SetItem(list,i,item);
-	    } else {
-	      PyObject *item = Py_BuildValue("i",mess[i-seq.size()]);
-	      Py_INCREF(item);
-	      PyList_SetItem(list,i,item);
-	    }
-	  }
-	  
-	}
-      PyObject* return_dict =Py_BuildValue("{s:O,s:f}","return_bytes",list,"score",t.score);
-      return return_dict;
+      hedges::hedge::decode_return_t t = decode_strand<Constraint,Reward,Context>(h,sstrand,seq,mess,guesses);
+      return decode_result_to_dict(seq,mess,t);
     }
 
     return Py_BuildValue("s",NULL);
 }
 
 
+template<typename Constraint = hedges::Constraint, typename Reward = hedges::Reward,  template <typename> class Context = hedges::context>
+static PyObject *
+shared_bulk_decode(PyObject *self, PyObject *args, PyObject *exception)
+{
+    PyObject *l;
+    PyObject *hObj;
+    int guesses = 100000;
+    int num_threads = 1;
+
+    if (!PyArg_ParseTuple(args, "OO|ii", &l, &hObj, &guesses, &num_threads))
+      return NULL;
+
+    if (!PyList_Check(l)) {
+      PyErr_SetString(exception, "Expected first argument to be a list of DNA strands.");
+      return NULL;
+    }
+
+    hedges::hedge h = make_hedge_from_pyobject(hObj);
+
+    //copy strands out of python objects while we still hold the GIL
+    Py_ssize_t num_strands = PyList_Size(l);
+    std::vector<std::string> strands(num_strands);
+    for(Py_ssize_t j=0; j<num_strands; j++)
+      {
+	PyObject *item = PyList_GetItem(l, j);
+	if (!PyUnicode_Check(item)) {
+	  PyErr_SetString(exception, "Expected every strand in the list to be a string.");
+	  return NULL;
+	}
+	strands[j] = PyUnicode_AsUTF8(item);
+      }
+
+    std::vector< std::vector<uint8_t> > seqs(num_strands, std::vector<uint8_t>(h.seq_bytes));
+    std::vector< std::vector<uint8_t> > messages(num_strands, std::vector<uint8_t>(h.message_bytes));
+    std::vector< hedges::hedge::decode_return_t > results(num_strands);
+
+    if (num_threads <= 0)
+      num_threads = std::max(1u, std::thread::hardware_concurrency());
+    if (num_threads > num_strands)
+      num_threads = std::max<Py_ssize_t>(1, num_strands);
+
+    //each worker pulls the next strand index from a shared counter and owns its own hedge copy
+    std::atomic<Py_ssize_t> next(0);
+    auto worker = [&]() {
+      hedges::hedge local_h = h;
+      Py_ssize_t j;
+      while ((j = next.fetch_add(1)) < num_strands)
+	results[j] = decode_strand<Constraint,Reward,Context>(local_h,strands[j],seqs[j],messages[j],guesses);
+    };
+
+    Py_BEGIN_ALLOW_THREADS
+    std::vector<std::thread> pool;
+    for(int t=1; t<num_threads; t++)
+      pool.emplace_back(worker);
+    worker();
+    for(auto &t : pool)
+      t.join();
+    Py_END_ALLOW_THREADS
+
+    PyObject *bulk_list = PyList_New(num_strands);
+    for(Py_ssize_t j=0; j<num_strands; j++)
+      PyList_SetItem(bulk_list,j,decode_result_to_dict(seqs[j],messages[j],results[j]));
+    return bulk_list;
+}
+
 
 
 static PyObject *
@@ -0,0 +1,285 @@
+#include <algorithm>
+#include <memory>
+
+#include "fast_rs.hpp"
+
+namespace fastrs {
+
+static int gf_mult_noLUT(int x, int y, int prim, int field_charac_full)
+{
+  // Russian peasant multiplication with reduction by the primitive polynomial
+  int r = 0;
+  while (y) {
+    if (y & 1) r ^= x;
+    y >>= 1;
+    x <<= 1;
+    if (prim > 0 && (x & field_charac_full)) x ^= prim;
+  }
+  return r;
+}
+
+field::field(int c_exp, int prim, int generator)
+  : c_exp(c_exp), prim(prim), generator(generator)
+{
+  charac = (1 << c_exp) - 1;
+  gf_exp.assign(charac * 2, 0);
+  gf_log.assign(charac + 1, 0);
+  int x = 1;
+  for (int i = 0; i < charac; i++) {
+    gf_exp[i] = x;
+    gf_log[x] = i;
+    x = gf_mult_noLUT(x, generator, prim, charac + 1);
+  }
+  for (int i = charac; i < charac * 2; i++)
+    gf_exp[i] = gf_exp[i - charac];
+}
+
+int field::mul(int x, int y) const
+{
+  if (x == 0 || y == 0) return 0;
+  return gf_exp[(gf_log[x] + gf_log[y]) % charac];
+}
+
+int field::div(int x, int y) const
+{
+  if (y == 0) throw zero_division_error();
+  if (x == 0) return 0;
+  return gf_exp[(gf_log[x] + charac - gf_log[y]) % charac];
+}
+
+int field::pow(int x, long long power) const
+{
+  // python's % is always non-negative, keep that behavior for negative powers
+  long long e = ((long long)gf_log[x] * power) % charac;
+  if (e < 0) e += charac;
+  return gf_exp[e];
+}
+
+int field::inverse(int x) const
+{
+  return gf_exp[charac - gf_log[x]];
+}
+
+poly field::poly_scale(const poly &p, int x) const
+{
+  poly r(p.size());
+  for (size_t i = 0; i < p.size(); i++) r[i] = mul(p[i], x);
+  return r;
+}
+
+poly field::poly_add(const poly &p, const poly &q) const
+{
+  poly r(std::max(p.size(), q.size()), 0);
+  for (size_t i = 0; i < p.size(); i++) r[i + r.size() - p.size()] = p[i];
+  for (size_t i = 0; i < q.size(); i++) r[i + r.size() - q.size()] ^= q[i];
+  return r;
+}
+
+poly field::poly_mul(const poly &p, const poly &q) const
+{
+  poly r(p.size() + q.size() - 1, 0);
+  std::vector<int> lp(p.size());
+  for (size_t i = 0; i < p.size(); i++) lp[i] = gf_log[p[i]];
+  for (size_t j = 0; j < q.size(); j++) {
+    int qj = q[j];
+    if (qj != 0) {
+      int lq = gf_log[qj];
+      for (size_t i = 0; i < p.size(); i++)
+        if (p[i] != 0) r[i + j] ^= gf_exp[lp[i] + lq];
+    }
+  }
+  return r;
+}
+
+int field::poly_eval(const poly &p, int x) const
+{
+  if (p.empty()) return 0;
+  int y = p[0];
+  for (size_t i = 1; i < p.size(); i++) y = mul(y, x) ^ p[i];
+  return y;
+}
+
+field &get_field(int c_exp, int prim, int generator)
+{
+  static std::map<std::tuple<int,int,int>, std::unique_ptr<field> > fields;
+  auto key = std::make_tuple(c_exp, prim, generator);
+  auto it = fields.find(key);
+  if (it == fields.end())
+    it = fields.emplace(key, std::unique_ptr<field>(new field(c_exp, prim, generator))).first;
+  return *(it->second);
+}
+
+poly rs_generator_poly(const field &f, int nsym, int fcr, int generator)
+{
+  poly g = {1};
+  for (int i = 0; i < nsym; i++)
+    g = f.poly_mul(g, {1, f.pow(generator, i + fcr)});
+  return g;
+}
+
+poly rs_encode_msg(const field &f, const poly &msg, int nsym, int fcr, int generator, const poly &gen_in)
+{
+  if ((int)msg.size() + nsym > f.charac)
+    throw std::length_error("Message is too long");
+  const poly gen = gen_in.empty() ? rs_generator_poly(f, nsym, fcr, generator) : gen_in;
+  poly out(msg.size() + gen.size() - 1, 0);
+  std::copy(msg.begin(), msg.end(), out.begin());
+  // extended synthetic division, the remainder left in out past msg.size() is the ecc
+  for (size_t i = 0; i < msg.size(); i++) {
+    int coef = out[i];
+    if (coef != 0)
+      for (size_t j = 1; j < gen.size(); j++)
+        out[i + j] ^= f.mul(gen[j], coef);
+  }
+  std::copy(msg.begin(), msg.end(), out.begin());
+  return out;
+}
+
+poly rs_calc_syndromes(const field &f, const poly &msg, int nsym, int fcr, int generator)
+{
+  poly synd(nsym + 1, 0);
+  for (int i = 0; i < nsym; i++)
+    synd[i + 1] = f.poly_eval(msg, f.pow(generator, i + fcr));
+  return synd;
+}
+
+poly rs_find_errata_locator(const field &f, const std::vector<int> &e_pos, int generator)
+{
+  poly e_loc = {1};
+  for (int i : e_pos)
+    e_loc = f.poly_mul(e_loc, {f.pow(generator, i), 1});
+  return e_loc;
+}
+
+poly rs_find_error_evaluator(const field &f, const poly &synd, const poly &err_loc, int nsym)
+{
+  // (synd * err_loc) mod x^(nsym+1), the divisor is a monomial so the remainder is just the low terms
+  poly product = f.poly_mul(synd, err_loc);
+  size_t keep = std::min(product.size(), (size_t)(nsym + 1));
+  return poly(product.end() - keep, product.end());
+}
+
+poly rs_correct_errata(const field &f, const poly &msg, const poly &synd, const std::vector<int> &err_pos, int fcr, int generator)
+{
+  std::vector<int> coef_pos(err_pos.size());
+  for (size_t i = 0; i < err_pos.size(); i++) coef_pos[i] = msg.size() - 1 - err_pos[i];
+  poly err_loc = rs_find_errata_locator(f, coef_pos, generator);
+  poly synd_rev(synd.rbegin(), synd.rend());
+  poly err_eval = rs_find_error_evaluator(f, synd_rev, err_loc, err_loc.size() - 1);
+  // err_eval is reversed once by rs.py and reversed back for evaluation, so evaluate it as is
+  std::vector<int> X(coef_pos.size());
+  for (size_t i = 0; i < coef_pos.size(); i++)
+    X[i] = f.pow(generator, -(long long)(f.charac - coef_pos[i]));
+
+  poly E(msg.size(), 0);
+  for (size_t i = 0; i < X.size(); i++) {
+    int Xi_inv = f.inverse(X[i]);
+    int err_loc_prime = 1;
+    for (size_t j = 0; j < X.size(); j++)
+      if (j != i) err_loc_prime = f.mul(err_loc_prime, 1 ^ f.mul(Xi_inv, X[j]));
+    int y = f.poly_eval(err_eval, Xi_inv);
+    y = f.mul(f.pow(X[i], 1 - fcr), y);
+    int magnitude = f.div(y, err_loc_prime);
+    int pos = err_pos[i] < 0 ? err_pos[i] + (int)E.size() : err_pos[i];
+    E[pos] = magnitude;
+  }
+  return f.poly_add(msg, E);
+}
+
+poly rs_find_error_locator(const field &f, const poly &synd, int nsym, int erase_count)
+{
+  // Berlekamp-Massey on the Forney syndromes, erasures are already trimmed out
+  poly err_loc = {1};
+  poly old_loc = {1};
+  int synd_shift = 0;
+  if ((int)synd.size() > nsym) synd_shift = synd.size() - nsym;
+  int L = synd.size();
+  for (int i = 0; i < nsym - erase_count; i++) {
+    int K = i + synd_shift;
+    int delta = synd[K];
+    for (size_t j = 1; j < err_loc.size(); j++) {
+      int idx = K - (int)j;
+      if (idx < 0) idx += L; // rs.py relies on python's negative indexing here
+      if (idx < 0) throw std::out_of_range("syndrome index out of range");
+      delta ^= f.mul(err_loc[err_loc.size() - (j + 1)], synd[idx]);
+    }
+    old_loc.push_back(0);
+    if (delta != 0) {
+      if (old_loc.size() > err_loc.size()) {
+        poly new_loc = f.poly_scale(old_loc, delta);
+        old_loc = f.poly_scale(err_loc, f.inverse(delta));
+        err_loc = new_loc;
+      }
+      err_loc = f.poly_add(err_loc, f.poly_scale(old_loc, delta));
+    }
+  }
+  size_t lead = 0;
+  while (lead < err_loc.size() && err_loc[lead] == 0) lead++;
+  err_loc.erase(err_loc.begin(), err_loc.begin() + lead);
+  int errs = (int)err_loc.size() - 1;
+  if ((errs - erase_count) * 2 + erase_count > nsym)
+    throw reed_solomon_error("Too many errors to correct");
+  return err_loc;
+}
+
+std::vector<int> rs_find_errors(const field &f, const poly &err_loc, int nmess, int generator)
+{
+  int errs = (int)err_loc.size() - 1;
+  std::vector<int> err_pos;
+  for (int i = 0; i < nmess; i++)
+    if (f.poly_eval(err_loc, f.pow(generator, i)) == 0)
+      err_pos.push_back(nmess - 1 - i);
+  if ((int)err_pos.size() != errs)
+    throw reed_solomon_error("Too many (or few) errors found by Chien Search for the errata locator polynomial!");
+  return err_pos;
+}
+
+poly rs_forney_syndromes(const field &f, const poly &synd, const std::vector<int> &pos, int nmess, int generator)
+{
+  poly fsynd(synd.begin() + 1, synd.end());
+  for (size_t i = 0; i < pos.size(); i++) {
+    int x = f.pow(generator, nmess - 1 - pos[i]);
+    for (size_t j = 0; j + 1 < fsynd.size(); j++)
+      fsynd[j] = f.mul(fsynd[j], x) ^ fsynd[j + 1];
+  }
+  return fsynd;
+}
+
+static std::pair<poly,poly> split_ecc(const poly &msg, int nsym)
+{
+  // same as python's msg[:-nsym], msg[-nsym:] (nsym==0 yields an empty message)
+  if (nsym == 0) return std::make_pair(poly(), msg);
+  size_t cut = msg.size() > (size_t)nsym ? msg.size() - nsym : 0;
+  return std::make_pair(poly(msg.begin(), msg.begin() + cut), poly(msg.begin() + cut, msg.end()));
+}
+
+std::pair<poly,poly> rs_correct_msg(const field &f, const poly &msg_in, int nsym, int fcr, int generator,
+                                    const std::vector<int> &erase_pos, bool only_erasures)
+{
+  if ((int)msg_in.size() > f.charac)
+    throw std::length_error("Message is too long");
+  poly msg_out(msg_in);
+  for (int e : erase_pos) msg_out[e < 0 ? e + msg_out.size() : e] = 0;
+  if ((int)erase_pos.size() > nsym)
+    throw reed_solomon_error("Too many erasures to correct");
+  poly synd = rs_calc_syndromes(f, msg_out, nsym, fcr, generator);
+  if (*std::max_element(synd.begin(), synd.end()) == 0)
+    return split_ecc(msg_out, nsym);
+
+  std::vector<int> err_pos;
+  if (!only_erasures) {
+    poly fsynd = rs_forney_syndromes(f, synd, erase_pos, msg_out.size(), generator);
+    poly err_loc = rs_find_error_locator(f, fsynd, nsym, erase_pos.size());
+    poly err_loc_rev(err_loc.rbegin(), err_loc.rend());
+    err_pos = rs_find_errors(f, err_loc_rev, msg_out.size(), generator);
+  }
+  std::vector<int> errata(erase_pos);
+  errata.insert(errata.end(), err_pos.begin(), err_pos.end());
+  msg_out = rs_correct_errata(f, msg_out, synd, errata, fcr, generator);
+  synd = rs_calc_syndromes(f, msg_out, nsym, fcr, generator);
+  if (*std::max_element(synd.begin(), synd.end()) > 0)
+    throw reed_solomon_error("Could not correct message");
+  return split_ecc(msg_out, nsym);
+}
+
+}
@@ -0,0 +1,67 @@
+#ifndef FAST_RS_HPP
+#define FAST_RS_HPP
+
+#include <cstdint>
+#include <vector>
+#include <map>
+#include <tuple>
+#include <stdexcept>
+
+/*
+  Native port of dnastorage/codec/reedsolomon/rs.py. Every routine mirrors its Python
+  counterpart step for step (including the table layout and error conditions) so that
+  strands encoded by either implementation decode identically with the other.
+*/
+
+namespace fastrs {
+
+typedef std::vector<int> poly;
+
+struct reed_solomon_error : public std::runtime_error {
+  reed_solomon_error(const char *msg) : std::runtime_error(msg) {}
+};
+
+struct zero_division_error : public std::runtime_error {
+  zero_division_error() : std::runtime_error("division by zero in Galois field") {}
+};
+
+class field {
+public:
+  int c_exp;
+  int prim;
+  int generator;
+  int charac;
+  std::vector<int> gf_exp;
+  std::vector<int> gf_log;
+
+  field(int c_exp, int prim, int generator);
+
+  int mul(int x, int y) const;
+  int div(int x, int y) const;
+  int pow(int x, long long power) const;
+  int inverse(int x) const;
+
+  poly poly_scale(const poly &p, int x) const;
+  poly poly_add(const poly &p, const poly &q) const;
+  poly poly_mul(const poly &p, const poly &q) const;
+  int poly_eval(const poly &p, int x) const;
+};
+
+// fields are expensive to build for GF(2^16), so they are cached by (c_exp, prim, generator)
+field &get_field(int c_exp, int prim, int generator);
+
+poly rs_generator_poly(const field &f, int nsym, int fcr, int generator);
+poly rs_encode_msg(const field &f, const poly &msg, int nsym, int fcr, int generator, const poly &gen);
+poly rs_calc_syndromes(const field &f, const poly &msg, int nsym, int fcr, int generator);
+poly rs_find_errata_locator(const field &f, const std::vector<int> &e_pos, int generator);
+poly rs_find_error_evaluator(const field &f, const poly &synd, const poly &err_loc, int nsym);
+poly rs_correct_errata(const field &f, const poly &msg, const poly &synd, const std::vector<int> &err_pos, int fcr, int generator);
+poly rs_find_error_locator(const field &f, const poly &synd, int nsym, int erase_count);
+std::vector<int> rs_find_errors(const field &f, const poly &err_loc, int nmess, int generator);
+poly rs_forney_syndromes(const field &f, const poly &synd, const std::vector<int> &pos, int nmess, int generator);
+std::pair<poly,poly> rs_correct_msg(const field &f, const poly &msg_in, int nsym, int fcr, int generator,
+                                    const std::vector<int> &erase_pos, bool only_erasures);
+
+}
+
+#endif //FAST_RS_HPP
@@ -0,0 +1,208 @@
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <climits>
+#include "fast_rs.hpp"
+
+using namespace fastrs;
+
+static PyObject *FastrsError;
+
+
+static long field_charac(int c_exp)
+{
+  // largest symbol of GF(2^c_exp), unbounded when get_field will reject c_exp anyway
+  return (c_exp > 0 && c_exp < 31) ? (1L << c_exp) - 1 : LONG_MAX;
+}
+
+static bool list_to_poly(PyObject *obj, poly &p, long max_symbol=LONG_MAX, bool allow_none=false)
+{
+  PyObject *seq = PySequence_Fast(obj, "expected a sequence of field symbols");
+  if (seq == NULL)
+    return false;
+  Py_ssize_t len = PySequence_Fast_GET_SIZE(seq);
+  PyObject **items = PySequence_Fast_ITEMS(seq);
+  p.resize(len);
+  for (Py_ssize_t i = 0; i < len; i++) {
+    if (allow_none && items[i] == Py_None) {
+      // erased symbols are often None, they are zeroed before use so mark them with -1
+      p[i] = -1;
+      continue;
+    }
+    long v = PyLong_AsLong(items[i]);
+    if (v == -1 && PyErr_Occurred()) {
+      Py_DECREF(seq);
+      return false;
+    }
+    // symbols index the field tables, so anything outside [0, field_charac] would read past them
+    if (max_symbol != LONG_MAX && (v < 0 || v > max_symbol)) {
+      PyErr_Format(PyExc_ValueError, "symbol %ld at position %zd is outside of the field [0, %ld]", v, i, max_symbol);
+      Py_DECREF(seq);
+      return false;
+    }
+    if (v < INT_MIN || v > INT_MAX) {
+      PyErr_SetString(PyExc_OverflowError, "value does not fit in a C int");
+      Py_DECREF(seq);
+      return false;
+    }
+    p[i] = (int) v;
+  }
+  Py_DECREF(seq);
+  return true;
+}
+
+static PyObject *poly_to_list(const poly &p)
+{
+  PyObject *l = PyList_New(p.size());
+  if (l == NULL)
+    return NULL;
+  for (size_t i = 0; i < p.size(); i++)
+    PyList_SET_ITEM(l, i, PyLong_FromLong(p[i]));
+  return l;
+}
+
+static void set_python_error()
+{
+  // translate native failures into the same exception types rs.py raises
+  try {
+    throw;
+  } catch (const reed_solomon_error &e) {
+    PyErr_SetString(FastrsError, e.what());
+  } catch (const zero_division_error &e) {
+    PyErr_SetString(PyExc_ZeroDivisionError, e.what());
+  } catch (const std::length_error &e) {
+    PyErr_SetString(PyExc_ValueError, e.what());
+  } catch (const std::out_of_range &e) {
+    PyErr_SetString(PyExc_IndexError, e.what());
+  } catch (const std::exception &e) {
+    PyErr_SetString(FastrsError, e.what());
+  }
+}
+
+
+static PyObject *
+fastrs_encode(PyObject *self, PyObject *args)
+{
+  PyObject *msgObj;
+  PyObject *genObj = Py_None;
+  int nsym, c_exp, prim, field_generator, fcr, generator;
+
+  if (!PyArg_ParseTuple(args, "Oiiiiii|O", &msgObj, &nsym, &c_exp, &prim, &field_generator,
+                        &fcr, &generator, &genObj))
+    return NULL;
+
+  poly msg, gen;
+  if (!list_to_poly(msgObj, msg, field_charac(c_exp)))
+    return NULL;
+  if (genObj != Py_None && !list_to_poly(genObj, gen, field_charac(c_exp)))
+    return NULL;
+
+  try {
+    field &f = get_field(c_exp, prim, field_generator);
+    return poly_to_list(rs_encode_msg(f, msg, nsym, fcr, generator, gen));
+  } catch (...) {
+    set_python_error();
+    return NULL;
+  }
+}
+
+static PyObject *
+fastrs_syndromes(PyObject *self, PyObject *args)
+{
+  PyObject *msgObj;
+  int nsym, c_exp, prim, field_generator, fcr, generator;
+
+  if (!PyArg_ParseTuple(args, "Oiiiiii", &msgObj, &nsym, &c_exp, &prim, &field_generator,
+                        &fcr, &generator))
+    return NULL;
+
+  poly msg;
+  if (!list_to_poly(msgObj, msg, field_charac(c_exp)))
+    return NULL;
+
+  try {
+    field &f = get_field(c_exp, prim, field_generator);
+    return poly_to_list(rs_calc_syndromes(f, msg, nsym, fcr, generator));
+  } catch (...) {
+    set_python_error();
+    return NULL;
+  }
+}
+
+static PyObject *
+fastrs_correct(PyObject *self, PyObject *args)
+{
+  PyObject *msgObj;
+  PyObject *eraseObj = Py_None;
+  int nsym, c_exp, prim, field_generator, fcr, generator;
+  int only_erasures = 0;
+
+  if (!PyArg_ParseTuple(args, "Oiiiiii|Op", &msgObj, &nsym, &c_exp, &prim, &field_generator,
+                        &fcr, &generator, &eraseObj, &only_erasures))
+    return NULL;
+
+  poly msg, erase_pos;
+  if (!list_to_poly(msgObj, msg, field_charac(c_exp), true))
+    return NULL;
+  if (eraseObj != Py_None && !list_to_poly(eraseObj, erase_pos))
+    return NULL;
+  for (int e : erase_pos) {
+    if (e >= (int)msg.size() || e < -(int)msg.size()) {
+      PyErr_SetString(PyExc_IndexError, "erasure position out of range");
+      return NULL;
+    }
+    msg[e < 0 ? e + msg.size() : e] = 0;
+  }
+  for (int c : msg)
+    if (c < 0) {
+      PyErr_SetString(PyExc_TypeError, "missing symbol that is not marked as an erasure");
+      return NULL;
+    }
+
+  try {
+    field &f = get_field(c_exp, prim, field_generator);
+    std::pair<poly,poly> r = rs_correct_msg(f, msg, nsym, fcr, generator, erase_pos, only_erasures != 0);
+    PyObject *data = poly_to_list(r.first);
+    PyObject *ecc = poly_to_list(r.second);
+    return Py_BuildValue("(NN)", data, ecc);
+  } catch (...) {
+    set_python_error();
+    return NULL;
+  }
+}
+
+
+static PyMethodDef FastrsMethods[] = {
+    {"encode",  fastrs_encode, METH_VARARGS, "Reed-Solomon encode a message, returns message+ecc."},
+    {"syndromes",  fastrs_syndromes, METH_VARARGS, "Compute the syndromes of a codeword (with the leading 0 used by rs.py)."},
+    {"correct",  fastrs_correct, METH_VARARGS, "Correct errors and erasures in a codeword, returns (message, ecc)."},
+    {NULL, NULL, 0, NULL}        /* Sentinel */
+};
+
+static struct PyModuleDef fastrsmodule = {
+    PyModuleDef_HEAD_INIT,
+    "fastrs",   /* name of module */
+    NULL, /* module documentation, may be NULL */
+    -1,       /* size of per-interpreter state of the module,
+                 or -1 if the module keeps state in global variables. */
+    FastrsMethods
+};
+
+PyMODINIT_FUNC PyInit_fastrs(void)
+{
+    PyObject *m;
+
+    m = PyModule_Create(&fastrsmodule);
+    if (m == NULL)
+        return NULL;
+
+    FastrsError = PyErr_NewException("fastrs.error", NULL, NULL);
+    Py_XINCREF(FastrsError);
+    if (PyModule_AddObject(m, "error", FastrsError) < 0) {
+        Py_XDECREF(FastrsError);
+        Py_CLEAR(FastrsError);
+        Py_DECREF(m);
+        return NULL;
+    }
+
+    return m;
+}
@@ -906,9 +906,10 @@ class hedges_state:
     
 class FastHedgesPipeline(BaseCodec,CWtoDNA):
     def __init__(self,rate,pad_bits=8,prev_bits=8,guess_limit=100000,CodecObj=None,Policy=None,try_reverse = False,
-                 test_rates=False,rates_to_check=None):
+                 test_rates=False,rates_to_check=None,decode_threads=1):
         self._hedges_state = hedges_state(rate=rate,pad_bits=pad_bits,prev_bits=prev_bits)
         self._guess_limit=guess_limit
+        self._decode_threads=decode_threads #native threads used by batched decoding, 0 uses all hardware threads
         self._check_rates=test_rates
         self._try_reverse=try_reverse #option to try reverse complement, should do this if DNA not guarenteed to be in right position'
         if rates_to_check is None:
@@ -955,7 +956,7 @@ class FastHedgesPipeline(BaseCodec,CWtoDNA):
     
     def _decode(self,strand):
         reverse = False
-        if self._try_reverse: #if we need to check reverse, try a small number of guesses
+        if self._try_reverse and not getattr(strand,"orientation_known",False): #if we need to check reverse, try a small number of guesses
             reverse=self._test_reverse(strand)
         if self._check_rates:
             #TODO: may need to merge this logic with test reverse, but that would be pretty inefficient
@@ -971,6 +972,26 @@ class FastHedgesPipeline(BaseCodec,CWtoDNA):
             strand_return = fasthedges.decode(reverse_complement(strand.dna_strand), self._hedges_state, self._guess_limit)
             strand.codewords =strand_return["return_bytes"] 
         return strand
+
+    def _decode_batch(self,strands):
+        #rate testing needs per-strand state changes, so it stays on the serial path
+        if self._check_rates or len(strands)==0:
+            return [self._decode(s) for s in strands]
+        dna = [s.dna_strand for s in strands]
+        if self._try_reverse:
+            #strands already oriented by the pipeline's primer classifier skip the trial decodes
+            test = [i for i,s in enumerate(strands) if not getattr(s,"orientation_known",False)]
+            reverse_dna = [reverse_complement(dna[i]) for i in test]
+            reverse_rets = fasthedges.bulk_decode(reverse_dna, self._hedges_state, 5000, self._decode_threads)
+            forward_rets = fasthedges.bulk_decode([dna[i] for i in test], self._hedges_state, 1000, self._decode_threads)
+            for index,rc,r,f in zip(test,reverse_dna,reverse_rets,forward_rets):
+                reverse_none = sum([1 if _==None else 0 for _ in r["return_bytes"]])
+                forward_none = sum([1 if _==None else 0 for _ in f["return_bytes"]])
+                if reverse_none<forward_none: dna[index]=rc
+        rets = fasthedges.bulk_decode(dna, self._hedges_state, self._guess_limit, self._decode_threads)
+        for s,r in zip(strands,rets):
+            s.codewords = r["return_bytes"]
+        return strands
     
     #store some pertinent information like bit lengths of data seen to be able to reinstantiate the decoder in a correct state    
     def _encode_header(self):
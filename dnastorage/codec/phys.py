@@ -3,8 +3,6 @@ from dnastorage.primer.primer_util import *
 from dnastorage.exceptions import *
 from dnastorage.codec_types import *
 from dnastorage.strand_representation import *
-from Bio import pairwise2
-from Bio.pairwise2 import format_alignment
 import Levenshtein as ld
 from dnastorage.util.stats import *
 
@@ -146,18 +144,24 @@ class PrependSequence(BaseCodec):
             else:
                 raise err
         elif self._handler=="align":
-            align = pairwise2.align.localms(strand[0:self._search_range+slen],self._seq,1,-1,-1,-1,one_alignment_only=True)
-            if len(align)==0: return strand
-            align=align[0]
-            score= align[2]
-            score = sum([1 if _==_2 else 0 for _,_2 in zip(align[1],align[0])])
-            if score<(len(self._seq) - (len(self._seq)*0.3)): #KV made change for score to count total matches after realigning
-                return strand #finding alignment unsuccessful
-            else:
-                start=align[3]
-                end=align[4]
-                #logger.info("Prepend Good Alignment \n{} \n{} \n {} \n {} {}".format(align[0][start-5:end+5],align[1][start-5:end+5],score,start,end))
-                return strand[align[4]:]
+            return self._align_cut(strand,locate_primer(self._window(strand),self._seq))
+
+    #"align" handler: the primer is located by edit distance within search_range of the start, and accepted with at least 70% of its bases matching
+    def _window(self,strand):
+        return strand[0:self._search_range+len(self._seq)]
+    def _align_cut(self,strand,located):
+        matches,end = located
+        if end<0 or matches<(len(self._seq) - (len(self._seq)*0.3)):
+            return strand #finding alignment unsuccessful
+        return strand[end+1:]
+    def _decode_batch(self,strands):
+        #calls PrependSequence._decode by name, the pipeline subclasses override _decode for strand objects
+        if self._handler!="align": return [PrependSequence._decode(self,s) for s in strands]
+        out = [PrependSequence._decode(self,s) if s.find(self._seq)!=-1 else None for s in strands]
+        missing = [i for i,s in enumerate(out) if s is None]
+        for i,located in zip(missing,locate_primer_batch([self._window(strands[i]) for i in missing],self._seq)):
+            out[i] = self._align_cut(strands[i],located)
+        return out
 
 
 
@@ -202,18 +206,24 @@ class AppendSequence(BaseCodec):
             else:
                 raise err
         elif self._handler=="align":
-            align = pairwise2.align.localms(strand[len(strand)-len(self._seq)-self._search_range:len(strand)],self._seq,1,-1,-1,-1,one_alignment_only=True)
-            if len(align)==0:return strand
-            align=align[0]
-            score= align[2]
-            score = sum([1 if _==_2 else 0 for _,_2 in zip(align[1],align[0])])
-            if score<(len(self._seq) - (len(self._seq)*0.3)):
-                return strand
-            else:
-                start=align[3]
-                end=align[4]
-                #logger.info("Append Good Alignment \n{} \n{} \n {} \n {} {}".format(align[0][start-5:end+5],align[1][start-5:end+5],score,start,end))
-                return strand[0:align[3]+len(strand)-len(self._seq)-self._search_range]
+            return self._align_cut(strand,locate_primer(self._window(strand)[::-1],self._seq[::-1]))
+
+    #"align" handler: the primer is located by edit distance within search_range of the end, searching backwards from the end of the strand
+    def _window(self,strand):
+        return strand[max(0,len(strand)-len(self._seq)-self._search_range):]
+    def _align_cut(self,strand,located):
+        matches,end = located
+        if end<0 or matches<(len(self._seq) - (len(self._seq)*0.3)):
+            return strand
+        return strand[0:len(strand)-end-1]
+    def _decode_batch(self,strands):
+        #calls AppendSequence._decode by name, the pipeline subclasses override _decode for strand objects
+        if self._handler!="align": return [AppendSequence._decode(self,s) for s in strands]
+        out = [AppendSequence._decode(self,s) if s.find(self._seq)!=-1 else None for s in strands]
+        missing = [i for i,s in enumerate(out) if s is None]
+        for i,located in zip(missing,locate_primer_batch([self._window(strands[i])[::-1] for i in missing],self._seq[::-1])):
+            out[i] = self._align_cut(strands[i],located)
+        return out
 
 class PrependSequencePipeline(PrependSequence,DNAtoDNA):
     prepend_filter_ID=0
@@ -237,6 +247,16 @@ class PrependSequencePipeline(PrependSequence,DNAtoDNA):
             strand.dna_strand = None
             if strand.is_reversed:stats.inc(self._prepend_counter_attr)
         return strand
+    def _decode_batch(self,strands):
+        if self._ignore or self._seq=="": return strands
+        to_decode = [s for s in strands if s.dna_strand is not None]
+        for strand,dna_strand in zip(to_decode,PrependSequence._decode_batch(self,[s.dna_strand for s in to_decode])):
+            if strand.dna_strand==dna_strand:
+                strand.dna_strand = None
+                if strand.is_reversed:stats.inc(self._prepend_counter_attr)
+            else:
+                strand.dna_strand = dna_strand
+        return strands
 
 
 class ReversePipeline(BaseCodec,DNAtoDNA):
@@ -274,6 +294,16 @@ class AppendSequencePipeline(AppendSequence,DNAtoDNA):
             if strand.is_reversed: stats.inc(self._filter_counter_attr)
             strand.dna_strand = None
         return strand
+    def _decode_batch(self,strands):
+        if self._ignore or self._seq=="": return strands
+        to_decode = [s for s in strands if s.dna_strand is not None]
+        for strand,dna_strand in zip(to_decode,AppendSequence._decode_batch(self,[s.dna_strand for s in to_decode])):
+            if strand.dna_strand==dna_strand:
+                if strand.is_reversed: stats.inc(self._filter_counter_attr)
+                strand.dna_strand = None
+            else:
+                strand.dna_strand = dna_strand
+        return strands
 
 
 
@@ -0,0 +1,138 @@
+'''
+Columnar Reed-Solomon engine for outer codes.
+
+Outer codes protect every byte column of a sub-packet with the same (n,k) code, so
+instead of running one polynomial division per column we treat a sub-packet as a 2-D
+uint8 array (rows are strands, columns are byte positions) and do the GF(2^8) math for
+all columns at once with table lookups broadcast by numpy. Only columns whose syndromes
+are non-zero (or that carry erasures) are handed to the scalar decoder in rs.py.
+'''
+from functools import lru_cache
+import numpy as np
+from dnastorage.codec.reedsolomon.rs import ReedSolomonError
+
+
+class ColumnarReedSolomon:
+    def __init__(self, rs, generator=2, fcr=0, erasure_cache_size=256):
+        # rs is the scalar ReedSolomon instance whose tables (and prim polynomial) we share,
+        # this guarantees the parity we generate is identical to rs.rs_encode_msg
+        if rs.field_charac != 255:
+            raise ValueError("ColumnarReedSolomon only supports GF(2^8)")
+        self._rs = rs
+        self._generator = generator
+        self._fcr = fcr
+        self.field_charac = rs.field_charac
+        self.gf_exp = np.array(rs.gf_exp, dtype=np.int64)
+        self.gf_log = np.array(rs.gf_log, dtype=np.int64)
+        # full multiplication table built from broadcast log/exp lookups, mul[a,b] = a*b in GF(2^8)
+        values = np.arange(256)
+        self.gf_mul_table = self.gf_exp[(self.gf_log[values][:, None] + self.gf_log[values][None, :]) % self.field_charac].astype(np.uint8)
+        self.gf_mul_table[0, :] = 0
+        self.gf_mul_table[:, 0] = 0
+        self._parity_matrices = {}
+        self._syndrome_matrices = {}
+        # every byte column of a sub-packet usually shares one erasure pattern (whole strands missing), so the
+        # recovery matrix for a pattern is solved once and then reused for all columns and later sub-packets
+        self.erasure_recovery_matrix = lru_cache(maxsize=erasure_cache_size)(self._erasure_recovery_matrix)
+
+    def gf_matmul(self, A, B):
+        # (r,k) x (k,c) matrix product over GF(2^8), loops over k and vectorizes over the (r,c) plane
+        A = np.asarray(A, dtype=np.uint8)
+        B = np.asarray(B, dtype=np.uint8)
+        out = np.zeros((A.shape[0], B.shape[1]), dtype=np.uint8)
+        for i in range(A.shape[1]):
+            out ^= self.gf_mul_table[A[:, i][:, None], B[i][None, :]]
+        return out
+
+    def gf_inverse(self, x):
+        return int(self.gf_exp[(self.field_charac - self.gf_log[x]) % self.field_charac])
+
+    def gf_inverse_matrix(self, M):
+        # Gauss-Jordan elimination over GF(2^8), row operations are vectorized across each row
+        M = np.array(M, dtype=np.uint8)
+        n = M.shape[0]
+        inv = np.eye(n, dtype=np.uint8)
+        for col in range(n):
+            nonzero = np.flatnonzero(M[col:, col])
+            if len(nonzero) == 0:
+                raise ReedSolomonError("Singular matrix, erasure pattern cannot be solved")
+            pivot = col + nonzero[0]
+            if pivot != col:
+                M[[col, pivot]] = M[[pivot, col]]
+                inv[[col, pivot]] = inv[[pivot, col]]
+            scale = self.gf_inverse(M[col, col])
+            M[col] = self.gf_mul_table[scale, M[col]]
+            inv[col] = self.gf_mul_table[scale, inv[col]]
+            factors = M[:, col].copy()
+            factors[col] = 0
+            M ^= self.gf_mul_table[factors[:, None], M[col][None, :]]
+            inv ^= self.gf_mul_table[factors[:, None], inv[col][None, :]]
+        return inv
+
+    def _erasure_recovery_matrix(self, n, nsym, erase_pos):
+        # The syndromes of a valid codeword are zero: S_E c_E = S_K c_K (minus is xor). The first len(erase_pos)
+        # rows of S restricted to the erased positions form an invertible Vandermonde matrix, so
+        # c_E = inv(S_E) S_K c_K, giving one (erasures x known) matrix that recovers every column.
+        erase_pos = list(erase_pos)
+        known_pos = [i for i in range(n) if i not in set(erase_pos)]
+        S = self.syndrome_matrix(n, nsym)[:len(erase_pos)]
+        return self.gf_matmul(self.gf_inverse_matrix(S[:, erase_pos]), S[:, known_pos])
+
+    def correct_erasures(self, codewords, nsym, erase_pos):
+        # fill the rows in erase_pos for every column at once, returns the filled codewords and a mask of columns
+        # that are valid codewords afterwards (columns that also carry unknown errors need the full decoder)
+        codewords = np.array(codewords, dtype=np.uint8)
+        erase_pos = tuple(erase_pos)
+        if len(erase_pos) > nsym:
+            return codewords, np.zeros(codewords.shape[1], dtype=bool)
+        if len(erase_pos) == 0:
+            return codewords, ~self.calc_syndromes(codewords, nsym).any(axis=0)
+        R = self.erasure_recovery_matrix(codewords.shape[0], nsym, erase_pos)
+        known = np.delete(codewords, erase_pos, axis=0)
+        codewords[list(erase_pos)] = self.gf_matmul(R, known)
+        return codewords, ~self.calc_syndromes(codewords, nsym).any(axis=0)
+
+    def parity_matrix(self, k, nsym):
+        # RS encoding is linear, so parity = M^T P where row i of P is the parity of the unit message e_i
+        key = (k, nsym)
+        if key not in self._parity_matrices:
+            if k + nsym > self.field_charac:
+                raise ValueError("Message is too long (%i when max is %i)" % (k + nsym, self.field_charac))
+            gen = self._rs.rs_generator_poly(nsym, self._fcr, self._generator)
+            P = np.zeros((k, nsym), dtype=np.uint8)
+            for i in range(k):
+                unit = [0] * k
+                unit[i] = 1
+                P[i] = self._rs.rs_encode_msg(unit, nsym, self._fcr, self._generator, gen=gen)[k:]
+            self._parity_matrices[key] = P
+        return self._parity_matrices[key]
+
+    def syndrome_matrix(self, n, nsym):
+        # S[j,i] = (generator^(j+fcr))^(n-1-i), so that syndromes = S x codeword for every column
+        key = (n, nsym)
+        if key not in self._syndrome_matrices:
+            log_g = int(self.gf_log[self._generator])
+            powers = np.arange(n - 1, -1, -1, dtype=np.int64)
+            S = np.zeros((nsym, n), dtype=np.uint8)
+            for j in range(nsym):
+                S[j] = self.gf_exp[(log_g * (j + self._fcr) * powers) % self.field_charac]
+            self._syndrome_matrices[key] = S
+        return self._syndrome_matrices[key]
+
+    def encode_columns(self, messages, nsym):
+        # messages: (k, columns) array, returns the (nsym, columns) parity rows
+        messages = np.asarray(messages, dtype=np.uint8)
+        return self.gf_matmul(self.parity_matrix(messages.shape[0], nsym).T, messages)
+
+    def calc_syndromes(self, codewords, nsym):
+        # codewords: (n, columns) array, returns (nsym, columns) syndromes (without rs.py's leading 0)
+        codewords = np.asarray(codewords, dtype=np.uint8)
+        return self.gf_matmul(self.syndrome_matrix(codewords.shape[0], nsym), codewords)
+
+    def dirty_columns(self, codewords, nsym):
+        # indices of columns whose syndromes are not all zero
+        return np.flatnonzero(self.calc_syndromes(codewords, nsym).any(axis=0))
+
+    def correct_column(self, column, nsym, erase_pos=None):
+        # full Berlekamp-Massey/Forney decode on a single column, same contract as rs_correct_msg
+        return self._rs.rs_correct_msg(list(column), nsym, self._fcr, self._generator, erase_pos=erase_pos)
@@ -19,6 +19,11 @@ except NameError:
 class ReedSolomonError(Exception):
     pass
 
+try: # native port of this module, ReedSolomon below stays the reference implementation
+    import dnastorage.codec.fastrs as fastrs
+except ImportError:
+    fastrs = None
+
 ################### GALOIS FIELD ELEMENTS MATHS ###################
 
 def rwh_primes1(n):
@@ -212,6 +217,9 @@ class ReedSolomon:
         # c_exp is the exponent for the field's characteristic GF(2^c_exp)
 
         #Members of ReedSolomon class: gf_exp, gf_log, field_charac
+        self.c_exp = c_exp
+        self.prim = prim
+        self.generator = generator
         self.field_charac = int(2**c_exp - 1)
         self.gf_exp = [0] * (self.field_charac * 2) # anti-log (exponential) table. The first two elements will always be [GF256int(1), generator]
         self.gf_log = [0] * (self.field_charac+1) # log table, log[0] is impossible and thus unused
@@ -868,11 +876,30 @@ class ReedSolomon:
         return ( max(self.rs_calc_syndromes(msg, nsym, fcr, generator)) == 0 )
 
     
+class FastReedSolomon(ReedSolomon):
+    '''ReedSolomon with the per-strand hot paths (encode, syndromes and
+    correction) running in the fastrs C++ extension. Field tables are
+    still built here so the remaining helpers (and the columnar outer
+    code engine) share the exact same field.
+    '''
+    def rs_encode_msg(self, msg_in, nsym, fcr=0, generator=2, gen=None):
+        return fastrs.encode(msg_in, nsym, self.c_exp, self.prim, self.generator, fcr, generator, gen)
+
+    def rs_calc_syndromes(self, msg, nsym, fcr=0, generator=2):
+        return fastrs.syndromes(msg, nsym, self.c_exp, self.prim, self.generator, fcr, generator)
+
+    def rs_correct_msg(self, msg_in, nsym, fcr=0, generator=2, erase_pos=None, only_erasures=False):
+        try:
+            return fastrs.correct(msg_in, nsym, self.c_exp, self.prim, self.generator, fcr, generator, erase_pos, only_erasures)
+        except fastrs.error as e:
+            raise ReedSolomonError(str(e))
+
 def get_reed_solomon(c_exp=8):
+    codec = ReedSolomon if fastrs is None else FastReedSolomon
     if c_exp==8:
-        return ReedSolomon(generator=2, c_exp=8, prim=0x18d )
+        return codec(generator=2, c_exp=8, prim=0x18d )
     elif c_exp==16:
-        return ReedSolomon(generator=2, c_exp=16, prim=0x1002d )
+        return codec(generator=2, c_exp=16, prim=0x1002d )
     else:
         assert False and "ReedSolomon codec doesn't support field of width {} yet. Use c_exp=8 or c_exp=16".format(2**c_exp)
         
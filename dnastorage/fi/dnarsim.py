@@ -0,0 +1,222 @@
+'''
+NumPy port of the DNArSim k-mer conditioned nanopore channel (dnastorage/fi/DNArSim/channel.jl).
+
+Reads the same probability files as loadProb.jl (probability_path/k<k>/...) and runs the channel for a whole batch of
+strands at once: the loop goes over nucleotide positions, every step handles that position of all strands with array
+operations. Each position draws the same decisions as the Julia code:
+    first base: edit with BegErrByPosAvg, the edit is an insertion (replacing the base), deletion or substitution
+    last base: same with the End* rates
+    base i>=k-1 in between: deletion/substitution/match from the rates of the k-mer ending at i given the previous edit,
+                            then an insertion after a match or substitution with the k-mer's insertion length distribution
+    base 0<i<k-1 in between: dropped, the Julia branch for these positions compares a Char against a String and never
+                             emits anything, that behavior is kept so both implementations produce the same channel
+'''
+import os
+import numpy as np
+
+_bases = np.frombuffer(b"ACGT",dtype=np.uint8)
+_base_codes = np.full(256,4,dtype=np.int64)
+_base_codes[_bases] = np.arange(4)
+_sub_list = np.frombuffer(b"CGT" b"AGT" b"ACT" b"ACG",dtype=np.uint8).reshape(4,3) #A2C A2G A2T, C2A C2G C2T, ...
+_edits = ["M","D","I","S"] #previous edit states, same order as Yi in loadProb.jl
+MATCH,DELETION,INSERTION,SUBSTITUTION = range(4)
+
+
+def _read_value(path):
+    with open(path,"r") as f:
+        return float(f.read().split()[0])
+
+def _read_row(path):
+    #first row without its last column, like readdlm(path)[1,1:end-1]
+    with open(path,"r") as f:
+        return np.array([float(x) for x in f.readline().split()[:-1]],dtype=np.float64)
+
+def _padded_cumulative(rows):
+    #ragged probability rows to a matrix of running sums, padding never compares below a draw
+    width = max(len(r) for r in rows)
+    cumulative = np.full((len(rows),width),np.inf)
+    for i,r in enumerate(rows):
+        cumulative[i,:len(r)] = np.cumsum(r)
+    return cumulative,np.array([len(r) for r in rows],dtype=np.int64)
+
+def _sample_length(cumulative,lengths,r):
+    #1 based index of the first running sum >= r, 1 when r is above all of them
+    j = (cumulative<r[:,None]).sum(axis=1)
+    return np.where(j<lengths,j+1,1)
+
+
+class DNArSimChannel:
+    def __init__(self,probability_path,k):
+        self.k = k
+        root = os.path.join(probability_path,"k{}".format(k))
+        #first and last base: edit probability, ranges for insertion/deletion/substitution, insertion lengths
+        self._ends=[]
+        for prefix,length_file in (("Beg","insLenBegRates.txt"),("End","insLenEndRates.txt")):
+            edit = _read_value(os.path.join(root,"{}ErrByPosAvg.txt".format(prefix)))
+            rates = np.array([_read_value(os.path.join(root,"{}{}ByPosAvg.txt".format(prefix,x))) for x in ("Ins","Del")]+
+                             [_read_value(os.path.join(root,"{}MisAvg.txt".format(prefix)))])
+            length_cumulative,length_lengths = _padded_cumulative([_read_row(os.path.join(root,length_file))])
+            self._ends.append((edit,np.cumsum(rates/rates.sum()),length_cumulative[0],length_lengths[0]))
+        transitions = np.array([[_read_value(os.path.join(root,"{}2{}_Avg.txt".format(chr(a),chr(b)))) for b in _sub_list[i]]
+                                for i,a in enumerate(_bases)])
+        self._transitions = np.cumsum(transitions/transitions.sum(axis=1,keepdims=True),axis=1)
+        #k-mer tables per previous edit, rows are looked up through a dense k-mer code --> row array (AVG for unseen k-mers)
+        self._kmer_rows=[]
+        self._kmer_rates=[] #columns: insertion, deletion, substitution
+        self._length_rows=[]
+        self._length_tables=[]
+        for edit in _edits:
+            path = os.path.join(root,"KmerYi_prevYi{}_RatesAvg.txt".format(edit))
+            if os.path.isfile(path):
+                kmers=[]
+                rates=[]
+                with open(path,"r") as f:
+                    for line in f:
+                        fields = line.split()
+                        if len(fields)==0: continue
+                        kmers.append(fields[0])
+                        rates.append([float(x) for x in fields[1:4]])
+                self._kmer_rows.append(self._row_lookup(kmers))
+                self._kmer_rates.append(np.array(rates,dtype=np.float64))
+            else:
+                self._kmer_rows.append(None)
+                self._kmer_rates.append(None)
+            path = os.path.join(root,"KmerInsLen_prevYi{}_RatesAvg2.txt".format(edit))
+            if os.path.isfile(path):
+                kmers=[]
+                rows=[]
+                with open(path,"r") as f:
+                    for line in f:
+                        fields = line.split()
+                        if len(fields)==0: continue
+                        kmers.append(fields[0])
+                        rows.append([float(x) for x in "".join(fields[1:]).split(",")])
+                self._length_rows.append(self._row_lookup(kmers))
+                self._length_tables.append(_padded_cumulative(rows))
+            else:
+                self._length_rows.append(None)
+                self._length_tables.append(None)
+
+    def _row_lookup(self,kmers):
+        if "AVG" not in kmers:
+            raise ValueError("DNArSim k-mer table has no AVG row")
+        rows = np.full(4**self.k+1,kmers.index("AVG"),dtype=np.int64) #last entry is for k-mers with other characters
+        for row,kmer in enumerate(kmers):
+            if len(kmer)!=self.k or kmer=="AVG": continue
+            codes = _base_codes[np.frombuffer(kmer.encode(),dtype=np.uint8)]
+            if np.any(codes>3): continue
+            rows[int(np.dot(codes,4**np.arange(self.k-1,-1,-1)))] = row
+        return rows
+
+    def _table_rows(self,rows,edits,kmer_codes,name):
+        missing = [e for e in np.unique(edits).tolist() if rows[e] is None]
+        if len(missing)>0:
+            raise ValueError("DNArSim {} table for previous edit {} was not found".format(name,_edits[missing[0]]))
+        out = np.zeros(len(edits),dtype=np.int64)
+        for e in np.unique(edits).tolist():
+            out[edits==e] = rows[e][kmer_codes[edits==e]]
+        return out
+
+    def _ends_step(self,which,rng,base,emit,insert_length,prev_edit):
+        edit,ranges,length_cumulative,length_count = self._ends[which]
+        edited = rng.random(len(base))<=edit
+        kind = np.minimum(np.searchsorted(ranges,rng.random(len(base))),2) #0 insertion, 1 deletion, 2 substitution
+        insertion = edited&(kind==0)
+        substitution = edited&(kind==2)
+        insert_length[insertion] = _sample_length(np.broadcast_to(length_cumulative,(int(insertion.sum()),len(length_cumulative))),
+                                                  np.full(int(insertion.sum()),length_count),rng.random(int(insertion.sum())))
+        emit[:] = np.where(edited,0,base)
+        emit[substitution] = self._substitute(rng,base[substitution])
+        prev_edit[:] = np.where(edited,np.array([INSERTION,DELETION,SUBSTITUTION])[kind],MATCH)
+
+    def _substitute(self,rng,base):
+        codes = _base_codes[base]
+        out = np.zeros(len(base),dtype=np.uint8) #bases other than ACGT have no substitution and vanish, as in substB
+        known = codes<4
+        j = np.minimum((self._transitions[codes[known]]<rng.random(int(known.sum()))[:,None]).sum(axis=1),2)
+        out[known] = _sub_list[codes[known],j]
+        return out
+
+    def channel(self,strands,rng):
+        #strands: list of DNA strings, returns the list of strings after the channel
+        if len(strands)==0: return []
+        lengths = np.array([len(s) for s in strands],dtype=np.int64)
+        width = int(lengths.max())
+        seq = np.zeros((len(strands),width),dtype=np.uint8)
+        flat = np.frombuffer("".join(strands).encode(),dtype=np.uint8)
+        row = np.repeat(np.arange(len(strands)),lengths)
+        column = np.arange(len(flat))-np.repeat(np.cumsum(lengths)-lengths,lengths)
+        seq[row,column] = flat
+        codes = _base_codes[seq]
+        emit = np.zeros((len(strands),width),dtype=np.uint8) #base written for the position, 0 for none
+        insert_length = np.zeros((len(strands),width),dtype=np.int64) #random bases inserted after it
+        prev_edit = np.zeros(len(strands),dtype=np.int64)
+        kmer_codes = np.zeros(len(strands),dtype=np.int64)
+        invalid_since = np.full(len(strands),-1,dtype=np.int64) #last position with a non ACGT base
+        kmer_mask = 4**self.k
+        for i in range(width):
+            active = np.flatnonzero(lengths>i)
+            kmer_codes[active] = (kmer_codes[active]*4+np.minimum(codes[active,i],3))%kmer_mask
+            invalid_since[active[codes[active,i]>3]] = i
+            if i==0:
+                e = np.zeros(len(active),dtype=np.uint8)
+                l = np.zeros(len(active),dtype=np.int64)
+                p = np.zeros(len(active),dtype=np.int64)
+                self._ends_step(0,rng,seq[active,0],e,l,p)
+                emit[active,0],insert_length[active,0],prev_edit[active] = e,l,p
+                continue
+            end = active[lengths[active]==i+1]
+            if len(end)>0:
+                e = np.zeros(len(end),dtype=np.uint8)
+                l = np.zeros(len(end),dtype=np.int64)
+                p = prev_edit[end]
+                self._ends_step(1,rng,seq[end,i],e,l,p)
+                emit[end,i],insert_length[end,i],prev_edit[end] = e,l,p
+            middle = active[lengths[active]>i+1]
+            if i<self.k-1:
+                rng.random(len(middle)) #the Julia code still draws r1 for these positions
+                continue
+            if len(middle)==0: continue
+            kmer = np.where(invalid_since[middle]>i-self.k,kmer_mask,kmer_codes[middle])
+            edits = prev_edit[middle]
+            rates = np.zeros((len(middle),3))
+            rate_rows = self._table_rows(self._kmer_rows,edits,kmer,"k-mer rate")
+            for e in np.unique(edits).tolist():
+                rates[edits==e] = self._kmer_rates[e][rate_rows[edits==e]]
+            base = seq[middle,i]
+            edit_probability = rates[:,1]+rates[:,2]
+            edited = rng.random(len(middle))<=edit_probability
+            deletion = np.zeros(len(middle),dtype=bool)
+            deletion[edited] = rng.random(int(edited.sum()))<=rates[edited,1]/edit_probability[edited]
+            substitution = edited&~deletion
+            new_edit = np.where(deletion,DELETION,np.where(substitution,SUBSTITUTION,MATCH))
+            out = base.copy()
+            out[deletion] = 0
+            out[substitution] = self._substitute(rng,base[substitution])
+            #insertion after a match or substitution, its length distribution depends on that edit and the k-mer
+            inserting = ~deletion
+            inserting[inserting] = rng.random(int(inserting.sum()))<=rates[inserting,0]
+            lengths_out = np.zeros(len(middle),dtype=np.int64)
+            if np.any(inserting):
+                after = new_edit[inserting]
+                length_rows = self._table_rows(self._length_rows,after,kmer[inserting],"insertion length")
+                drawn = np.zeros(len(after),dtype=np.int64)
+                r = rng.random(len(after))
+                for e in np.unique(after).tolist():
+                    cumulative,counts = self._length_tables[e]
+                    rows = length_rows[after==e]
+                    drawn[after==e] = _sample_length(cumulative[rows],counts[rows],r[after==e])
+                lengths_out[inserting] = drawn
+                new_edit[inserting] = INSERTION
+            emit[middle,i],insert_length[middle,i],prev_edit[middle] = out,lengths_out,new_edit
+        #every position writes its base (if any) followed by its inserted random bases
+        valid = np.arange(width)[None,:]<lengths[:,None]
+        counts = ((emit>0).astype(np.int64)+insert_length)[valid]
+        first = np.repeat(emit[valid],counts)
+        slot = np.arange(int(counts.sum()))-np.repeat(np.cumsum(counts)-counts,counts)
+        written = np.repeat((emit>0)[valid],counts)
+        out = np.where(written&(slot==0),first,_bases[rng.integers(0,4,size=len(slot))])
+        written_before = np.concatenate([[0],np.cumsum(counts)])[np.cumsum(lengths)] #output bases up to the end of each read
+        text = out.tobytes().decode()
+        starts = [0]+written_before.tolist()[:-1]
+        return [text[a:b] for a,b in zip(starts,written_before.tolist())]
@@ -0,0 +1,108 @@
+'''
+Long-lived DNArSim (Julia) worker.
+
+Julia is only imported inside the worker process, so importing the fault models never pays the Julia start-up cost.
+The worker is a plain `python -m dnastorage.fi.dnarsim_worker` child (not a multiprocessing spawn, which would re-run
+an MPI __main__), it includes the DNArSim sources and loads the k-mer probabilities once, then serves batches of
+strands over a pipe until it is closed.
+'''
+import os
+import sys
+import atexit
+import subprocess
+from multiprocessing.connection import Connection
+
+import logging
+logger = logging.getLogger("dnastorage.fi.dnarsim_worker")
+logger.addHandler(logging.NullHandler())
+
+
+def _serve(requests,replies,dnarsim_path,kmer_length,probability_path,gc_interval):
+    try:
+        from julia.api import Julia
+        Julia(compiled_modules=False)
+        from julia import Main
+        Main.eval("""using DelimitedFiles""")
+        Main.include(os.path.join(dnarsim_path,"functions.jl"))
+        Main.include(os.path.join(dnarsim_path,"channel.jl"))
+        Main.include(os.path.join(dnarsim_path,"interface.jl"))
+        Main.load_parameters(kmer_length,probability_path)
+        Main.include(os.path.join(dnarsim_path,"loadProb.jl"))
+    except Exception as e:
+        replies.send((False,repr(e)))
+        return
+    replies.send((True,None))
+    batches=0
+    while True:
+        try:
+            strands = requests.recv()
+        except EOFError:
+            break
+        if strands is None: break
+        try:
+            replies.send((True,list(Main.channel(kmer_length,strands))))
+        except Exception as e:
+            replies.send((False,repr(e)))
+        batches+=1
+        if batches%gc_interval==0: Main.GC.gc() #collecting after every batch dominated short runs
+    requests.close()
+    replies.close()
+
+
+class DNArSimWorker:
+    _workers={} #one worker per (DNArSim path, kmer length, probability path) for the life of the process
+
+    @classmethod
+    def get(cls,dnarsim_path,kmer_length,probability_path,gc_interval=16):
+        key=(dnarsim_path,kmer_length,probability_path)
+        worker = cls._workers.get(key,None)
+        if worker is None or not worker.alive():
+            worker = DNArSimWorker(dnarsim_path,kmer_length,probability_path,gc_interval)
+            cls._workers[key]=worker
+        return worker
+
+    def __init__(self,dnarsim_path,kmer_length,probability_path,gc_interval=16):
+        to_worker_read,to_worker_write = os.pipe()
+        from_worker_read,from_worker_write = os.pipe()
+        self._process = subprocess.Popen([sys.executable,"-m","dnastorage.fi.dnarsim_worker",str(to_worker_read),str(from_worker_write),
+                                          dnarsim_path,str(kmer_length),probability_path,str(gc_interval)],
+                                         pass_fds=(to_worker_read,from_worker_write))
+        os.close(to_worker_read)
+        os.close(from_worker_write)
+        self._send = Connection(to_worker_write,readable=False)
+        self._recv = Connection(from_worker_read,writable=False)
+        atexit.register(self.close)
+        try:
+            ok,error = self._recv.recv()
+        except EOFError:
+            ok,error = False,"worker exited with {}".format(self._process.wait())
+        if not ok:
+            self.close()
+            raise RuntimeError("DNArSim worker failed to start: {}".format(error))
+        logger.info("started DNArSim worker pid {}".format(self._process.pid))
+
+    def alive(self):
+        return self._process.poll() is None
+
+    def channel(self,strands):
+        #strands: list of DNA strings, returns the list of strings after the nanopore channel
+        self._send.send(list(strands))
+        ok,out = self._recv.recv()
+        if not ok: raise RuntimeError("DNArSim worker failed: {}".format(out))
+        return out
+
+    def close(self):
+        if self._process.poll() is None:
+            try:
+                self._send.send(None)
+            except OSError:
+                pass
+            self._process.wait()
+        self._send.close()
+        self._recv.close()
+
+
+if __name__=="__main__":
+    read_fd,write_fd,dnarsim_path,kmer_length,probability_path,gc_interval = sys.argv[1:7]
+    _serve(Connection(int(read_fd),writable=False),Connection(int(write_fd),readable=False),
+           dnarsim_path,int(kmer_length),probability_path,int(gc_interval))
@@ -1,11 +1,11 @@
 #Classes for each of the fault models
 import os
+import copy
 import random
 import csv
 import pickle
 import re
 import time
-from Bio import SeqIO
 from scipy import stats
 import numpy as np
 import math
@@ -13,6 +13,9 @@ import math
 import dnastorage.util.generate as generate
 from dnastorage.strand_representation import *
 from dnastorage.fi.fault_strand_representation import *
+from dnastorage.fi.read_store import ReadStore
+from dnastorage.fi.dnarsim_worker import DNArSimWorker
+from dnastorage.fi.dnarsim import DNArSimChannel
 
 import logging
 logger = logging.getLogger("dnastorage.fi.fault_injector")
@@ -24,6 +27,29 @@ sub_dict={'A':['G','C','T'],'G':['C','A','T'], 'T':['G','C','A'], 'C':['G','T','
 #nucleotide list for insertion errors
 nuc_list=['A','C','T','G']
 
+#Walker alias table for drawing many samples from a fixed discrete distribution in O(1) each
+class AliasTable:
+    def __init__(self,probabilities):
+        p = np.asarray(probabilities,dtype=np.float64)
+        n = len(p)
+        scaled = p*n/p.sum()
+        self._prob = np.ones(n,dtype=np.float64)
+        self._alias = np.arange(n,dtype=np.int64)
+        small = [i for i in range(n) if scaled[i]<1.0]
+        large = [i for i in range(n) if scaled[i]>=1.0]
+        while small and large: #Vose's construction, every column is topped up by one large entry
+            s = small.pop()
+            l = large.pop()
+            self._prob[s] = scaled[s]
+            self._alias[s] = l
+            scaled[l] -= 1.0-scaled[s]
+            if scaled[l]<1.0: small.append(l)
+            else: large.append(l)
+        #leftovers only differ from 1 by rounding, they keep prob 1 and alias themselves
+    def sample(self,rng,size):
+        column = rng.integers(0,len(self._prob),size=size)
+        return np.where(rng.random(size)<self._prob[column],column,self._alias[column])
+
 #Base class with some common functions to all of the fault models
 class BaseFI:
     def __init__(self):
@@ -32,6 +58,8 @@ class BaseFI:
     def open(self,fault_injector,**kwargs):
         if fault_injector=="fixed_rate":
             return fixed_rate(**kwargs)
+        elif fault_injector=="fixed_rate_vectorized":
+            return fixed_rate_vectorized(**kwargs)
         elif fault_injector=="position_fixed_rate":
             return position_fixed_rate(**kwargs)
         elif fault_injector=="strand_fault_compressed":
@@ -44,13 +72,22 @@ class BaseFI:
             return pattern_fixed_rate(**kwargs)
         elif fault_injector=="DNArSim":
             return DNArSim(**kwargs)
+        elif fault_injector=="DNArSim_vectorized":
+            return DNArSim_vectorized(**kwargs)
         else:
             raise ValueError()
     #These two setting functions allow easier altertion of the input library to fault injection, and parameters around fault injection
     def set_library(self,input_strands):
         self._input_library=input_strands
+    def set_pool(self,pool):
+        #pool is the multiplicity encoded read pool, a list of (strand,copies)
+        self._input_pool=pool
     def Run(self):
         raise NotImplementedError()    
+    def RunPool(self):
+        #fault models that work read by read get the expanded pool, every output read has a multiplicity of 1
+        self.set_library([copy.copy(s) for s,copies in self._input_pool for _ in range(copies)])
+        return [(s,1) for s in self.Run()]
     def read_csv(self,file_name):
         _file=open(file_name,'r')
         csv_parsed=csv.reader(_file,delimiter=',')
@@ -58,47 +95,58 @@ class BaseFI:
  
 #use sequencing data to perform fault injection
 class sequencing_experiment(BaseFI):
+    #read_store_path: where the indexed read store built from the sequencing data is cached, defaults to next to the sequencing data
     def __init__(self,**args):
         BaseFI.__init__(self)
         self._max_reads=args.get("max_reads",float('inf')) #allow for subsetting of the whole indexed set
         if "sequencing_data_path" in args and "mapping_path" in args:
             assert os.path.exists(args["sequencing_data_path"]) and os.path.exists(args["mapping_path"])
             self._sequencing_data_path = args["sequencing_data_path"]
-            self._map  = pickle.load(open(args["mapping_path"],"rb")) #map: sequencing_record-->index_ints
+            self._map_path = args["mapping_path"]
         elif "experiment_path" in args:
             #need to derive sequencing_data_path and mapping_path from an experiment_path
             assert os.path.exists(args["experiment_path"]) and os.path.isdir(args["experiment_path"])
             self._sequencing_data_path = os.path.join(args["experiment_path"],"sequencing_data_link")
-            map_path = os.path.join(args["experiment_path"],"sequencing.map.pickle")
-            assert os.path.exists(map_path) and os.path.exists(self._sequencing_data_path)
-            self._map=pickle.load(open(map_path,"rb"))
+            self._map_path = os.path.join(args["experiment_path"],"sequencing.map.pickle")
+            assert os.path.exists(self._map_path) and os.path.exists(self._sequencing_data_path)
         else:
             raise ValueError("Invalid arguments for sequencing_experiment fault injection")
+        #FASTQ and map are only parsed when the store is missing or stale, every later run memory-maps the store
+        read_store_path = args.get("read_store_path",self._sequencing_data_path+".readstore")
+        self._store = ReadStore.open(read_store_path,self._sequencing_data_path,[self._map_path],self._load_map)
+
+    def _load_map(self):
         tmp_map = {}
-        for sub_map in self._map: #push things into one map that should be indexed by index_ints of the DNAStrand
-            tmp_map={**tmp_map,**self._map[sub_map]}
-        self._map=tmp_map      
-    def sequence_run_injection(self):
-        out_list=[]
+        sequencing_map = pickle.load(open(self._map_path,"rb")) #map: sequencing_record-->index_ints
+        for sub_map in sequencing_map: #push things into one map that should be indexed by index_ints of the DNAStrand
+            tmp_map={**tmp_map,**sequencing_map[sub_map]}
+        return tmp_map
+
+    def _library_reads(self):
+        #ids of the stored reads that map to a strand of the input library, in sequencing order
         input_library_map={}
         for strand in self._input_library:
             input_library_map[strand.index_ints] = strand
-        #assume fastq file for now
-        record_counter=0
-        for record in SeqIO.parse(self._sequencing_data_path,"fastq"):
-            seq_strand,subs = re.subn("U","T",str(record.seq))
-            seq_strand,n_subs = re.subn("N","A",seq_strand)
-            seq_strand=seq_strand.rstrip('\x00')
-            index_ints = self._map.get(record.id,None)
-            if index_ints is None or index_ints not in input_library_map: continue #dead strand or is unwanted by the given studied file
-            lib_strand=input_library_map[index_ints]
-            out_list.append(FaultDNA(lib_strand,seq_strand))
-            record_counter+=1
-            if record_counter>=self._max_reads: break 
-        assert len(out_list)>0
-        return out_list
+        wanted = np.array([index_ints in input_library_map for index_ints in self._store.index_table],dtype=bool)
+        read_ids = np.flatnonzero(wanted[self._store.index_ids]) if len(wanted)>0 else np.zeros(0,dtype=np.int64)
+        if self._max_reads<len(read_ids): read_ids=read_ids[:int(self._max_reads)]
+        return read_ids,input_library_map
+
+    def _fault_strands(self,read_ids,input_library_map):
+        index_table = self._store.index_table
+        index_ids = self._store.index_ids[read_ids].tolist()
+        return [FaultDNA(input_library_map[index_table[i]],seq) for i,seq in zip(index_ids,self._store.reads(read_ids))]
+
+    def sequence_run_injection(self):
+        read_ids,input_library_map = self._library_reads()
+        assert len(read_ids)>0
+        return self._fault_strands(read_ids,input_library_map)
     def Run(self):
         return self.sequence_run_injection()
+    def RunPool(self):
+        #reads come from the sequencing data, the library is only used to look up strands by index
+        self.set_library([s for s,_ in self._input_pool])
+        return [(s,1) for s in self.Run()]
 
 #builds on sequencing experiment FI to consider a subset of the strands that are mapped
 class sequencing_experiment_downsample(sequencing_experiment):
@@ -117,12 +165,13 @@ class sequencing_experiment_downsample(sequencing_experiment):
         assert type(self._down_sample) is float and self._down_sample<1.0 and self._down_sample>=0 #should have a float downsample at this point, and should be 0<= <1
         self._rng = np.random.default_rng(seed=0)
     def Run(self):
-        strands = sequencing_experiment.Run(self)
-        if self._down_sample is None: return strands #no downsampling
-        self._rng.shuffle(strands)
+        if self._down_sample is None: return sequencing_experiment.Run(self) #no downsampling
+        read_ids,input_library_map = self._library_reads()
+        assert len(read_ids)>0
         keep_percent = 1.0-self._down_sample
-        strands_to_keep = int(math.ceil(keep_percent*len(strands))) #round up the number of strands to keep
-        return strands[0:strands_to_keep]
+        strands_to_keep = int(math.ceil(keep_percent*len(read_ids))) #round up the number of strands to keep
+        #pick the kept reads by index, only those are decoded from the store
+        return self._fault_strands(self._rng.permutation(read_ids)[:strands_to_keep],input_library_map)
 
     
 #this class applies a fixed error rate to each nucleotide
@@ -137,6 +186,22 @@ class fixed_rate(BaseFI):
         self._injection=self.injection_sites()
         return self.inject_faults(self._injection)
 
+    def RunPool(self):
+        #reads that draw no fault share one FaultDNA per pool entry, only faulty reads are materialized
+        library=[]
+        owners=[]
+        for pool_index,(strand,copies) in enumerate(self._input_pool):
+            library+=[strand]*copies
+            owners+=[pool_index]*copies
+        self.set_library(library)
+        self._injection={i:sites for i,sites in self.injection_sites().items() if len(sites)>0}
+        clean_copies=[0]*len(self._input_pool)
+        for read_index,pool_index in enumerate(owners):
+            if read_index not in self._injection: clean_copies[pool_index]+=1
+        faulty=self.inject_faults(self._injection)
+        out_pool=[(FaultDNA(strand,strand.dna_strand),copies) for (strand,_),copies in zip(self._input_pool,clean_copies) if copies>0]
+        return out_pool+[(faulty[read_index],1) for read_index in self._injection]
+
     #go through each nucleotide in each strand and apply a flat fault rate
     def injection_sites(self):
         injection_sites={}
@@ -178,6 +243,76 @@ class fixed_rate(BaseFI):
         return out_list
 
 
+#same per-nucleotide model as fixed_rate, but all sites of the whole read pool are drawn at once with numpy
+#seed: optional seed for the numpy Generator, by default it is drawn from dnastorage.util.generate so set_seed still controls runs
+class fixed_rate_vectorized(fixed_rate):
+    base_codes = bytes("ACGT".index(chr(c)) if chr(c) in "ACGT" else 4 for c in range(256)) #bytes.translate table, 4 marks anything else
+    code_bases = np.frombuffer(b"ACGTN",dtype=np.uint8)
+    def __init__(self,**args):
+        fixed_rate.__init__(self,**args)
+        seed = args.get("seed") #the default is only drawn when no seed is given, so it does not advance generate
+        self._rng = np.random.default_rng(generate.rand_in_range(0,2**31-1) if seed is None else seed)
+
+    def Run(self):
+        strands = [s.dna_strand for s in self._input_library]
+        lengths = np.fromiter((len(s) for s in strands),dtype=np.int64,count=len(strands))
+        sites = self._rng.random(int(lengths.sum()))<=self.fault_rate
+        return [FaultDNA(s,f) for s,f in zip(self._input_library,self._inject(strands,lengths,sites))]
+
+    def RunPool(self):
+        strands = [s for s,_ in self._input_pool]
+        copies = np.array([c for _,c in self._input_pool],dtype=np.int64)
+        lengths = np.array([len(s.dna_strand) for s in strands],dtype=np.int64)
+        #only reads with at least one fault are simulated site by site, the rest stay shared clean copies
+        clean_probability = (1.0-min(self.fault_rate,1.0))**lengths
+        faulty_copies = self._rng.binomial(copies,1.0-clean_probability)
+        reads = np.repeat(np.arange(len(strands)),faulty_copies)
+        read_lengths = lengths[reads]
+        sites = self._rng.random(int(read_lengths.sum()))<=self.fault_rate
+        if len(reads)>0:
+            #condition each read on faulting: the first site follows a geometric distribution truncated to the read,
+            #sites after it are drawn independently as usual
+            if self.fault_rate>=1:
+                first = np.zeros(len(reads),dtype=np.int64)
+            else:
+                u = self._rng.random(len(reads))
+                first = np.ceil(np.log1p(-u*(1.0-clean_probability[reads]))/np.log1p(-self.fault_rate)).astype(np.int64)-1
+                first = np.clip(first,0,read_lengths-1)
+            read_starts = np.concatenate([[0],np.cumsum(read_lengths)[:-1]])
+            position = np.arange(len(sites))-np.repeat(read_starts,read_lengths)
+            sites &= position>np.repeat(first,read_lengths)
+            sites[read_starts+first] = True
+        faulty = self._inject([strands[i].dna_strand for i in reads.tolist()],read_lengths,sites)
+        out_pool = [(FaultDNA(s,s.dna_strand),c) for s,c in zip(strands,(copies-faulty_copies).tolist()) if c>0]
+        return out_pool+[(FaultDNA(strands[i],f),1) for i,f in zip(reads.tolist(),faulty)]
+
+    def _inject(self,strands,lengths,sites):
+        #strands: list of DNA strings, sites: flat mask over all their nucleotides, returns the faulty strings
+        bases = np.frombuffer("".join(strands).encode().translate(fixed_rate_vectorized.base_codes),dtype=np.uint8).copy()
+        sites = np.flatnonzero(sites)
+        kinds = self._rng.integers(0,3,size=len(sites)) #fault types are equally probable
+        substitutions = sites[kinds==0]
+        deletions = sites[kinds==1]
+        insertions = sites[kinds==2]
+        #each original nucleotide owns two output slots, an optional inserted base followed by the (possibly substituted) base
+        bases[substitutions] = (bases[substitutions]+self._rng.integers(1,4,size=len(substitutions)))%4 #offset 1..3 never gives the same base
+        inserted = np.zeros(len(bases),dtype=np.uint8)
+        inserted[insertions] = self._rng.integers(0,4,size=len(insertions))
+        keep = np.zeros((len(bases),2),dtype=bool)
+        keep[insertions,0] = True
+        keep[:,1] = True
+        keep[deletions,1] = False
+        slots = np.stack([inserted,bases],axis=1)[keep]
+        faulty = fixed_rate_vectorized.code_bases[slots].tobytes().decode()
+        #new length of each strand: insertions add a base, deletions remove one
+        strand_of_site = np.repeat(np.arange(len(strands)),lengths)
+        new_lengths = lengths+np.bincount(strand_of_site[insertions],minlength=len(strands))-np.bincount(strand_of_site[deletions],minlength=len(strands))
+        assert (new_lengths>0).all()
+        ends = np.cumsum(new_lengths).tolist()
+        starts = [0]+ends[:-1]
+        return [faulty[a:b] for a,b in zip(starts,ends)]
+
+
 class position_fixed_rate(fixed_rate): #does fixed rate error rates, except on a per-base basis based on experimental data
     def __init__(self,**args):
         fixed_rate.__init__(self,**args)
@@ -203,6 +338,8 @@ class position_fixed_rate(fixed_rate): #does fixed rate error rates, except on a
 
 
 class pattern_fixed_rate(fixed_rate): #allows the injection of patterns rather than single errors
+    #seed: optional seed for the numpy Generator, by default it is drawn from dnastorage.util.generate
+    fault_codes={"R":"0","D":"1","I":"2"}
     def __init__(self,**args):
         fixed_rate.__init__(self,**args)
         strand_rate_path = args.get("error_rate_path",None) #path to rates for each base indicating probability of pattern occuring
@@ -214,36 +351,70 @@ class pattern_fixed_rate(fixed_rate): #allows the injection of patterns rather t
             logger.warning(e)
             exit(1)
         items = sorted(pattern_data.items(),key=lambda x: x[1],reverse=True)
-        indexed_probs = [(i,_[1]) for i,_ in enumerate(items)] #distribution will generate indices to patterns
         self._pattern_map = [_[0] for _ in items] #map indices back to patterns
-        self._pattern_gen = stats.rv_discrete(name="pattern",values=(list(zip(*indexed_probs))[0],list(zip(*indexed_probs))[1]))
-            
-    #go through each nucleotide in each strand and apply a flat fault rate
+        self._pattern_alias = AliasTable([_[1] for _ in items])
+        self._rates = np.asarray(self._rate_data,dtype=np.float64)
+        seed = args.get("seed") #the default is only drawn when no seed is given, so it does not advance generate
+        self._rng = np.random.default_rng(generate.rand_in_range(0,2**31-1) if seed is None else seed)
+        #flatten the patterns into one op table: op offset from the burst start, and the bases left in the strand an op needs
+        op_offsets=[]
+        op_limits=[]
+        op_codes=[]
+        self._op_starts=[]
+        self._consumed=[] #positions a whole pattern replaces or deletes
+        for pattern in self._pattern_map:
+            self._op_starts.append(len(op_codes))
+            offset=0
+            for e in pattern:
+                if e not in pattern_fixed_rate.fault_codes: continue
+                op_offsets.append(offset)
+                op_codes.append(pattern_fixed_rate.fault_codes[e])
+                if e=="I":
+                    op_limits.append(offset)
+                else:
+                    op_limits.append(offset+1)
+                    offset+=1
+            self._consumed.append(offset)
+        self._op_starts.append(len(op_codes))
+        self._op_starts = np.array(self._op_starts,dtype=np.int64)
+        self._consumed = np.array(self._consumed,dtype=np.int64)
+        self._op_offsets = np.array(op_offsets,dtype=np.int64)
+        self._op_limits = np.array(op_limits,dtype=np.int64)
+        self._op_codes = np.array(op_codes,dtype=object)
+
+    #go through each nucleotide in each strand and start a burst error at the position's rate
     def injection_sites(self):
-        injection_sites={}
-        #go through the strands and pick faults
-        for strand_index,strand in enumerate(self._input_library):
-            injection_sites[strand_index]=[]
-            skip_to_index=-1
-            for nuc_index,nuc in enumerate(strand.dna_strand):
-                if nuc_index<skip_to_index: continue #allow skipping to get burst errors
-                inject_fault=generate.rand()
-                if inject_fault<=self._rate_data[nuc_index]:
-                    pattern_index = self._pattern_gen.rvs(size=1)
-                    pattern = self._pattern_map[int(pattern_index)]
-                    inject_index=nuc_index
-                    for e in pattern:
-                        if e=="I":
-                            injection_sites[strand_index].append((inject_index,"2"))
-                        elif e=="D":
-                            if inject_index>=len(strand.dna_strand): break
-                            injection_sites[strand_index].append((inject_index,"1"))
-                            inject_index+=1
-                        elif e=="R":
-                            if inject_index>=len(strand.dna_strand): break
-                            injection_sites[strand_index].append((inject_index,"0"))
-                            inject_index+=1
-                    skip_to_index=inject_index+1 #if we replaced or deleted in this burst error, skip to next position that can take an error
+        lengths = np.array([len(s.dna_strand) for s in self._input_library],dtype=np.int64)
+        starts = np.concatenate([[0],np.cumsum(lengths)]).astype(np.int64)
+        position = np.arange(starts[-1],dtype=np.int64)-np.repeat(starts[:-1],lengths)
+        #a draw for every nucleotide, draws inside a burst are ignored which leaves the other draws independent
+        hits = np.flatnonzero(self._rng.random(len(position))<=self._rates[position])
+        hit_patterns = self._pattern_alias.sample(self._rng,len(hits))
+        hit_reads = np.searchsorted(starts,hits,side="right")-1
+        #accept bursts in rounds, each round takes the next hit of every read that is past its previous burst
+        accepted=[]
+        reads = np.unique(hit_reads)
+        eligible = starts[reads]
+        while len(reads)>0:
+            next_hit = np.searchsorted(hits,eligible)
+            valid = next_hit<len(hits)
+            valid[valid] = hit_reads[next_hit[valid]]==reads[valid]
+            reads,next_hit = reads[valid],next_hit[valid]
+            accepted.append(next_hit)
+            remaining = starts[reads+1]-hits[next_hit]
+            eligible = hits[next_hit]+np.minimum(self._consumed[hit_patterns[next_hit]],remaining)+1
+        accepted = np.sort(np.concatenate(accepted)) if accepted else np.zeros(0,dtype=np.int64)
+        #expand every accepted burst into its ops, ops that would run past the strand end are dropped
+        patterns = hit_patterns[accepted]
+        op_counts = self._op_starts[patterns+1]-self._op_starts[patterns]
+        burst = np.repeat(np.arange(len(accepted)),op_counts)
+        op = np.arange(int(op_counts.sum()),dtype=np.int64)-np.repeat(np.cumsum(op_counts)-op_counts-self._op_starts[patterns],op_counts)
+        op_reads = hit_reads[accepted][burst]
+        op_positions = position[hits[accepted]][burst]
+        keep = self._op_limits[op]<=lengths[op_reads]-op_positions
+        injection_sites={strand_index:[] for strand_index in range(len(self._input_library))}
+        for strand_index,fault_index,error in zip(op_reads[keep].tolist(),(op_positions+self._op_offsets[op])[keep].tolist(),self._op_codes[op[keep]]):
+            injection_sites[strand_index].append((fault_index,error))
         return injection_sites
 
 
@@ -340,11 +511,9 @@ class strand_fault_compressed(BaseFI):
 
 
 
-from julia.api import Julia
-jl = Julia(compiled_modules=False)    
-from julia import Main    
-
 #Python interface to DNArSim that is implemented in Julia, the injection module directly calls the DNArSim fault injector to generate nanopore-based error profiles
+#Julia runs in a persistent worker process (dnastorage.fi.dnarsim_worker) shared by every DNArSim model of this process with the same parameters
+#gc_interval: batches the worker runs between Julia garbage collections
 class DNArSim(BaseFI):
     def __init__(self,**args):
         assert os.environ['DNArSimPath']
@@ -353,19 +522,32 @@ class DNArSim(BaseFI):
         self.kmer_length = args.get("kmer_length",6)
         if "probability_path" not in args:
             raise ValueError("Path to probability path for DNArSim does not exist, please specify")
-        #set up julia environment, this should really need to be done once each entire batch run
-        Main.eval("""using DelimitedFiles""")
-        Main.include(os.path.join(self.DNArSimPath,"functions.jl"))
-        Main.include(os.path.join(self.DNArSimPath,"channel.jl"))
-        Main.include(os.path.join(self.DNArSimPath,"interface.jl"))
-        Main.load_parameters(self.kmer_length,args["probability_path"])
-        Main.include(os.path.join(self.DNArSimPath,"loadProb.jl"))
+        self._worker = DNArSimWorker.get(self.DNArSimPath,self.kmer_length,args["probability_path"],args.get("gc_interval",16))
     def julia_run_injection(self):
         inject_set=[x.dna_strand for x in self._input_library]
-        out_list=Main.channel(self.kmer_length,inject_set)
+        out_list=self._worker.channel(inject_set)
         assert len(inject_set)==len(out_list)
         out_list=[FaultDNA(x,y) for x,y in zip(self._input_library,out_list)]
-        Main.GC.gc()
         return out_list
     def Run(self):
         return self.julia_run_injection()
+
+
+#same k-mer conditioned nanopore channel as DNArSim, run with numpy in this process (dnastorage/fi/dnarsim.py) instead of Julia
+#loads the same files from probability_path, seed: optional seed for the numpy Generator, by default drawn from dnastorage.util.generate
+class DNArSim_vectorized(BaseFI):
+    _channels={} #probability tables are loaded once per (probability_path, kmer length)
+    def __init__(self,**args):
+        BaseFI.__init__(self)
+        self.kmer_length = args.get("kmer_length",6)
+        if "probability_path" not in args:
+            raise ValueError("Path to probability path for DNArSim does not exist, please specify")
+        key=(args["probability_path"],self.kmer_length)
+        if key not in DNArSim_vectorized._channels:
+            DNArSim_vectorized._channels[key]=DNArSimChannel(args["probability_path"],self.kmer_length)
+        self._channel = DNArSim_vectorized._channels[key]
+        seed = args.get("seed") #the default is only drawn when no seed is given, so it does not advance generate
+        self._rng = np.random.default_rng(generate.rand_in_range(0,2**31-1) if seed is None else seed)
+    def Run(self):
+        out_list=self._channel.channel([x.dna_strand for x in self._input_library],self._rng)
+        return [FaultDNA(x,y) for x,y in zip(self._input_library,out_list)]
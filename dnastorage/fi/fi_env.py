@@ -5,14 +5,16 @@ from dnastorage.fi.readdist import *
 from dnastorage.fi.fault_injector import *
 from dnastorage.strand_representation import *
 from dnastorage.primer.primer_util import *
+import numpy as np
 import random
 import copy
+import dnastorage.util.generate as generate
 
 
 
 
 def fault_injection_modes():
-    return ["fixed_rate","missing_strands","strand_fault_compressed","strand_fault","distribution_rate","combo"]
+    return ["fixed_rate","fixed_rate_vectorized","DNArSim_vectorized","missing_strands","strand_fault_compressed","strand_fault","distribution_rate","combo"]
 
 def distribution_functions():
     return ["negative_binomial","poisson","bernoulli"]
@@ -25,7 +27,9 @@ class Fi_Env(object):
         self._clean_strands=clean_strands #clean strand library
         self._og_strands=clean_strands
         self._reverse_complement = fi_env_params["reverse_complement"]
+        self._rng=np.random.default_rng(generate.rand_in_range(0,2**31-1))
         self._fault_strands=[]
+        self._fault_pool=[]
 
     def _distribute_reads(self):
         read_count=[]
@@ -33,19 +37,23 @@ class Fi_Env(object):
         dist=[]
         #Tuple format accelerates simulation of fault models of nucleotide strand faults and missing strand faults
         if not isinstance(self._fault_mode,strand_fault_compressed):
-            for ind,s in enumerate(self._og_strands):
-                read_cnt=self._read_distributor.gen(s)
-                dist.append((ind,read_cnt))
-                new_pool+=[copy.copy(s) for i in range(0,read_cnt)]
+            #multiplicity encoded pool of (strand,copies), clean strands are shared rather than copied per read
+            read_counts=self._read_distributor.gen_counts(self._og_strands)
+            reverse_counts=np.zeros_like(read_counts)
             if self._reverse_complement: #want to allow for reverse complements to exist
-                for s in new_pool:
-                    rand_choice =random.randint(0,1)
-                    if rand_choice==1: s.dna_strand = reverse_complement(s.dna_strand) #reverse complements            
-            random.shuffle(new_pool) #shuffle strands
+                reverse_counts=self._rng.binomial(read_counts,0.5) #each read is reversed with probability 1/2
+            dist=list(enumerate(read_counts.tolist()))
+            for s,read_cnt,reverse_cnt in zip(self._og_strands,read_counts.tolist(),reverse_counts.tolist()):
+                if read_cnt-reverse_cnt>0:
+                    new_pool.append((s,read_cnt-reverse_cnt))
+                if reverse_cnt>0:
+                    reverse_strand=copy.copy(s)
+                    reverse_strand.dna_strand = reverse_complement(s.dna_strand) #reverse complements
+                    new_pool.append((reverse_strand,reverse_cnt))
             return new_pool,dist
         else:
             #make a simple array of tuples in format (strand,count for that strand)
-            new_pool=[(copy.copy(s),self._read_distributor.gen(s)) for s in self._og_strands]
+            new_pool=[(copy.copy(s),c) for s,c in zip(self._og_strands,self._read_distributor.gen_counts(self._og_strands).tolist())]
             pool_size=0
             for strand in new_pool:
                 pool_size+=strand[1]
@@ -54,12 +62,17 @@ class Fi_Env(object):
     def Run(self):
         #run an instance of fault injection and simulation
         pool,size = self._distribute_reads()
-        self._fault_mode.set_library(pool)
-        self._fault_strands=self._fault_mode.Run()
+        self._fault_strands=None
+        if isinstance(self._fault_mode,strand_fault_compressed):
+            self._fault_mode.set_library(pool)
+            self._fault_pool=[(s,1) for s in self._fault_mode.Run()]
+        else:
+            self._fault_mode.set_pool(pool)
+            self._fault_pool=self._fault_mode.RunPool()
         #make sure everything goes in as a fault strand
-        for s_index,s in enumerate(self._fault_strands):
+        for s_index,(s,copies) in enumerate(self._fault_pool):
             if not isinstance(s,FaultDNA):
-                self._fault_strands[s_index]=FaultDNA(self._fault_strands[s_index],self._fault_strands[s_index].dna_strand) #simple copy with no errors inejcted
+                self._fault_pool[s_index]=(FaultDNA(s,s.dna_strand),copies) #simple copy with no errors inejcted
 
     def __next__(self):
         if self._iter_count<self._num_strands:
@@ -71,10 +84,21 @@ class Fi_Env(object):
         
     def __iter__(self):
         self._iter_count=0
-        self._num_strands=len(self._fault_strands)
+        self._num_strands=len(self.get_strands())
         return self 
 
+    def get_pool(self):
+        #multiplicity encoded fault strands, a list of (FaultDNA,copies), copies of an entry share one object.
+        #PoolInterface streams it to the decoders without expanding it
+        return self._fault_pool
+
     def get_strands(self):
+        #decoding works on strands in place, so every read is expanded to its own (shallow) copy only when asked for
+        if self._fault_strands is None:
+            self._fault_strands=[]
+            for s,copies in self._fault_pool:
+                self._fault_strands+=[s]+[copy.copy(s) for i in range(1,copies)]
+            random.shuffle(self._fault_strands) #shuffle strands
         return self._fault_strands
     
 if __name__=="__main__":
@@ -0,0 +1,115 @@
+'''
+Indexed binary store of mapped sequencing reads, used to replay sequencing experiments without re-parsing FASTQ.
+
+A store is a directory holding numpy arrays that are memory-mapped on load, so every worker on a node shares
+the same pages:
+    bases.npy     - uint8, reads packed 4 bases per byte (2 bits per base, first base in the low bits)
+    offsets.npy   - int64, base offset of each read in the packed stream, with one extra entry for the end
+    index_ids.npy - int32, row of index_table holding the index_ints the read maps to
+    index_table.pickle - list of index_ints tuples
+    meta.json     - source files the store was built from, used to detect stale stores
+'''
+import os
+import json
+import pickle
+import shutil
+import tempfile
+import numpy as np
+from dnastorage.util.strandinterface import iter_fastq
+
+import logging
+logger = logging.getLogger("dnastorage.fi.read_store")
+logger.addHandler(logging.NullHandler())
+
+#U reads as T and N as A, same as the FASTQ replay did, anything else that is not a base also becomes A
+_base_codes = bytes({"C":1,"G":2,"T":3,"U":3}.get(chr(c),0) for c in range(256))
+_code_bases = np.frombuffer(b"ACGT",dtype=np.uint8)
+
+
+def _source_meta(sequencing_data_path,mapping_paths):
+    meta={}
+    for path in [sequencing_data_path]+list(mapping_paths):
+        st = os.stat(path)
+        meta[os.path.abspath(path)] = [st.st_size,st.st_mtime]
+    return meta
+
+
+class ReadStore:
+    def __init__(self,path):
+        self.path = path
+        self.bases = np.load(os.path.join(path,"bases.npy"),mmap_mode="r")
+        self.offsets = np.load(os.path.join(path,"offsets.npy"),mmap_mode="r")
+        self.index_ids = np.load(os.path.join(path,"index_ids.npy"),mmap_mode="r")
+        with open(os.path.join(path,"index_table.pickle"),"rb") as index_table:
+            self.index_table = pickle.load(index_table)
+
+    def __len__(self):
+        return len(self.index_ids)
+
+    @classmethod
+    def open(cls,path,sequencing_data_path,mapping_paths,load_map):
+        #opens the store at path, (re)building it when it is missing or older than its sources.
+        #load_map is only called on a rebuild and must return the record id --> index_ints map
+        meta = _source_meta(sequencing_data_path,mapping_paths)
+        meta_path = os.path.join(path,"meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path,"r") as meta_file:
+                if json.load(meta_file)==json.loads(json.dumps(meta)):
+                    return ReadStore(path)
+            logger.info("read store {} is stale, rebuilding".format(path))
+        ReadStore.build(path,sequencing_data_path,load_map(),meta)
+        return ReadStore(path)
+
+    @classmethod
+    def build(cls,path,sequencing_data_path,record_map,meta={}):
+        #one pass over the FASTQ, only reads that map to some index_ints are kept
+        index_lookup={}
+        index_table=[]
+        index_ids=[]
+        lengths=[]
+        packed=[]
+        for record_id,seq in iter_fastq(sequencing_data_path):
+            index_ints = record_map.get(record_id,None)
+            if index_ints is None: continue
+            seq = seq.rstrip(b'\x00')
+            if index_ints not in index_lookup:
+                index_lookup[index_ints]=len(index_table)
+                index_table.append(index_ints)
+            index_ids.append(index_lookup[index_ints])
+            lengths.append(len(seq))
+            packed.append(seq.translate(_base_codes))
+        codes = np.frombuffer(b"".join(packed),dtype=np.uint8)
+        codes = np.concatenate([codes,np.zeros((-len(codes))%4,dtype=np.uint8)]).reshape(-1,4)
+        bases = codes[:,0]|(codes[:,1]<<2)|(codes[:,2]<<4)|(codes[:,3]<<6)
+        offsets = np.concatenate([[0],np.cumsum(lengths,dtype=np.int64)]).astype(np.int64)
+        #write next to the final location and rename, concurrent builders then never see a half written store
+        parent = os.path.dirname(os.path.abspath(path))
+        tmp_path = tempfile.mkdtemp(prefix=".readstore_",dir=parent)
+        np.save(os.path.join(tmp_path,"bases.npy"),bases)
+        np.save(os.path.join(tmp_path,"offsets.npy"),offsets)
+        np.save(os.path.join(tmp_path,"index_ids.npy"),np.array(index_ids,dtype=np.int32))
+        with open(os.path.join(tmp_path,"index_table.pickle"),"wb") as index_table_file:
+            pickle.dump(index_table,index_table_file)
+        with open(os.path.join(tmp_path,"meta.json"),"w") as meta_file:
+            json.dump(meta,meta_file)
+        if os.path.exists(path):
+            shutil.rmtree(path,ignore_errors=True)
+        try:
+            os.rename(tmp_path,path)
+        except OSError: #another worker finished first
+            shutil.rmtree(tmp_path,ignore_errors=True)
+        logger.info("built read store {} with {} reads".format(path,len(index_ids)))
+
+    def reads(self,read_ids):
+        #decode the reads with the given ids (in that order) back to strings
+        read_ids = np.asarray(read_ids,dtype=np.int64)
+        starts = np.asarray(self.offsets[read_ids])
+        lengths = np.asarray(self.offsets[read_ids+1])-starts
+        total = int(lengths.sum())
+        if total==0: return [""]*len(read_ids)
+        read_starts = np.concatenate([[0],np.cumsum(lengths)[:-1]])
+        positions = np.arange(total,dtype=np.int64)-np.repeat(read_starts-starts,lengths)
+        codes = (np.asarray(self.bases[positions>>2])>>((positions&3)<<1).astype(np.uint8))&3
+        text = _code_bases[codes].tobytes().decode()
+        ends = np.cumsum(lengths).tolist()
+        return [text[a:b] for a,b in zip(read_starts.tolist(),ends)]
@@ -15,9 +15,11 @@ logger.addHandler(logging.NullHandler())
 Top level class for distribution classes that generate copies of DNA strands based on some distribution
 '''
 class ReadDistribution(object):
-    def __init__(self,mean,var):
+    def __init__(self,mean,var,seed=None):
         self._mean=mean
         self._var=var
+        #generator for batch sampling, seeded from dnastorage.util.generate unless a seed is given so set_seed still pins a run
+        self._rng=np.random.default_rng(generate.rand_in_range(0,2**31-1) if seed is None else seed)
 
     @classmethod
     def open(self,distribution,**kwargs):
@@ -46,17 +48,29 @@ class ReadDistribution(object):
     def gen(self,strand):
         raise NotImplementedError()
 
+    '''
+    gen_batch samples n values at once, returns a numpy array
+    '''
+    def gen_batch(self,n):
+        raise NotImplementedError()
+
+    '''
+    gen_counts returns a numpy array with the number of copies of each strand in strands
+    '''
+    def gen_counts(self,strands):
+        return self.gen_batch(len(strands))
+
 
 #Instantiate this class in order to generate random variables from the negative binomial distribution with gamma function parameterization (rather than classical parameterization)
 class DNANegativeBinomial(ReadDistribution):
     def __init__(self,**kwargs):
         assert "mean" in kwargs and "var" in kwargs
-        ReadDistribution.__init__(self,kwargs["mean"],kwargs["var"])
+        ReadDistribution.__init__(self,kwargs["mean"],kwargs["var"],kwargs.get("seed",None))
         self._cumulative_array=[]
         self._prob_array=[]
         #variance should be greater than the mean for neg binomial, otherwise use Poisson distribution
-        assert var>mean
-        self._theta=mean**2/(var-mean)
+        assert self._var>self._mean
+        self._theta=self._mean**2/(self._var-self._mean)
         last_cumlative=0
         index=0
         #build the cummulative probability array and probability array 
@@ -106,6 +120,10 @@ class DNANegativeBinomial(ReadDistribution):
             cumulative_index=cumulative_index+1
         return cumulative_index
 
+    def gen_batch(self,n):
+        #same inverse transform as gen, the first index whose cumulative probability reaches U
+        return np.searchsorted(np.array(self._cumulative_array),self._rng.random(n),side="left").astype(np.int64)
+
 
 
 
@@ -115,7 +133,7 @@ This is a simple class that samples a poisson distribution, relies on scipy and
 class DNAPoisson(ReadDistribution):
     def __init__(self,**kwargs):
         assert "mean" in kwargs
-        ReadDistribution.__init__(self,kwargs["mean"],kwargs["mean"])
+        ReadDistribution.__init__(self,kwargs["mean"],kwargs["mean"],kwargs.get("seed",None))
         assert self._mean==self._var
         
     def pmf(self,X):
@@ -124,6 +142,9 @@ class DNAPoisson(ReadDistribution):
     def gen(self,strand):
         return np.random.poisson(self._mean)
 
+    def gen_batch(self,n):
+        return self._rng.poisson(self._mean,n).astype(np.int64)
+
 
 '''
 A success/fail type distribution, success will return exactly N reads, a failure will mean an erasure
@@ -140,7 +161,7 @@ class DNABernoulli(ReadDistribution):
             self._dist_indexes.add(tuple(index)) #everything outside this set will automatically be given 0 reads
         logger.info("dist_indexes {}".format(self._dist_indexes))
 
-        ReadDistribution.__init__(self,kwargs["mean"]*kwargs["n_success"],(1-kwargs["mean"])*(kwargs["mean"])*kwargs["n_success"]**2)
+        ReadDistribution.__init__(self,kwargs["mean"]*kwargs["n_success"],(1-kwargs["mean"])*(kwargs["mean"])*kwargs["n_success"]**2,kwargs.get("seed",None))
 
     def pmf(self,X):
         if X != 0 and X!=self._n_success:
@@ -158,6 +179,15 @@ class DNABernoulli(ReadDistribution):
         else:
             return 0
 
+    def gen_batch(self,n):
+        return np.where(self._rng.random(n)<=self._success_prob,self._n_success,0).astype(np.int64)
+
+    def gen_counts(self,strands):
+        counts=self.gen_batch(len(strands))
+        if len(self._dist_indexes)>0: #toss out strands we dont want
+            counts[[s.index_ints not in self._dist_indexes for s in strands]]=0
+        return counts
+
     
 def bins_array(data,bin_size):
     num_bins=int(math.ceil((max(data)-min(data))/bin_size))
@@ -24,6 +24,11 @@ ROBUST_FAILURE_PROBABILITY = 0.01
 NUMPY_TYPE = np.uint8
 EPSILON = 0.0001
 
+GRAPH_RANDOM = 0 # neighbors from random.sample seeded with the droplet index, the original format
+GRAPH_PHILOX = 1 # neighbors from Philox4x32-10 keyed with the droplet index, generated for many droplets at once
+GRAPH_FORMATS = (GRAPH_RANDOM, GRAPH_PHILOX)
+GRAPH_FORMAT = GRAPH_PHILOX # format new droplets are encoded with, the droplet header records it
+
 class Symbol:
     __slots__ = ["index", "degree", "data", "neighbors", "rs"] # fixing attributes may reduce memory usage
 
@@ -32,11 +37,12 @@ class Symbol:
         self.degree = degree
         self.data = data
 
-    def log(self, blocks_quantity, systematic):
-        neighbors, _ = generate_indexes(self.index, self.degree, blocks_quantity, systematic)
+    def log(self, blocks_quantity, systematic, graph_format=GRAPH_FORMAT):
+        # graph_format is the one the droplet was encoded with
+        neighbors, _ = generate_indexes(self.index, self.degree, blocks_quantity, systematic, graph_format)
         print("symbol_{} degree={}\t {}".format(self.index, self.degree, neighbors))
 
-def generate_indexes(symbol_index, degree, blocks_quantity, systematic):
+def generate_indexes(symbol_index, degree, blocks_quantity, systematic, graph_format=GRAPH_RANDOM):
     """Randomly get `degree` indexes, given the symbol index as a seed
 
     Generating with a seed allows saving only the seed (and the amount of degrees) 
@@ -46,18 +52,154 @@ def generate_indexes(symbol_index, degree, blocks_quantity, systematic):
     Additionnally, even if XORing one block with itself among with other is not a problem for the algorithm, 
     it is better to avoid uneffective operations like that.
 
-    To be sure to get the same random indexes, we need to pass 
+    To be sure to get the same random indexes, we need to pass the same graph format. The seeded generator is
+    private to the call, the global random state is left alone.
     """
     if systematic and symbol_index < blocks_quantity:
         indexes = [symbol_index]               
         degree = 1     
-    else:
-        random.seed(symbol_index)
+    elif graph_format == GRAPH_RANDOM:
         assert degree > 0 and degree <= blocks_quantity, f"degree: {degree}, block quantity: {blocks_quantity}"
-        indexes = random.sample(range(blocks_quantity), degree)
+        indexes = random.Random(symbol_index).sample(range(blocks_quantity), degree)
+    else:
+        _, _, neighbors = generate_graph([symbol_index], [degree], blocks_quantity, systematic, graph_format)
+        indexes = neighbors.tolist()
 
     return indexes, degree
 
+PHILOX_M = (0xD2511F53, 0xCD9E8D57)
+PHILOX_W = (0x9E3779B9, 0xBB67AE85)
+
+def philox4x32(counters, key0, key1=0, rounds=10):
+    """ Philox4x32-10 (Salmon et al., Random123) over arrays: counters is a (N,4) uint32 matrix, key0/key1 are
+    scalars or N long uint32 arrays. Returns the (N,4) uint32 random words, one independent block per counter. """
+    mask = np.uint64(0xffffffff)
+    c = [np.asarray(counters[:, i], dtype=np.uint64) for i in range(4)]
+    k0 = np.asarray(key0, dtype=np.uint64) & mask
+    k1 = np.asarray(key1, dtype=np.uint64) & mask
+    for _ in range(rounds):
+        p0 = c[0] * np.uint64(PHILOX_M[0])
+        p1 = c[2] * np.uint64(PHILOX_M[1])
+        c = [(p1 >> np.uint64(32)) ^ c[1] ^ k0, p1 & mask, (p0 >> np.uint64(32)) ^ c[3] ^ k1, p0 & mask]
+        k0 = (k0 + np.uint64(PHILOX_W[0])) & mask
+        k1 = (k1 + np.uint64(PHILOX_W[1])) & mask
+    return np.stack(c, axis=1).astype(np.uint32)
+
+def philox_neighbors(indexes, degrees, blocks_quantity):
+    """ Neighbors of droplet i are the first degrees[i] distinct values of the stream floor(u * blocks_quantity / 2**32),
+    u running over the words of Philox4x32-10 keyed with indexes[i] at counters 0, 1, 2... Every droplet draws what it
+    still needs each round, so the stream is consumed in order whatever the batch. Returns CSR pointers and neighbors.
+    """
+    droplets_n = len(indexes)
+    drawn = np.zeros(droplets_n, dtype=np.int64) # Philox blocks consumed by each droplet
+    owners = values = np.zeros(0, dtype=np.int64) # distinct draws of the pending droplets, in stream order per droplet
+    done = [(owners, values)] # (owners, values) of the droplets with all their neighbors
+    pending = np.flatnonzero(degrees > 0)
+    found = np.zeros(droplets_n, dtype=np.int64)
+    while len(pending) > 0:
+        blocks = -(-(degrees[pending] - found[pending]) // 4) # 4 words per block
+        new_owners = np.repeat(pending, blocks)
+        counters = np.zeros((len(new_owners), 4), dtype=np.uint32)
+        counters[:, 0] = np.repeat(drawn[pending] - np.cumsum(blocks) + blocks, blocks) + np.arange(len(new_owners))
+        drawn[pending] += blocks
+        words = philox4x32(counters, indexes[new_owners]).astype(np.uint64)
+        owners = np.concatenate([owners, np.repeat(new_owners, 4)])
+        values = np.concatenate([values, ((words * np.uint64(blocks_quantity)) >> np.uint64(32)).astype(np.int64).ravel()])
+        # keep the first occurrence of each value, a stable sort leaves repeats after it
+        key = owners * blocks_quantity + values
+        order = np.argsort(key, kind="stable")
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = key[order[1:]] != key[order[:-1]]
+        kept = np.sort(order[first])
+        owners, values = owners[kept], values[kept]
+        found = np.bincount(owners, minlength=droplets_n)
+        complete = found[owners] >= degrees[owners]
+        done.append((owners[complete], values[complete]))
+        owners, values = owners[~complete], values[~complete]
+        pending = pending[found[pending] < degrees[pending]]
+    # the first degree distinct values of each droplet
+    owners = np.concatenate([d[0] for d in done])
+    values = np.concatenate([d[1] for d in done])
+    order = np.argsort(owners, kind="stable")
+    owners, values = owners[order], values[order]
+    starts = np.concatenate([[0], np.cumsum(np.bincount(owners, minlength=droplets_n))])
+    rank = np.arange(len(owners)) - starts[owners]
+    return np.concatenate([[0], np.cumsum(degrees)]), values[rank < degrees[owners]]
+
+def generate_graph(indexes, degrees, blocks_quantity, systematic, graph_format=GRAPH_RANDOM):
+    """ generate_indexes() for many droplets at once. Returns the degrees actually used (one for systematic droplets)
+    and the neighbors in compressed form: neighbors of droplet i are neighbors[pointers[i]:pointers[i+1]]. """
+    indexes = np.asarray(indexes, dtype=np.int64)
+    degrees = np.array(degrees, dtype=np.int64)
+    plain = indexes < blocks_quantity if systematic else np.zeros(len(indexes), dtype=bool)
+    degrees[plain] = 1
+    assert np.all((degrees > 0) & (degrees <= blocks_quantity)), f"degrees out of range, block quantity: {blocks_quantity}"
+    if graph_format == GRAPH_RANDOM:
+        neighbors = []
+        for i in range(len(indexes)):
+            selection_indexes, _ = generate_indexes(int(indexes[i]), int(degrees[i]), blocks_quantity, systematic)
+            neighbors += selection_indexes
+        return degrees, np.concatenate([[0], np.cumsum(degrees)]), np.array(neighbors, dtype=np.int64)
+    assert graph_format == GRAPH_PHILOX, f"unknown graph format {graph_format}"
+    pointers, neighbors = philox_neighbors(indexes, np.where(plain, 0, degrees), blocks_quantity)
+    neighbors = np.insert(neighbors, pointers[:-1][plain], indexes[plain]) # systematic droplets, already in place
+    return degrees, np.concatenate([[0], np.cumsum(degrees)]), neighbors
+
+def take_rows(pointers, neighbors, rows):
+    """ Rows of a compressed neighbors graph, as a new (pointers, neighbors) pair """
+    lengths = pointers[rows + 1] - pointers[rows]
+    taken = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    positions = np.repeat(pointers[rows] - taken[:-1], lengths) + np.arange(taken[-1])
+    return taken, neighbors[positions]
+
+class GraphCache:
+    """ Graphs generate_graph() already built, per (graph format, blocks quantity, systematic). The encoder can fill
+    it so decoding the same droplets again (e.g. every Monte Carlo run) skips the generation. """
+    def __init__(self):
+        self._graphs = {} # key --> (sorted indexes, degrees, pointers, neighbors)
+
+    def clear(self):
+        self._graphs.clear()
+
+    def generate(self, indexes, degrees, blocks_quantity, systematic, graph_format=GRAPH_RANDOM):
+        key = (graph_format, blocks_quantity, bool(systematic))
+        indexes = np.asarray(indexes, dtype=np.int64)
+        degrees = np.array(degrees, dtype=np.int64)
+        if systematic: degrees[indexes < blocks_quantity] = 1
+        hit = np.zeros(len(indexes), dtype=bool)
+        rows = np.zeros(len(indexes), dtype=np.int64)
+        if key in self._graphs:
+            known, known_degrees, known_pointers, known_neighbors = self._graphs[key]
+            rows = np.minimum(np.searchsorted(known, indexes), len(known) - 1)
+            hit = (known[rows] == indexes) & (known_degrees[rows] == degrees)
+        missed = np.flatnonzero(~hit)
+        new_degrees, new_pointers, new_neighbors = generate_graph(indexes[missed], degrees[missed], blocks_quantity, systematic, graph_format)
+        if len(missed) == len(indexes):
+            self._store(key, indexes, new_degrees, new_pointers, new_neighbors)
+            return new_degrees, new_pointers, new_neighbors
+        # stitch cached and new rows back in the requested order
+        hit_pointers, hit_neighbors = take_rows(known_pointers, known_neighbors, rows[hit])
+        all_pointers = np.concatenate([hit_pointers, new_pointers[1:] + hit_pointers[-1]])
+        all_neighbors = np.concatenate([hit_neighbors, new_neighbors])
+        order = np.argsort(np.concatenate([np.flatnonzero(hit), missed]), kind="stable")
+        pointers, neighbors = take_rows(all_pointers, all_neighbors, order)
+        if len(missed) > 0: self._store(key, indexes[missed], new_degrees, new_pointers, new_neighbors)
+        return degrees, pointers, neighbors
+
+    def _store(self, key, indexes, degrees, pointers, neighbors):
+        if len(indexes) == 0: return
+        if key in self._graphs: # merge, the new rows win
+            known, known_degrees, known_pointers, known_neighbors = self._graphs[key]
+            kept = np.flatnonzero(~np.isin(known, indexes))
+            kept_pointers, kept_neighbors = take_rows(known_pointers, known_neighbors, kept)
+            indexes = np.concatenate([known[kept], indexes])
+            degrees = np.concatenate([known_degrees[kept], degrees])
+            pointers = np.concatenate([kept_pointers, pointers[1:] + kept_pointers[-1]])
+            neighbors = np.concatenate([kept_neighbors, neighbors])
+        indexes, first = np.unique(indexes, return_index=True) # a droplet listed twice is kept once
+        pointers, neighbors = take_rows(pointers, neighbors, first)
+        self._graphs[key] = (indexes, degrees[first], pointers, neighbors)
+
 def checksum(chunk):
    checksum_num = NUMPY_TYPE(0xA5)
    for byte in chunk:
@@ -6,7 +6,8 @@ import math
 import argparse
 import numpy as np
 import dnastorage.lt_codes_python.core as core
-from dnastorage.lt_codes_python.decoder import decode
+from dnastorage.lt_codes_python.decoder import decode_matrix
+from dnastorage.lt_codes_python.encoder import HEADER_SIZE
 import random
 
 
@@ -22,48 +23,40 @@ def blocks_write(blocks, file, filesize, packet_size):
 
     # Convert back the bytearray to bytes and shrink back 
     last_bytes = bytes(blocks[-1])
-    shrinked_data = last_bytes[:filesize % packet_size]
+    shrinked_data = last_bytes[:filesize - packet_size * (len(blocks) - 1)]
     file.write(shrinked_data)
 
-def decode_file(filename, outputname, file_blocks_n, file_size, systematic, packet_size, rs_size_fountain):
+def decode_buffer(data, file_blocks_n, file_size, systematic, packet_size, rs_size_fountain, cache=None):
+    """ decode_file() in memory: droplets are read back from the bytes-like data (a trailing partial droplet is ignored),
+    returns the file_size decoded bytes, blocks that could not be recovered are zeros, along with the recovered blocks count """
+    width = HEADER_SIZE + packet_size # as encode_matrix() lays droplets out
+    droplets = np.frombuffer(data, dtype=core.NUMPY_TYPE, count=len(data) // width * width).reshape(-1, width)
+    recovered_blocks, recovered_n = decode_matrix(droplets, file_blocks_n, systematic, packet_size, rs_size_fountain, cache)
+    return recovered_blocks.reshape(-1)[:file_size].tobytes(), recovered_n
 
-    # Generating symbols (or drops) from the blocks
-    file_symbols = []
-    with open(filename, 'rb') as output_f:
-        print("ltdecode starting to read in fountain file")
-        print(f"file size is {os.path.getsize(filename)}")
-        data = output_f.read(packet_size + rs_size_fountain + 5)
-        while len(data) != 0:
-            print(len(data))
-            if len(data) == packet_size + rs_size_fountain + 5:
-                file_symbols.append(core.Symbol(index=0, degree=0, data=data))
-            data = output_f.read(packet_size + rs_size_fountain + 5)
-
-    
-        
-    #dump file_symbols into a file 'wb' write binary            
+def decode_file(filename, outputname, file_blocks_n, file_size, systematic, packet_size, rs_size_fountain, cache=None):
 
-    # HERE: Simulating the loss of packets?
+    # Droplets (symbols) are the fixed size records of the fountain file
+    print("ltdecode starting to read in fountain file")
+    print(f"file size is {os.path.getsize(filename)}")
+    with open(filename, 'rb') as output_f:
+        data = output_f.read()
 
     # Recovering the blocks from symbols
     print("read back fountain file starting to decode")
-    recovered_blocks, recovered_n = decode(file_symbols, file_blocks_n, systematic,packet_size, rs_size_fountain)
-    
+    recovered, recovered_n = decode_buffer(data, file_blocks_n, file_size, systematic, packet_size, rs_size_fountain, cache)
+
     if core.VERBOSE:
-        print(recovered_blocks)
-        print("------ Blocks :  \t-----------")
-        # print(file_blocks)
+        print(recovered)
 
     # if recovered_n != file_blocks_n:
     #     print("All blocks are not recovered, we cannot proceed the file writing")
     #     #fix me write recovered blocks to allow calculation of mismatched bytes
     #     return False
 
-   
-
     # Write down the recovered blocks in a copy 
     with open(outputname, "wb") as file_copy:
-        blocks_write(recovered_blocks, file_copy, file_size, packet_size)
+        file_copy.write(recovered)
 
     print("Wrote {} bytes in {}".format(os.path.getsize(outputname), outputname))
     return True
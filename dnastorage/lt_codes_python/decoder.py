@@ -1,162 +1,192 @@
 from dnastorage.lt_codes_python.core import *
-from reedsolo import RSCodec
+from dnastorage.lt_codes_python.encoder import HEADER_SIZE, crc8_rows
 from dnastorage.util.stats import *
-from dnastorage.codec.strand import *
+from collections import deque
 import logging
 
 logger = logging.getLogger()
 
+UNKNOWN, SOLVED, INACTIVE = 0, 1, 2 # block states while decoding
 
-def recover_graph(symbols, blocks_quantity, systematic, rs_size_fountain):
-    """ Get back the same random indexes (or neighbors), thanks to the symbol id as seed.
-    For an easy implementation purpose, we register the indexes as property of the Symbols objects.
-    """
 
-    for i, symbol in enumerate(symbols):
-        stats.inc("fountain_drops", 1)
-        #rs_obj = RSCodec(rs_size_fountain)
-        checksum_len = 1
-        checksum_pos = 0
-        
-        data = symbol.data[checksum_len:]
-        crc = CRC8()
-        if symbol.data[checksum_pos] != crc._crc(data):
-            logger.info(f"checksum failed for droplet checksumfromfile: {symbol.data[checksum_pos]} checksum: {crc._crc(data)} data: {symbol.data}")
-            stats.inc("checksum_fountain_fail", 1)
-            symbol.data = None
-            continue
-
-        else:
-            logger.info(f"checksum passed for droplet {i}")
-
-        dataBefore = symbol.data[:4]
-
-        symbol.data = np.frombuffer(symbol.data, dtype=NUMPY_TYPE)
-
-        dataAfter = symbol.data[:4]
-
-        logger.info(f"for droplet {i} sample before {dataBefore}  sample after {dataAfter}")
-
-        symbol.data = symbol.data[checksum_len:]
-
-        index = 0
-        pos_degree = 0
-        len_degree = 1
-        pos_index = len_degree + pos_degree
-        len_index = 4
-        for i in range(len_index):
-            index += int(symbol.data[i + pos_index]) * 256 ** i
-
-        symbol.degree = int(symbol.data[pos_degree])
-        if symbol.degree == 0:
-            symbol.data = None
-            continue
-        symbol.index = index
-        logger.info(f"generating indexes for index:{symbol.index}  degree: {symbol.degree} i = {i}")
-        neighbors, deg = generate_indexes(symbol.index, symbol.degree, blocks_quantity, systematic)
-        symbol.neighbors = {x for x in neighbors}
-        symbol.data = symbol.data[len_degree + len_index:]
-
-        if VERBOSE:
-            symbol.log(blocks_quantity)
-
-    return symbols
-
-def reduce_neighbors(block_index, blocks, symbols):
-    """ Loop over the remaining symbols to find for a common link between 
-    each symbol and the last solved block `block`
-
-    To avoid increasing complexity and another for loop, the neighbors are stored as dictionnary
-    which enable to directly delete the entry after XORing back.
-    """
-    
-    for other_symbol in symbols:
-        if other_symbol.degree > 1 and other_symbol.data is not None and block_index in other_symbol.neighbors:
-        
-            # XOR the data and remove the index from the neighbors
-            other_symbol.data = np.bitwise_xor(blocks[block_index], other_symbol.data)
-            other_symbol.neighbors.remove(block_index)
-
-            other_symbol.degree -= 1
-            
-            if VERBOSE:
-                print("XOR block_{} with symbol_{} :".format(block_index, other_symbol.index), list(other_symbol.neighbors.keys())) 
-
-
-def decode(symbols, blocks_quantity, systematic,packet_size, rs_size_fountain):
-    """ Iterative decoding - Decodes all the passed symbols to build back the data as blocks. 
-    The function returns the data at the end of the process.
-    
-    1. Search for an output symbol of degree one
-        (a) If such an output symbol y exists move to step 2.
-        (b) If no output symbols of degree one exist, iterative decoding exits and decoding fails.
-    
-    2. Output symbol y has degree one. Thus, denoting its only neighbour as v, the
-        value of v is recovered by setting v = y.
-
-    3. Update.
-
-    4. If all k input symbols have been recovered, decoding is successful and iterative
-        decoding ends. Otherwise, go to step 1.
+def recover_graph(droplets, blocks_quantity, systematic, rs_size_fountain, cache=None):
+    """ Get back the same random indexes (or neighbors), thanks to the droplet index as seed and the graph format
+    the droplet records. droplets is a (drops, HEADER_SIZE+packet) uint8 matrix, droplets failing their CRC,
+    with a degree out of [1, blocks_quantity] (corrupted in a way the CRC missed) or an unknown graph format are dropped. Returns the droplet payloads as a (drops, packet)
+    matrix and their neighbors in compressed form: neighbors of droplet i are neighbors[pointers[i]:pointers[i+1]].
+    cache is an optional GraphCache.
     """
 
-    symbols_n = len(symbols)
-    assert symbols_n > 0, "There are no symbols to decode."
+    stats.inc("fountain_drops", len(droplets))
+    checked = crc8_rows(droplets[:, 1:]) == droplets[:, 0]
+    stats.inc("checksum_fountain_fail", int((~checked).sum()))
+    droplets = droplets[checked]
+    in_range = (droplets[:, 1] > 0) & (droplets[:, 1] <= blocks_quantity)
+    stats.inc("degree_out_of_range_fountain", int((~in_range).sum()))
+    droplets = droplets[in_range]
+    known = np.isin(droplets[:, HEADER_SIZE - 1], GRAPH_FORMATS)
+    stats.inc("unknown_graph_format_fountain", int((~known).sum()))
+    droplets = droplets[known]
+    droplets = droplets[np.argsort(droplets[:, HEADER_SIZE - 1], kind="stable")] # one batch per graph format
+    indexes = (droplets[:, 2:HEADER_SIZE - 1].astype(np.int64) << np.arange(0, 24, 8)).sum(axis=1)
+
+    generate = cache.generate if cache is not None else generate_graph
+    pointers, neighbors = [np.zeros(1, dtype=np.int64)], []
+    for graph_format in GRAPH_FORMATS:
+        batch = droplets[:, HEADER_SIZE - 1] == graph_format
+        if not batch.any(): continue
+        _, batch_pointers, batch_neighbors = generate(indexes[batch], droplets[batch, 1], blocks_quantity, systematic, graph_format)
+        pointers.append(batch_pointers[1:] + pointers[-1][-1])
+        neighbors.append(batch_neighbors)
+    neighbors = np.concatenate(neighbors) if len(neighbors) > 0 else np.zeros(0, dtype=np.int64)
+    return np.array(droplets[:, HEADER_SIZE:]), np.concatenate(pointers), neighbors
+
+
+class _InactivationDecoder:
+    """ Peeling decoder over an indexed droplet graph, with inactivation when peeling stalls.
+
+    Each droplet keeps its payload reduced by the blocks solved so far, the number of its still unknown neighbors and
+    the XOR of their indexes, so a degree one droplet names its last neighbor directly. Solving a block only touches
+    the droplets listed for that block. When no droplet has degree one, the unknown neighbors but one of a lowest
+    degree droplet are inactivated: they become variables of a small GF(2) system, droplet payloads then carry a
+    bit-packed (uint64 words) coefficient row over those variables. Droplets reduced to degree zero are the equations
+    of that system, solved by Gaussian elimination once peeling is done.
+    """
 
-    # We keep `blocks_n` notation and create the empty list
-    blocks_n = blocks_quantity
-    blocks = [None] * blocks_n
+    def __init__(self, payloads, pointers, neighbors, blocks_n):
+        drops_n = len(payloads)
+        self.blocks_n = blocks_n
+        self.payloads = payloads
+        self.pointers = pointers
+        self.neighbors = neighbors
+        degrees = np.diff(pointers)
+        owners = np.repeat(np.arange(drops_n, dtype=np.int64), degrees)
+        order = np.argsort(neighbors, kind="stable")
+        self.block_droplets = owners[order] # droplets of block b: block_droplets[block_pointers[b]:block_pointers[b+1]]
+        self.block_pointers = np.concatenate([[0], np.cumsum(np.bincount(neighbors, minlength=blocks_n))])
+        self.degrees = degrees.copy()
+        self.neighbor_xor = np.bitwise_xor.reduceat(neighbors, pointers[:-1]) if len(neighbors) > 0 else np.zeros(drops_n, dtype=np.int64)
+        self.active = degrees > 0
+        self.state = np.zeros(blocks_n, dtype=np.int8)
+        self.block_payloads = np.zeros((blocks_n, payloads.shape[1]), dtype=NUMPY_TYPE)
+        self.coefficients = np.zeros((drops_n, 1), dtype=np.uint64)
+        self.block_coefficients = np.zeros((blocks_n, 1), dtype=np.uint64)
+        self.inactive_blocks = [] # block of each inactive variable
+        self.equations = [] # droplets reduced to degree zero
+        self.queue = deque(np.flatnonzero(self.degrees == 1).tolist())
+
+    def _remove_block(self, block, solver=-1):
+        # block is known (possibly in terms of inactive variables), take it out of every droplet still using it
+        droplets = self.block_droplets[self.block_pointers[block]:self.block_pointers[block + 1]]
+        droplets = droplets[self.active[droplets] & (droplets != solver)]
+        if len(droplets) == 0: return
+        self.degrees[droplets] -= 1
+        self.neighbor_xor[droplets] ^= block
+        self.payloads[droplets] ^= self.block_payloads[block]
+        self.coefficients[droplets] ^= self.block_coefficients[block]
+        self.queue.extend(droplets[self.degrees[droplets] == 1].tolist())
+        done = droplets[self.degrees[droplets] == 0]
+        self.active[done] = False
+        self.equations += done.tolist()
+
+    def _inactivate(self, block):
+        variable = len(self.inactive_blocks)
+        if variable // 64 >= self.coefficients.shape[1]: # room for more variables
+            self.coefficients = np.concatenate([self.coefficients, np.zeros_like(self.coefficients)], axis=1)
+            self.block_coefficients = np.concatenate([self.block_coefficients, np.zeros_like(self.block_coefficients)], axis=1)
+        self.inactive_blocks.append(block)
+        self.state[block] = INACTIVE
+        self.block_coefficients[block, variable // 64] = np.uint64(1) << np.uint64(variable % 64)
+        self._remove_block(block)
+
+    def peel(self):
+        while True:
+            while len(self.queue) > 0:
+                droplet = self.queue.popleft()
+                if not self.active[droplet] or self.degrees[droplet] != 1: continue
+                block = int(self.neighbor_xor[droplet])
+                self.active[droplet] = False
+                self.state[block] = SOLVED
+                self.block_payloads[block] = self.payloads[droplet]
+                self.block_coefficients[block] = self.coefficients[droplet]
+                self._remove_block(block, droplet)
+            candidates = np.flatnonzero(self.active)
+            if len(candidates) == 0: return
+            # stalled: inactivate all unknown neighbors but one of a lowest degree droplet, it then solves the last one
+            droplet = candidates[np.argmin(self.degrees[candidates])]
+            unknown = self.neighbors[self.pointers[droplet]:self.pointers[droplet + 1]]
+            unknown = unknown[self.state[unknown] == UNKNOWN]
+            for block in unknown[1:]:
+                self._inactivate(int(block))
+            self.queue.append(droplet)
+
+    def solve(self):
+        """ Gaussian elimination of the inactive variables, returns the recovered blocks and a mask of those recovered """
+        variables_n = len(self.inactive_blocks)
+        system = self.coefficients[self.equations].copy()
+        values = self.payloads[self.equations].copy()
+        pivot_rows = np.full(variables_n, -1, dtype=np.int64)
+        row = 0
+        for variable in range(variables_n):
+            word, bit = variable // 64, np.uint64(1) << np.uint64(variable % 64)
+            found = np.flatnonzero(system[row:, word] & bit)
+            if len(found) == 0: continue
+            pivot = row + found[0]
+            system[[row, pivot]] = system[[pivot, row]]
+            values[[row, pivot]] = values[[pivot, row]]
+            others = np.flatnonzero(system[:, word] & bit)
+            others = others[others != row]
+            system[others] ^= system[row]
+            values[others] ^= values[row]
+            pivot_rows[variable] = row
+            row += 1
+        # a block is recovered when its coefficient row, reduced by the pivot rows, has no free variable left: the pivot
+        # rows are in reduced echelon form, so substituting every pivot variable leaves only free variables behind
+        blocks = self.block_payloads
+        residual = self.block_coefficients.copy()
+        for variable in np.flatnonzero(pivot_rows >= 0):
+            users = np.flatnonzero(residual[:, variable // 64] & (np.uint64(1) << np.uint64(variable % 64)))
+            blocks[users] ^= values[pivot_rows[variable]]
+            residual[users] ^= system[pivot_rows[variable]]
+        recovered = (self.state != UNKNOWN) & ~np.any(residual, axis=1)
+        blocks[~recovered] = 0
+        return blocks, recovered
+
+
+def decode_matrix(droplets, blocks_quantity, systematic, packet_size, rs_size_fountain, cache=None):
+    """ Decodes a (drops, HEADER_SIZE+packet_size) droplet matrix to build back the data as blocks.
+    The function returns the data at the end of the process, along with the number of recovered blocks.
+
+    1. Output symbols of degree one recover their only neighbor, which is then XORed out of every other
+       symbol listed for that block (block -> symbols index), possibly making new degree one symbols.
+
+    2. When no symbol of degree one is left, some blocks are inactivated (kept as unknowns) and peeling goes on.
+
+    3. The inactive blocks are solved by GF(2) Gaussian elimination over the symbols peeling left without
+       unknown neighbors, then substituted back. Blocks that cannot be recovered are returned as zeros.
+    """
 
     # Recover the degrees and associated neighbors using the seed (the index, cf. encoding).
-    symbols = recover_graph(symbols, blocks_n, systematic, rs_size_fountain)
+    payloads, pointers, neighbors = recover_graph(droplets, blocks_quantity, systematic, rs_size_fountain, cache)
     print("Graph built back. Ready for decoding.", flush=True)
-    
-    solved_blocks_count = 0
-    iteration_solved_count = 0
-    start_time = time.time()
-    
-    while iteration_solved_count > 0 or solved_blocks_count == 0:
-    
-        iteration_solved_count = 0
-
-        # Search for solvable symbols
-        for i, symbol in enumerate(symbols):
-
-            if symbol.data is None:
-                logger.info(f"skipping droplet {i}")
-                symbols.pop(i)
-                continue
-
-            # Check the current degree. If it's 1 then we can recover data
-            if symbol.degree == 1: 
-
-                iteration_solved_count += 1 
-                block_index = next(iter(symbol.neighbors)) 
-                symbols.pop(i)
-
-                # This symbol is redundant: another already helped decoding the same block
-                if blocks[block_index] is not None:
-                    continue
-
-                blocks[block_index] = symbol.data
-
-                if VERBOSE:
-                    print("Solved block_{} with symbol_{}".format(block_index, symbol.index))
-              
-                # Update the count and log the processing
-                solved_blocks_count += 1
-                log("Decoding", solved_blocks_count, blocks_n, start_time, packet_size)
-
-                # Reduce the degrees of other symbols that contains the solved block as neighbor             
-                reduce_neighbors(block_index, blocks, symbols)
-
-    print("\n----- Solved Blocks {:2}/{:2} --".format(solved_blocks_count, blocks_n))
-
-    
-    for i in range(len(blocks)):
-        if blocks[i] is None:
-            blocks[i] = np.zeros(packet_size, dtype=NUMPY_TYPE)
-
-
 
-    return np.asarray(blocks), solved_blocks_count
+    decoder = _InactivationDecoder(payloads, pointers, neighbors, blocks_quantity)
+    decoder.peel()
+    blocks, recovered = decoder.solve()
+    solved_blocks_count = int(recovered.sum())
+    print("\n----- Solved Blocks {:2}/{:2} ({} inactivated) --".format(solved_blocks_count, blocks_quantity, len(decoder.inactive_blocks)))
+    if blocks.shape[1] != packet_size: # no droplet survived
+        blocks = np.zeros((blocks_quantity, packet_size), dtype=NUMPY_TYPE)
+    return blocks, solved_blocks_count
+
+
+def decode(symbols, blocks_quantity, systematic, packet_size, rs_size_fountain, cache=None):
+    """ decode_matrix() over Symbol objects, symbols without data or of an unexpected size count as failed droplets. """
+
+    assert len(symbols) > 0, "There are no symbols to decode."
+    width = HEADER_SIZE + packet_size
+    rows = [np.frombuffer(symbol.data, dtype=NUMPY_TYPE) for symbol in symbols if symbol.data is not None and len(symbol.data) == width]
+    stats.inc("fountain_drops", len(symbols) - len(rows))
+    stats.inc("checksum_fountain_fail", len(symbols) - len(rows))
+    droplets = np.stack(rows) if len(rows) > 0 else np.zeros((0, width), dtype=NUMPY_TYPE)
+    return decode_matrix(droplets, blocks_quantity, systematic, packet_size, rs_size_fountain, cache)
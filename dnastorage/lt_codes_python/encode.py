@@ -6,7 +6,7 @@ import math
 import argparse
 import numpy as np
 import dnastorage.lt_codes_python.core as core
-from dnastorage.lt_codes_python.encoder import encode
+from dnastorage.lt_codes_python.encoder import encode, encode_matrix, HEADER_SIZE
 import random
 import logging
 
@@ -45,36 +45,49 @@ def blocks_read(file, filesize, packet_size):
 
     return blocks
 
-def encode_file(filename,outputname, redundancy, systematic, packet_size, rs_size_fountain):
-
-    with open(filename, "rb") as file:
-
-        logger.info("Redundancy: {}".format(redundancy))
-        logger.info("Systematic: {}".format(systematic))
-
-        filesize = os.path.getsize(filename)
-        assert filesize > 0
-        logger.info("Filesize: {} bytes".format(filesize))
-
-        # Splitting the file in blocks & compute drops
-        file_blocks = blocks_read(file, filesize, packet_size)
-        file_blocks_n = len(file_blocks)
-        drops_quantity = int(file_blocks_n * redundancy)
-
-        logger.info("Blocks: {}".format(file_blocks_n))
-        logger.info("Drops: {}\n".format(drops_quantity))
-
-        # Generating symbols (or drops) from the blocks
-        file_symbols = []
-        with open(outputname, 'wb') as output_f:
-            for curr_symbol in encode(file_blocks, drops_quantity, systematic,packet_size, rs_size_fountain):
-            # if random.random() < 0.1:
-            #     curr_symbol.data[9] = ~curr_symbol.data[9]
-                
-            #     logger.info("changed bytes")
-                # file_symbols.append(curr_symbol)
-                for char in curr_symbol.data:
-                    output_f.write(char)
+def blocks_matrix(filename, filesize, packet_size):
+    """ The whole file as a (blocks, packet_size) matrix, the last block right padded with zeros like blocks_read() """
+    blocks_n = math.ceil(filesize / packet_size)
+    blocks = np.zeros(blocks_n * packet_size, dtype=core.NUMPY_TYPE)
+    blocks[:filesize] = np.fromfile(filename, dtype=core.NUMPY_TYPE, count=filesize)
+    return blocks.reshape(blocks_n, packet_size)
+
+def buffer_blocks(data, packet_size):
+    """ A bytes-like buffer as a (blocks, packet_size) matrix, the last block right padded with zeros like blocks_read() """
+    blocks_n = math.ceil(len(data) / packet_size)
+    blocks = np.zeros(blocks_n * packet_size, dtype=core.NUMPY_TYPE)
+    blocks[:len(data)] = np.frombuffer(data, dtype=core.NUMPY_TYPE)
+    return blocks.reshape(blocks_n, packet_size)
+
+def encode_buffer(data, redundancy, systematic, packet_size, rs_size_fountain, graph_format=core.GRAPH_FORMAT, cache=None):
+    """ encode_file() in memory: returns the droplets as bytes, along with the number of blocks """
+    assert len(data) > 0
+    file_blocks = buffer_blocks(data, packet_size)
+    drops = encode_matrix(file_blocks, int(len(file_blocks) * redundancy), systematic, packet_size, rs_size_fountain, graph_format=graph_format, cache=cache)
+    return drops.tobytes(), len(file_blocks)
+
+def encode_file(filename,outputname, redundancy, systematic, packet_size, rs_size_fountain, graph_format=core.GRAPH_FORMAT, cache=None):
+
+    logger.info("Redundancy: {}".format(redundancy))
+    logger.info("Systematic: {}".format(systematic))
+
+    filesize = os.path.getsize(filename)
+    assert filesize > 0
+    logger.info("Filesize: {} bytes".format(filesize))
+
+    # Splitting the file in blocks & compute drops
+    file_blocks = blocks_matrix(filename, filesize, packet_size)
+    file_blocks_n = len(file_blocks)
+    drops_quantity = int(file_blocks_n * redundancy)
+
+    logger.info("Blocks: {}".format(file_blocks_n))
+    logger.info("Drops: {}\n".format(drops_quantity))
+
+    # Droplets are encoded straight into the output file, one row per droplet
+    output = np.memmap(outputname, dtype=core.NUMPY_TYPE, mode="w+", shape=(drops_quantity, HEADER_SIZE + packet_size))
+    encode_matrix(file_blocks, drops_quantity, systematic, packet_size, rs_size_fountain, out=output, graph_format=graph_format, cache=cache)
+    output.flush()
+    del output
             
     logger.info(f"file_blocks_n = {file_blocks_n}")
     logger.info(f"finished encoding, dumped data into {outputname}")
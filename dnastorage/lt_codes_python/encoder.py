@@ -25,8 +25,85 @@ def get_degrees_from(distribution_name, N, k):
     return [1] + degrees
 
    
-def encode(blocks, drops_quantity, systematic, packet_size, rs_size_fountain):
-    """ Iterative encoding - Encodes new symbols and yield them.
+HEADER_SIZE = 6 # crc8, degree, droplet index as 3 little endian bytes, graph format
+MAX_DROPS = 256**3 # the graph format takes the index high byte, which GRAPH_RANDOM droplets always left clear
+GATHER_BYTES = 1 << 26 # bound on the neighbor blocks gathered at once while XORing
+
+CRC8_TABLE = np.array(CRC8()._memo_array, dtype=NUMPY_TYPE)
+
+def crc8_powers():
+    """ CRC8_TABLE applied r times, for r over one period of the table. The CRC8 (zero start) of an L byte row is linear,
+    byte i contributes table^(L-i)(byte), and the powers repeat with a period of 127 for this polynomial. """
+    powers = [np.arange(256, dtype=NUMPY_TYPE)]
+    while True:
+        power = CRC8_TABLE[powers[-1]]
+        if np.array_equal(power, powers[0]):
+            return np.stack(powers)
+        powers.append(power)
+
+CRC8_POWERS = crc8_powers()
+
+def crc8_rows(matrix):
+    """ CRC8 (same as codec.strand.CRC8) of every row of a uint8 matrix. Each row is XOR folded down to one period of
+    bytes (left padded so the fold lines up with the row end), then each folded column needs one table lookup. """
+    matrix = np.asarray(matrix) # plain view, slicing a memmap is slow
+    period = len(CRC8_POWERS)
+    rows_n, length = matrix.shape
+    width = -(-length // period) * period
+    crc = np.zeros(rows_n, dtype=NUMPY_TYPE)
+    rows = max(1, GATHER_BYTES // max(1, width))
+    for first in range(0, rows_n, rows):
+        chunk = matrix[first:first + rows]
+        padded = np.zeros((len(chunk), width), dtype=NUMPY_TYPE)
+        padded[:, width - length:] = chunk
+        folded = np.bitwise_xor.reduce(padded.reshape(len(chunk), width // period, period), axis=1)
+        chunk_crc = np.zeros(len(chunk), dtype=NUMPY_TYPE)
+        for column in range(period): # column c holds bytes a multiple of period plus (-c)%period away from the end
+            chunk_crc ^= CRC8_POWERS[(-column) % period][folded[:, column]]
+        crc[first:first + rows] = chunk_crc
+    return crc
+
+def droplet_neighbors(drops_quantity, blocks_n, systematic, graph_format=GRAPH_FORMAT, cache=None):
+    """ Degrees and concatenated neighbor indexes of every droplet, as flat arrays. """
+    random_degrees = get_degrees_from("robust", blocks_n, k=drops_quantity)
+    generate = cache.generate if cache is not None else generate_graph
+    degrees, _, neighbors = generate(np.arange(drops_quantity), random_degrees, blocks_n, systematic, graph_format)
+    return degrees, neighbors
+
+def encode_matrix(blocks, drops_quantity, systematic, packet_size, rs_size_fountain, out=None, graph_format=GRAPH_FORMAT, cache=None):
+    """ Encodes every droplet into one (drops_quantity, HEADER_SIZE+packet_size) uint8 matrix, row i is droplet i
+    as encode() yields it. Droplets are XORed in chunks with a single reduceat over their gathered neighbor blocks,
+    CRCs are computed for all rows together. out may be a preallocated matrix, e.g. a memmap of the output file.
+    graph_format picks how neighbors are generated (recorded in every droplet), cache is an optional GraphCache.
+    """
+    blocks = np.asarray(blocks, dtype=NUMPY_TYPE).reshape(-1, packet_size)
+    blocks_n = len(blocks)
+    assert blocks_n <= drops_quantity, "Because of the unicity in the random neighbors, it is need to drop at least the same amount of blocks"
+    assert drops_quantity <= MAX_DROPS, f"droplet index does not fit: {drops_quantity}"
+
+    degrees, neighbors = droplet_neighbors(drops_quantity, blocks_n, systematic, graph_format, cache)
+    assert np.all((degrees > 0) & (degrees <= 255)), "degree out of range"
+    drops = out if out is not None else np.empty((drops_quantity, HEADER_SIZE + packet_size), dtype=NUMPY_TYPE)
+
+    # Xor each droplet's neighbors within each other, chunked so the gathered blocks stay bounded
+    starts = np.concatenate([[0], np.cumsum(degrees)])
+    first = 0
+    while first < drops_quantity:
+        last = max(first + 1, int(np.searchsorted(starts, starts[first] + GATHER_BYTES // packet_size, side="right")) - 1)
+        last = min(last, drops_quantity)
+        gathered = blocks[neighbors[starts[first]:starts[last]]]
+        drops[first:last, HEADER_SIZE:] = np.bitwise_xor.reduceat(gathered, starts[first:last] - starts[first], axis=0)
+        first = last
+
+    drops[:, 1] = degrees
+    drops[:, 2:HEADER_SIZE - 1] = (np.arange(drops_quantity, dtype=np.int64)[:, None] >> np.arange(0, 24, 8)) & 0xff
+    drops[:, HEADER_SIZE - 1] = graph_format
+    drops[:, 0] = crc8_rows(drops[:, 1:])
+    logger.info("Correctly dropped {} symbols (packet size={})".format(drops_quantity, packet_size))
+    return drops
+
+def encode(blocks, drops_quantity, systematic, packet_size, rs_size_fountain, graph_format=GRAPH_FORMAT):
+    """ Iterative encoding - yields the droplets of encode_matrix() as symbols.
     Encoding one symbol is described as follow:
 
     1.  Randomly choose a degree according to the degree distribution, save it into "deg"
@@ -38,58 +115,9 @@ def encode(blocks, drops_quantity, systematic, packet_size, rs_size_fountain):
     3.  Compute the output symbol as the combination of the neighbors.
         In other means, we XOR the chosen blocs to produce the symbol.
     """
-
-    # Display statistics
-    blocks_n = len(blocks)
-    assert blocks_n <= drops_quantity, "Because of the unicity in the random neighbors, it is need to drop at least the same amount of blocks"
-
-    print("Generating graph...")
-    start_time = time.time()
-
-    # Generate random indexes associated to random degrees, seeded with the symbol id
-    random_degrees = get_degrees_from("robust", blocks_n, k=drops_quantity)
-
-    print("Ready for encoding.", flush=True)
-
+    drops = encode_matrix(blocks, drops_quantity, systematic, packet_size, rs_size_fountain, graph_format=graph_format)
     for i in range(drops_quantity):
-        
-        # Get the random selection, generated precedently (for performance)
-        selection_indexes, deg = generate_indexes(i, random_degrees[i], blocks_n, systematic)
-
-        # Xor each selected array within each other gives the drop (or just take one block if there is only one selected)
-        drop = blocks[selection_indexes[0]]
-        for n in range(1, deg):
-            drop = np.bitwise_xor(drop, blocks[selection_indexes[n]])
-            # drop = drop ^ blocks[selection_indexes[n]] # according to my tests, this has the same performance
-            # print(drop)
-        # Create symbol, then log the process
-        index = [0, 0, 0, 0]
-        indexbefore = i
-        counter = 0
-        while i > 0:
-            index[counter] = i%256
-            i = i // 256
-            counter += 1
-            assert counter < 4
-
-        drop = np.insert(drop, 0, index)
-        assert deg <= 255 and deg > 0, f"degree: {deg}"
-        drop = np.insert(drop, 0, deg)
-
-        #rs_obj = RSCodec(rs_size_fountain)
-        #drop = np.frombuffer(rs_obj.encode(drop), dtype=NUMPY_TYPE)
-        # checksumd = checksum(drop)
-        # drop = np.insert(drop, 0, checksumd)
-        crc = CRC8()
-        logger.info(f"droplet {indexbefore} checksum = {crc._crc(drop)}")
-        drop = np.frombuffer(np.insert(drop, 0 ,crc._crc(drop)), dtype=NUMPY_TYPE)
-        symbol = Symbol(index=i, degree=deg, data=drop)
-        
+        symbol = Symbol(index=i, degree=int(drops[i, 1]), data=drops[i])
         if VERBOSE:
-            symbol.log(blocks_n)
-
-        log("Encoding", i, drops_quantity, start_time, packet_size)
-
+            symbol.log(len(blocks), systematic, graph_format)
         yield symbol
-
-    print("\n----- Correctly dropped {} symbols (packet size={})".format(drops_quantity, packet_size))
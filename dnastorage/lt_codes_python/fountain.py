@@ -0,0 +1,46 @@
+'''
+LT fountain coding as an in memory stage: encode() turns a file's bytes into droplet bytes, decode() turns
+(possibly damaged) droplet bytes back into the file's bytes. Nothing goes through temporary files, and the
+droplet graph is cached between decodes of the same encoding, e.g. across Monte Carlo runs.
+'''
+import dnastorage.lt_codes_python.core as core
+from dnastorage.lt_codes_python.encode import encode_buffer
+from dnastorage.lt_codes_python.decode import decode_buffer
+
+import logging
+logger = logging.getLogger("dnastorage.lt_codes_python.fountain")
+logger.addHandler(logging.NullHandler())
+
+
+class LTFountain:
+    def __init__(self,redundancy,systematic,packet_size,rs_size_fountain,graph_format=core.GRAPH_FORMAT,cache=True):
+        self.redundancy=redundancy
+        self.systematic=systematic
+        self.packet_size=packet_size
+        self.rs_size_fountain=rs_size_fountain
+        self.graph_format=graph_format
+        self.cache=core.GraphCache() if cache else None
+        self.blocks_n=None #set by encode(), or given to decode()
+        self.size=None
+        self.solved_blocks=None #blocks recovered by the last decode()
+
+    @classmethod
+    def from_params(cls,encoding_params,**kwargs):
+        #encoding parameters as the fault injection json files have them
+        return cls(encoding_params["fountain_redundancy"],encoding_params["systematic"]==1,encoding_params["packet_size"],
+                   encoding_params["rs_size_fountain"],**kwargs)
+
+    def encode(self,data):
+        droplets,self.blocks_n=encode_buffer(data,self.redundancy,self.systematic,self.packet_size,self.rs_size_fountain,
+                                             self.graph_format,self.cache)
+        self.size=len(data)
+        logger.info("fountain encoded {} bytes into {} blocks, {} droplet bytes".format(self.size,self.blocks_n,len(droplets)))
+        return droplets
+
+    def decode(self,data,blocks_n=None,size=None):
+        blocks_n=self.blocks_n if blocks_n is None else blocks_n
+        size=self.size if size is None else size
+        assert blocks_n is not None and size is not None, "decode needs the blocks count and size of the encoded data"
+        decoded,self.solved_blocks=decode_buffer(data,blocks_n,size,self.systematic,self.packet_size,self.rs_size_fountain,self.cache)
+        logger.info("fountain decoded {}/{} blocks".format(self.solved_blocks,blocks_n))
+        return decoded
@@ -0,0 +1,167 @@
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <cstdint>
+#include <string>
+#include <vector>
+#include <algorithm>
+
+/*
+  Approximate primer location. The primer must be matched end to end, the read around it is free
+  (semi-global edit distance), and the best match is the leftmost end position with the smallest
+  distance. Primers up to 64 bases use Myers' bit-parallel algorithm on one machine word, longer
+  primers fall back to the plain dynamic program.
+*/
+
+struct location {
+  int distance;
+  int end; // index of the last read base of the match, -1 for an empty read
+};
+
+static location myers_locate(const std::string &text, const std::string &pattern)
+{
+  const int m = pattern.size();
+  uint64_t peq[256] = {0};
+  for (int i = 0; i < m; i++)
+    peq[(unsigned char)pattern[i]] |= (uint64_t)1 << i;
+  const uint64_t mask = m == 64 ? ~(uint64_t)0 : (((uint64_t)1 << m) - 1);
+  const uint64_t high = (uint64_t)1 << (m - 1);
+  uint64_t pv = mask, mv = 0;
+  int score = m;
+  location best = {m, -1};
+  for (size_t j = 0; j < text.size(); j++) {
+    uint64_t eq = peq[(unsigned char)text[j]];
+    uint64_t xv = eq | mv;
+    uint64_t xh = ((((eq & pv) + pv) & mask) ^ pv) | eq;
+    uint64_t ph = mv | (~(xh | pv) & mask);
+    uint64_t mh = pv & xh;
+    if (ph & high) score++;
+    else if (mh & high) score--;
+    ph = (ph << 1) & mask; // no carry in: the match may start anywhere in the read
+    mh = (mh << 1) & mask;
+    pv = mh | (~(xv | ph) & mask);
+    mv = ph & xv;
+    if (score < best.distance) {
+      best.distance = score;
+      best.end = j;
+    }
+  }
+  if (best.end == -1 && !text.empty()) best.end = 0; // nothing beat an all-deletion match
+  return best;
+}
+
+static location dp_locate(const std::string &text, const std::string &pattern)
+{
+  const int m = pattern.size();
+  std::vector<int> column(m + 1);
+  for (int i = 0; i <= m; i++) column[i] = i;
+  location best = {m, -1};
+  for (size_t j = 0; j < text.size(); j++) {
+    int diagonal = 0; // row 0 is free for every read position
+    for (int i = 1; i <= m; i++) {
+      int up = column[i];
+      column[i] = std::min({column[i] + 1, column[i - 1] + 1, diagonal + (pattern[i - 1] != text[j])});
+      diagonal = up;
+    }
+    if (column[m] < best.distance) {
+      best.distance = column[m];
+      best.end = j;
+    }
+  }
+  if (best.end == -1 && !text.empty()) best.end = 0;
+  return best;
+}
+
+static location locate(const std::string &text, const std::string &pattern)
+{
+  if (pattern.empty())
+    return location{0, -1};
+  if (pattern.size() <= 64)
+    return myers_locate(text, pattern);
+  return dp_locate(text, pattern);
+}
+
+static bool to_string(PyObject *obj, std::string &s)
+{
+  Py_ssize_t len;
+  const char *data = PyUnicode_AsUTF8AndSize(obj, &len);
+  if (data == NULL)
+    return false;
+  s.assign(data, len);
+  return true;
+}
+
+static PyObject *
+fastprimer_locate(PyObject *self, PyObject *args)
+{
+  PyObject *textObj, *patternObj;
+  if (!PyArg_ParseTuple(args, "UU", &textObj, &patternObj))
+    return NULL;
+  std::string text, pattern;
+  if (!to_string(textObj, text) || !to_string(patternObj, pattern))
+    return NULL;
+  location l = locate(text, pattern);
+  return Py_BuildValue("(ii)", l.distance, l.end);
+}
+
+static PyObject *
+fastprimer_locate_batch(PyObject *self, PyObject *args)
+{
+  PyObject *textsObj, *patternObj;
+  if (!PyArg_ParseTuple(args, "OU", &textsObj, &patternObj))
+    return NULL;
+  std::string pattern;
+  if (!to_string(patternObj, pattern))
+    return NULL;
+  PyObject *seq = PySequence_Fast(textsObj, "expected a sequence of reads");
+  if (seq == NULL)
+    return NULL;
+  Py_ssize_t n = PySequence_Fast_GET_SIZE(seq);
+  PyObject **items = PySequence_Fast_ITEMS(seq);
+  std::vector<std::string> texts(n);
+  for (Py_ssize_t i = 0; i < n; i++) {
+    if (!PyUnicode_Check(items[i])) {
+      PyErr_SetString(PyExc_TypeError, "reads must be str");
+      Py_DECREF(seq);
+      return NULL;
+    }
+    if (!to_string(items[i], texts[i])) {
+      Py_DECREF(seq);
+      return NULL;
+    }
+  }
+  Py_DECREF(seq);
+
+  std::vector<location> found(n);
+  Py_BEGIN_ALLOW_THREADS
+  for (Py_ssize_t i = 0; i < n; i++)
+    found[i] = locate(texts[i], pattern);
+  Py_END_ALLOW_THREADS
+
+  PyObject *out = PyList_New(n);
+  if (out == NULL)
+    return NULL;
+  for (Py_ssize_t i = 0; i < n; i++)
+    PyList_SET_ITEM(out, i, Py_BuildValue("(ii)", found[i].distance, found[i].end));
+  return out;
+}
+
+
+static PyMethodDef FastprimerMethods[] = {
+    {"locate",  fastprimer_locate, METH_VARARGS, "Best semi-global match of a primer in a read, returns (edit distance, end index)."},
+    {"locate_batch",  fastprimer_locate_batch, METH_VARARGS, "locate over a list of reads, returns a list of (edit distance, end index)."},
+    {NULL, NULL, 0, NULL}        /* Sentinel */
+};
+
+static struct PyModuleDef fastprimermodule = {
+    PyModuleDef_HEAD_INIT,
+    "fastprimer",   /* name of module */
+    NULL, /* module documentation, may be NULL */
+    -1,       /* size of per-interpreter state of the module,
+                 or -1 if the module keeps state in global variables. */
+    FastprimerMethods
+};
+
+PyMODINIT_FUNC PyInit_fastprimer(void)
+{
+    return PyModule_Create(&fastprimermodule);
+}
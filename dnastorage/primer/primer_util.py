@@ -6,6 +6,10 @@ import random
 import csv
 import editdistance as ed
 from collections import deque
+try:
+    import dnastorage.primer.fastprimer as fastprimer
+except ImportError:
+    fastprimer = None
 
 def getTm(seq):
     return mt.Tm_NN(seq)
@@ -122,13 +126,16 @@ def create_anti_sequence(seq):
     return copy
 
 
+_complement_table = {ord(c):ord(r) for c,r in zip("ACGT","TGCA")}
+_complement_table.update({c:None for c in range(256) if c not in _complement_table}) #drop anything else so bad bases can be detected
+
 def reverse_complement(seq):
     if len(seq)==0:
         return seq
-    complement = {'T':'A', 'G':'C', 'C':'G', 'A':'T'}
-    r = [complement[x] for x in seq]
-    r.reverse()
-    return "".join(r)
+    r = seq.translate(_complement_table)
+    if len(r)!=len(seq):
+        raise KeyError("non-DNA character in {}".format(seq))
+    return r[::-1]
 
 def reverse(seq):
     r = [x for x in seq]
@@ -408,6 +415,78 @@ def calculate_edit_list(edit_ops,max_index,kmer_length=None,pattern=False):
 
 
 
+def _myers_locate(text,pattern):
+    #Myers' bit-parallel semi-global edit distance on python ints, same result as fastprimer.locate
+    m = len(pattern)
+    if m==0: return 0,-1
+    peq = {}
+    for i,c in enumerate(pattern):
+        peq[c] = peq.get(c,0)|(1<<i)
+    mask = (1<<m)-1
+    high = 1<<(m-1)
+    pv = mask
+    mv = 0
+    score = m
+    best = (m,0 if len(text)>0 else -1)
+    for j,c in enumerate(text):
+        eq = peq.get(c,0)
+        xv = eq|mv
+        xh = ((((eq&pv)+pv)&mask)^pv)|eq
+        ph = mv|(~(xh|pv)&mask)
+        mh = pv&xh
+        if ph&high: score+=1
+        elif mh&high: score-=1
+        ph = (ph<<1)&mask
+        mh = (mh<<1)&mask
+        pv = mh|(~(xv|ph)&mask)
+        mv = ph&xv
+        if score<best[0]: best=(score,j)
+    return best
+
+def locate_primer(text,primer):
+    #best match of the whole primer anywhere in text, returns (matches,end): len(primer) minus the edit distance,
+    #and the index in text of the last base of the leftmost best match (-1 for an empty text)
+    distance,end = fastprimer.locate(text,primer) if fastprimer is not None else _myers_locate(text,primer)
+    return len(primer)-distance,end
+
+def locate_primer_batch(texts,primer):
+    located = fastprimer.locate_batch(texts,primer) if fastprimer is not None else [_myers_locate(t,primer) for t in texts]
+    return [(len(primer)-distance,end) for distance,end in located]
+
+
+class PrimerOrientation:
+    """
+    Decides the orientation of a read with one scan over the k-mers at its two ends. As encoded, a read starts with
+    the prepended primers and ends with the appended ones, reverse complemented it starts with the reverse complement
+    of the appended primers and ends with that of the prepended ones. Each k-mer of a window votes for the orientation
+    whose primers contain it (k-mers in both are ignored). classify returns 1 (as encoded), -1 (reverse complemented)
+    or 0 when the votes do not decide.
+    window: bases searched at each end, the primers are expected within it
+    """
+    def __init__(self,prepend_primers,append_primers,window,k=8,min_votes=2):
+        self._k=k
+        self._window=window
+        self._min_votes=min_votes
+        self._head = self._votes(prepend_primers,[reverse_complement(p) for p in append_primers])
+        self._tail = self._votes(append_primers,[reverse_complement(p) for p in prepend_primers])
+
+    def _votes(self,forward_primers,reverse_primers):
+        k=self._k
+        forward = {p[i:i+k] for p in forward_primers for i in range(len(p)-k+1)}
+        reverse = {p[i:i+k] for p in reverse_primers for i in range(len(p)-k+1)}
+        shared = forward&reverse
+        return {**{kmer:1 for kmer in forward-shared},**{kmer:-1 for kmer in reverse-shared}}
+
+    def classify(self,read):
+        k=self._k
+        head_end = min(len(read),self._window)
+        tail_start = max(head_end-k+1,len(read)-self._window) #windows never count a k-mer twice
+        score = sum(self._head.get(read[i:i+k],0) for i in range(head_end-k+1))
+        score += sum(self._tail.get(read[i:i+k],0) for i in range(max(0,tail_start),len(read)-k+1))
+        if score>=self._min_votes: return 1
+        if score<=-self._min_votes: return -1
+        return 0
+
 def nextera_strand_comparison(seq,distance):
     for i in illumina_primers:
         d = correlation_distance(seq,i)
@@ -145,15 +145,24 @@ class Header(object):
         return return_header
     
     def decode_file_header(self,strands,skip=False):
-        b = BytesIO()
-        pf = WritePacketizedFilestream(b,self._header_length,0)
+        pipeline = self.prepare_decode()
+        for s in strands:
+            pipeline.decode(s,skip)
+        return self.finish_file_header()
+
+    def prepare_decode(self):
+        #sets up the header pipeline for streamed strands and returns it, finish_file_header decodes what was streamed in
+        self._header_buffer = BytesIO()
+        pf = WritePacketizedFilestream(self._header_buffer,self._header_length,0)
         self._pipeline.set_write_pf(pf)
         self._non_header_strands=[]
         self._pipeline.mpi=self._mpi
-        for s in strands:
-            self._pipeline.decode(s,skip)
+        return self._pipeline
+
+    def finish_file_header(self):
         #should be able to finish decoding here
         self._pipeline.final_decode()
+        b = self._header_buffer
         try:
             data = [ ord(x) for x in b.getvalue() ]
         except Exception as e:
@@ -1,5 +1,6 @@
 from dnastorage.system.formats import *
 from dnastorage.system.header_class import *
+from dnastorage.system.read_router import ReadRouter
 from dnastorage.strand_representation import *
 from dnastorage.util.stats import stats
 from dnastorage.util.strandinterface import *
@@ -20,6 +21,45 @@ def check_mpi(comm): #check that required modules are loaded for mpi communicati
         if not ("mpi4py" in sys.modules or "mpi4py.MPI" in sys.modules):
             raise SystemError("mpi4py is not loaded, needed for pipeline mpi support")
 
+def _recover_header(header,store_header,payload_header_filename,mpi):
+    #header dictionary from the header strands streamed into the header pipeline, falls back to the serialized payload header
+    try:
+        if not store_header:
+            raise Exception("store_header was false, trying file right away")
+        h = header.finish_file_header()
+        if mpi: #broadcast the actual decoded header
+            logger.info("Rank {} Broadcasting header".format(mpi.rank))
+            h = mpi.bcast(h,root=0)
+            header.set_header_dict(h)
+        if h!=None: logger.info("Able to decode header from DNA")
+        if h==None:
+            if not mpi or mpi.rank==0: stats.inc("dead_header",1) #only increment this in one rank, all other rank counts of this are redundant
+            raise Exception("Header failed to decode from DNA, trying file")  
+    except Exception as e:
+        try:
+            traceback.print_exc()
+            logger.fatal("{}".format(e))
+            #now try to decode with bytes
+            with open(payload_header_filename,"rb") as serialized_payload_pipeline_data:
+                logger.info("using binary file for payload header instead of DNA")
+                h = header.header_from_bytes(serialized_payload_pipeline_data.read())
+            if h==None: raise ValueError("Header is None when attempting to decode from bytes")
+        except Exception as e:
+            logging.warning("Could not recover payload header: {}".format(e))
+            return None
+    return h
+
+def _read_batches(strand_interface,mpi):
+    #batches of reads for this process, with mpi rank 0 streams them from the strand interface and scatters each batch
+    if not mpi:
+        yield from strand_interface.batches()
+        return
+    batches = strand_interface.batches() if mpi.rank==0 else None
+    while True:
+        batch = next(batches,None) if mpi.rank==0 else None
+        if not mpi.bcast(batch is not None,root=0): return
+        yield object_scatter(batch if batch is not None else [],mpi) #communicate out strands to different processes
+
 class DNAFilePipeline:
     def __init__(self):
         return
@@ -30,50 +70,11 @@ class DNAFilePipeline:
         # check if we are reading or writing
         if op=="r":
             assert strand_interface!=None
-            strands=[]
-            check_mpi(mpi)
-            strands = strand_interface.strands
-            if mpi: #communicate out strands to different processes
-                strands = object_scatter(strands,mpi)
-            assert (strands is not None)
-            header = Header(header_version,header_params,barcode_suffix=file_barcode,mpi=mpi)
-            #initialize header pipeline
-            try:
-                with open(fsmd_header_filename,"rb") as serialized_header_pipeline_data:
-                    header.set_pipeline_data(serialized_header_pipeline_data.read())
-            except Exception as e:
-                logger.fatal("Could not initialize header pipeline: {}".format(e))
-                exit(1)
-            #attempt to get header data
-            try:
-                h = header.decode_file_header(strands,not store_header) 
-                if not store_header:
-                    raise Exception("store_header was false, trying file right away")
-                if mpi: #broadcast the actual decoded header
-                    logger.info("Rank {} Broadcasting header".format(mpi.rank))
-                    h = mpi.bcast(h,root=0)
-                    header.set_header_dict(h)
-                if h!=None: logger.info("Able to decode header from DNA")
-                if h==None:
-                    if not mpi or mpi.rank==0: stats.inc("dead_header",1) #only increment this in one rank, all other rank counts of this are redundant
-                    raise Exception("Header failed to decode from DNA, trying file")  
-            except Exception as e:
-                try:
-                    traceback.print_exc()
-                    logger.fatal("{}".format(e))
-                    #now try to decode with bytes
-                    with open(payload_header_filename,"rb") as serialized_payload_pipeline_data:
-                        logger.info("using binary file for payload header instead of DNA")
-                        h = header.header_from_bytes(serialized_payload_pipeline_data.read())
-                    if h==None: raise ValueError("Header is None when attempting to decode from bytes")
-                except Exception as e:
-                    logging.warning("Could not recover payload header: {}".format(e))
-                    return None
-
-            logger.debug("decoded header: {}".format(h))
-            
-            return ReadDNAFilePipeline(encoder_params=encoder_params,
-                                       header=header,file_barcode=file_barcode,mpi=mpi)
+            files,returned = DNAFilePipeline.open_files([{"header_version":header_version,"header_params":header_params,
+                                                          "encoder_params":encoder_params,"fsmd_header_filename":fsmd_header_filename,
+                                                          "payload_header_filename":payload_header_filename,"file_barcode":file_barcode}],
+                                                        strand_interface,mpi=mpi,store_header=store_header)
+            return files[0]
         elif op=="w":
             return WriteDNAFilePipeline(output=dna_file_name,
                                         format_name=format_name,encoder_params=encoder_params,
@@ -81,6 +82,58 @@ class DNAFilePipeline:
                                         payload_header_filename=payload_header_filename,file_barcode=file_barcode,do_write=do_write,store_header=store_header)
         else:
             return None
+    @classmethod
+    def open_files(self,file_params,strand_interface,mpi=None,store_header=True,max_error_rate=0.25):
+        # reads any number of files out of the same set of reads. file_params is a list of dictionaries with the open("r")
+        # keywords (header_version, header_params, encoder_params, fsmd_header_filename, payload_header_filename, file_barcode).
+        # Reads are routed by barcode in two passes over the strand interface: the first one feeds every header pipeline
+        # and drops the other reads, the second one streams the reads again into the payload pipelines built from the
+        # decoded headers, skipping the reads the headers took, so only the reads a pipeline keeps and those no pipeline
+        # takes stay in memory.
+        # Returns the ReadDNAFilePipeline of each file (None if its header could not be recovered) and the reads no file kept.
+        check_mpi(mpi)
+        headers=[]
+        for params in file_params:
+            header = Header(params.get("header_version","0.1"),params.get("header_params",{}),barcode_suffix=params.get("file_barcode",tuple()),mpi=mpi)
+            #initialize header pipeline
+            try:
+                with open(params["fsmd_header_filename"],"rb") as serialized_header_pipeline_data:
+                    header.set_pipeline_data(serialized_header_pipeline_data.read())
+            except Exception as e:
+                logger.fatal("Could not initialize header pipeline: {}".format(e))
+                exit(1)
+            headers.append((header,header.prepare_decode()))
+        header_positions=[]
+        if store_header: #first pass, header reads only
+            header_router = ReadRouter(max_error_rate,keep_unrouted=False)
+            for _,header_pipeline in headers: header_router.add(header_pipeline)
+            for batch in _read_batches(strand_interface,mpi):
+                header_router.route(batch)
+            header_positions = header_router.routed_positions
+        files=[]
+        #both passes see the same batches (and the same scattered share of them), header reads are dropped by position
+        router = ReadRouter(max_error_rate,skip_positions=header_positions)
+        for params,(header,_) in zip(file_params,headers):
+            h = _recover_header(header,store_header,params.get("payload_header_filename",None),mpi)
+            if h is None:
+                files.append(None)
+                continue
+            logger.debug("decoded header: {}".format(h))
+            read_file = ReadDNAFilePipeline(encoder_params=params.get("encoder_params",{}),header=header,
+                                            file_barcode=params.get("file_barcode",tuple()),mpi=mpi,decode=False)
+            if read_file.pipe is not None: router.add(read_file.pipe)
+            files.append(read_file)
+        for batch in _read_batches(strand_interface,mpi): #second pass, payload reads
+            router.route(batch)
+        for read_file in files:
+            if read_file is not None: read_file.finish_decode()
+        returned = router.returned_strands()
+        if store_header:
+            for _,header_pipeline in headers: returned+=header_pipeline.get_filtered()
+        for read_file in files:
+            if read_file is not None: read_file.returned_strands = returned
+        return files,returned
+
     def flush(self):
         return
     def close(self):
@@ -100,12 +153,16 @@ class ReadDNAFilePipeline(DNAFilePipeline):
         self._file_barcode=kwargs.get("file_barcode",tuple())
         header_class = kwargs["header"] #header was already decoded just grab it
         self.header = header_class.header_dict() # store the header dictionary3
-        self.strands = header_class.pick_nonheader_strands()
+        self.strands = kwargs.get("strands",None) #any iterable of strands, e.g. a strand interface, otherwise what the header did not take
+        if self.strands is None: self.strands = header_class.pick_nonheader_strands()
         self.formatid = self.header['main_pipeline_formatid']
  
         self.size = self.header['size']
         # set up mem_buffer 
         self.mem_buffer = BytesIO()
+        self.pipe = None
+        self.returned_strands = None #set when the reads were routed over several pipelines, see DNAFilePipeline.open_files
+        self._mpi = mpi
     
         if self.formatid == 0x1000:
             # let sub-classes handle initialization
@@ -116,12 +173,16 @@ class ReadDNAFilePipeline(DNAFilePipeline):
         self.pipe = constructor_function(self.pf,**self._enc_opts,barcode=(DATA_BARCODE,)+self._file_barcode)
         self.pipe.decode_header_data(self.header["other_data"])
         self.pipe.mpi = mpi #attach the communicator to the pipeline
+        if not kwargs.get("decode",True):
+            return #strands are streamed in by a ReadRouter, finish_decode completes the file
         for s in self.strands:
             self.pipe.decode(s)
+        self.finish_decode()
+        return
+    def finish_decode(self):
         self.pipe.final_decode()
-        if mpi: logger.info("Rank {} leaving dnafile".format(mpi.rank))
+        if self._mpi: logger.info("Rank {} leaving dnafile".format(self._mpi.rank))
         self.mem_buffer.seek(0,0) # set read point at beginning of buffer
-        return
     def read(self, n=1):        
         return self.mem_buffer.read(n)
     def reset(self):
@@ -134,6 +195,7 @@ class ReadDNAFilePipeline(DNAFilePipeline):
         return False
     def get_returned_strands(self):
         #return strands that were kicked out of the pipeline(s)
+        if self.returned_strands is not None: return self.returned_strands
         try:
             return self.pipe.get_filtered()
         except Exception as e:
@@ -0,0 +1,115 @@
+'''
+Single pass demultiplexing of reads over several decoding pipelines (header and payload pipelines of one or many files).
+
+Each read is trimmed once per distinct DNA to DNA cascade, pipelines with the same PipeLine.trim_key share that trim
+(done a batch at a time with PipeLine.trim_batch),
+and is then streamed into the pipeline whose barcode signature (PipeLine.barcode_signature) it starts with. Reads no
+pipeline takes are dropped, unless the router keeps them (keep_unrouted): kept reads keep their trims, and when
+pipelines are added later (e.g. the payload pipelines once the headers tell how to build them) the next route() call
+matches them again, only comparing prefixes for primers it has already seen. Kept reads stay in memory, so runs larger
+than memory should rather be streamed twice, see DNAFilePipeline.open_files: the first router records the stream
+position of every read it routed (routed_positions), the second one gets them as skip_positions and drops those reads
+without trimming them again.
+'''
+import math
+from dnastorage.primer.primer_util import locate_primer
+
+import logging
+logger = logging.getLogger("dnastorage.system.read_router")
+logger.addHandler(logging.NullHandler())
+
+
+class ReadRouter:
+    def __init__(self,max_error_rate=0.25,keep_unrouted=True,skip_positions=()):
+        self._max_error_rate=max_error_rate #edits allowed in a barcode signature, relative to its length
+        self._keep_unrouted=keep_unrouted
+        self._targets=[] #(pipeline,barcode signature,trim key)
+        self._trimmers={} #trim key --> pipeline that trims for every target with that key
+        self._pending=[] #kept reads no target has taken so far
+        self._pending_positions=[] #stream position of each pending read
+        self._recheck=False #targets were added since the pending reads were last matched
+        self._trims={} #id(read) --> {trim key: (trimmed dna,is_reversed,orientation_known) or None when the trim failed}
+        self._skip_positions=set(skip_positions) #stream positions an earlier pass over the same reads already routed
+        self._position=0 #reads streamed through route() so far
+        self.routed_positions=[] #stream positions of the reads handed to a pipeline
+
+    def add(self,pipeline):
+        signature=pipeline.barcode_signature()
+        key=pipeline.trim_key()
+        self._targets.append((pipeline,signature,key))
+        self._trimmers.setdefault(key,pipeline)
+        self._recheck=True
+        logger.info("routing to pipeline with barcode signature {}".format(signature))
+
+    def route(self,strands=tuple()):
+        #streams strands into the current targets, pending reads are only matched again when targets were added since
+        reads=[]
+        if self._recheck:
+            reads=list(zip(self._pending_positions,self._pending))
+            self._pending,self._pending_positions=[],[]
+        self._recheck=False
+        streamed=list(self._stream(strands))
+        seen=len(reads)+len(streamed)
+        reads+=[(position,s) for position,s in streamed if position not in self._skip_positions] #others were taken by an earlier pass
+        skipped=seen-len(reads)
+        self._trim([s for _,s in reads])
+        routed=0
+        for position,s in reads:
+            target,trimmed=self._pick(s)
+            if target is None and self._keep_unrouted: #keeps its trims for the targets added later
+                self._pending.append(s)
+                self._pending_positions.append(position)
+                continue
+            del self._trims[id(s)]
+            if target is None: continue
+            s.before_decode=s.dna_strand
+            s.dna_strand,s.is_reversed,s.orientation_known=trimmed
+            target.decode_trimmed(s)
+            self.routed_positions.append(position)
+            routed+=1
+        logger.info("routed {} of {} reads, {} skipped".format(routed,seen,skipped))
+        return self._pending
+
+    def _stream(self,strands):
+        for s in strands:
+            yield self._position,s
+            self._position+=1
+
+    def unrouted(self):
+        return self._pending
+
+    def returned_strands(self):
+        #reads no pipeline kept: those never routed and those the pipelines filtered (e.g. barcode mismatch after inner decoding)
+        out=list(self._pending)
+        for pipeline,_,_ in self._targets:
+            out+=pipeline.get_filtered()
+        return out
+
+    def _trim(self,reads):
+        #trims the reads once per trim key they were not trimmed with yet, a whole batch per key, reads are left as they came in
+        for key,trimmer in self._trimmers.items():
+            todo=[s for s in reads if key not in self._trims.setdefault(id(s),{})]
+            if len(todo)==0: continue
+            raws=[s.dna_strand for s in todo]
+            for s,raw,kept in zip(todo,raws,trimmer.trim_batch(todo)):
+                self._trims[id(s)][key]=(s.dna_strand,s.is_reversed,s.orientation_known) if kept else None
+                s.dna_strand,s.is_reversed=raw,False
+
+    def _pick(self,s):
+        trims=self._trims[id(s)]
+        best=(None,None,None)
+        for pipeline,signature,key in self._targets:
+            if trims[key] is None: continue
+            distance=self._distance(trims[key][0],signature)
+            if distance is None: continue
+            if best[0] is None or distance<best[0]: best=(distance,pipeline,trims[key])
+        return best[1],best[2]
+
+    def _distance(self,dna,signature):
+        #relative edit distance of the barcode signature at the start of the trimmed read, None when it is not there.
+        #pipelines without a signature take any trimmed read, but only when no signature matches
+        if len(signature)==0: return math.inf
+        allowed=int(self._max_error_rate*len(signature))
+        matches,_=locate_primer(dna[:len(signature)+allowed],signature)
+        if len(signature)-matches>allowed: return None
+        return (len(signature)-matches)/len(signature)
@@ -0,0 +1,73 @@
+'''
+Byte level comparison of a decoded file against its original, as the fault injection runs account errors.
+
+Bytes are compared over the common prefix of both files (mismatched bytes and flipped bits), the bytes of the
+original the decoded file does not reach are reported apart, and error positions are counted per packet of the
+original: a packet gets one count per mismatched byte and per byte of it the decoded file is missing. Inputs may be
+bytes-like buffers, numpy arrays, paths (memory mapped) or readable file objects, large inputs go in chunks.
+'''
+import os
+import numpy as np
+
+import logging
+logger = logging.getLogger("dnastorage.util.file_compare")
+logger.addHandler(logging.NullHandler())
+
+CHUNK_BYTES = 1 << 24 #bytes compared at once
+BIT_COUNTS = np.unpackbits(np.arange(256,dtype=np.uint8)[:,None],axis=1).sum(axis=1) #ones in each byte value
+
+
+def as_byte_array(data):
+    #uint8 view of the data, without copying buffers and mapping files
+    if isinstance(data,np.ndarray): return data.reshape(-1).view(np.uint8)
+    if isinstance(data,(str,os.PathLike)):
+        if os.path.getsize(data)==0: return np.zeros(0,dtype=np.uint8)
+        return np.memmap(data,dtype=np.uint8,mode="r")
+    if hasattr(data,"read"): data=data.read()
+    return np.frombuffer(data,dtype=np.uint8)
+
+
+class FileComparison:
+    def __init__(self,compared_bytes,mismatched_bytes,size_difference,bit_errors,packet_errors,packet_size):
+        self.compared_bytes=compared_bytes #length of the common prefix
+        self.mismatched_bytes=mismatched_bytes
+        self.size_difference=size_difference #bytes of the original past the end of the decoded file
+        self.bit_errors=bit_errors
+        self.packet_errors=packet_errors #error count per packet of the original
+        self.packet_size=packet_size
+
+    @property
+    def error(self):
+        return self.mismatched_bytes>0 or self.size_difference>0
+
+    def record(self,stats,suffix=""):
+        #accumulate into a dnastats object, under the names _monte_kernel has always used (suffix e.g. "_after_fountain")
+        stats.inc("total_mismatch_bytes{}".format(suffix),self.mismatched_bytes)
+        stats.inc("file_size_difference_bytes{}".format(suffix),self.size_difference)
+        stats.inc("error{}".format(suffix),int(self.error))
+        stats.inc("total_bit_errors{}".format(suffix),self.bit_errors)
+        hist_key="packet_error_hist{}".format(suffix)
+        stats.inc(hist_key,self.packet_errors)
+        stats.register_file(hist_key,"error_positions.stats") #per packet arrays would crowd the main stats file
+
+
+def compare_files(decoded,original,packet_size=1024):
+    decoded=as_byte_array(decoded)
+    original=as_byte_array(original)
+    common=min(len(decoded),len(original))
+    packets_n=-(-len(original)//packet_size)
+    packet_errors=np.zeros(packets_n,dtype=np.int64)
+    mismatched=0
+    bit_errors=0
+    for start in range(0,common,CHUNK_BYTES):
+        end=min(common,start+CHUNK_BYTES)
+        diff=np.bitwise_xor(np.asarray(decoded[start:end]),np.asarray(original[start:end]))
+        positions=np.flatnonzero(diff)
+        mismatched+=len(positions)
+        bit_errors+=int(BIT_COUNTS[diff[positions]].sum())
+        packet_errors+=np.bincount((positions+start)//packet_size,minlength=packets_n)
+    #bytes the decoded file is missing, as the overlap of each packet with [common,len(original))
+    packet_starts=np.arange(packets_n,dtype=np.int64)*packet_size
+    packet_errors+=np.clip(packet_starts+packet_size,common,len(original))-np.clip(packet_starts,common,len(original))
+    logger.info("compared {} bytes, {} mismatched".format(common,mismatched))
+    return FileComparison(common,mismatched,len(original)-common,bit_errors,packet_errors,packet_size)
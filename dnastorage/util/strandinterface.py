@@ -1,34 +1,116 @@
 #!/usr/bin/python
 import os
+import gzip
+import copy
+import random
 import logging
-from Bio import SeqIO
 from dnastorage.strand_representation import *
-import h5py
-import re
+import multiprocessing
 
 logger = logging.getLogger("dnastorage.util.strandinterface")
 logger.addHandler(logging.NullHandler())
 
 """
-Provide utilities for loading strands from different formats, array, fastq, fast5, etc.
+Provide utilities for loading strands from different formats, array, fastq, fasta, fast5, etc.
+
+Text formats are parsed as a stream of bytes: FastqInterface, FastaInterface and DNAFileInterface do not read their file
+until asked, batches() yields lists of strands while holding only one batch in memory, the strands property still
+materializes every read for code that wants them all at once. Files are gzip decompressed on the fly when they
+start with the gzip magic bytes.
 """
+_normalize = bytes.maketrans(b"UN",b"TA") #RNA reads to DNA, unknown bases to A
+DEFAULT_BATCH_SIZE = 10000
+
+def open_reads(path):
+    #binary handle on a sequencing file, gzip or not
+    with open(path,"rb") as probe:
+        magic = probe.read(2)
+    if magic==b"\x1f\x8b": return gzip.open(path,"rb")
+    return open(path,"rb")
+
+def iter_fastq(path):
+    #yields (record id, sequence bytes) for each FASTQ record, sequence and quality may be wrapped over several lines
+    with open_reads(path) as fd:
+        line = fd.readline()
+        while line:
+            if not line.startswith(b"@"):
+                if line.strip(): raise ValueError("FASTQ record does not start with @: {}".format(line[:50]))
+                line = fd.readline()
+                continue
+            record_id = line[1:].split(None,1)[0].decode() if len(line)>2 else ""
+            seq=[]
+            line = fd.readline()
+            while line and not line.startswith(b"+"):
+                seq.append(line.rstrip(b"\r\n"))
+                line = fd.readline()
+            seq = b"".join(seq)
+            quality_length=0
+            while quality_length<len(seq):
+                line = fd.readline()
+                if not line: break
+                quality_length+=len(line.rstrip(b"\r\n"))
+            yield record_id,seq
+            line = fd.readline()
+
+def iter_fasta(path):
+    #yields (record id, sequence bytes) for each FASTA record
+    with open_reads(path) as fd:
+        record_id,seq = None,[]
+        for line in fd:
+            if line.startswith(b">"):
+                if record_id is not None: yield record_id,b"".join(seq)
+                record_id,seq = (line[1:].split(None,1)[0].decode() if len(line)>2 else ""),[]
+            elif record_id is not None:
+                seq.append(line.strip())
+        if record_id is not None: yield record_id,b"".join(seq)
+
+def iter_dna_lines(path):
+    #yields (None, sequence bytes) for each strand of a .dna file, % lines are comments
+    with open_reads(path) as fd:
+        for line in fd:
+            line = line.strip()
+            if line.startswith(b"%"): continue
+            yield None,line
+
+def read_to_strand(record_id,seq):
+    #BaseDNA for a raw read, U becomes T and N becomes A, reads that had a U are marked as RNA
+    strand = BaseDNA(dna_strand=seq.rstrip(b"\x00").translate(_normalize).decode("ascii","replace"))
+    strand.record_id = record_id
+    strand.is_RNA = b"U" in seq
+    return strand
+
 class BaseStrandInterface:
     def __init__(self):
         self._strands = []
+        self.reads_read = 0 #reads handed out by the last pass of batches()
     @property
     def strands(self):
         return self._strands
     @strands.setter
     def strands(self,s):
         self._strands = s
+    def batches(self,batch_size=DEFAULT_BATCH_SIZE):
+        #lists of at most batch_size strands, in order
+        strands = self.strands
+        self.reads_read = 0
+        for i in range(0,len(strands),batch_size):
+            self.reads_read+=len(strands[i:i+batch_size])
+            yield strands[i:i+batch_size]
+    def __iter__(self):
+        for batch in self.batches():
+            yield from batch
     @classmethod
     def open(self,format_type,path=""):
         if format_type=="fast5":
             return Fast5Interface(path)
         elif format_type=="array":
             return ArrayInterface()
+        elif format_type=="pool":
+            return PoolInterface()
         elif format_type=="fastq":
             return FastqInterface(path)
+        elif format_type=="fasta":
+            return FastaInterface(path)
         elif format_type=="DNA":
             return DNAFileInterface(path)
         else:
@@ -38,73 +120,170 @@ class ArrayInterface(BaseStrandInterface):
     def __init__(self):
         BaseStrandInterface.__init__(self)
 
-class FastqInterface(BaseStrandInterface):
-    def __init__(self,path):
-        BaseStrandInterface.__init__(self)
-        assert os.path.exists(path)
-        tmp_strands=[]
-        for record in SeqIO.parse(path,"fastq"):
-            tmp_strands.append(BaseDNA(dna_strand=str(record.seq)))
-            (tmp_strands[-1].dna_strand,cnt) = re.subn("U","T",tmp_strands[-1].dna_strand) #replace all U with T, should work even if strand is DNA
-            (tmp_strands[-1].dna_strand,_) = re.subn("N","A",tmp_strands[-1].dna_strand) #replace all U with T, should work even if strand is DNA
-            tmp_strands[-1].dna_strand=tmp_strands[-1].dna_strand.rstrip('\x00')
-            tmp_strands[-1].record_id=record.id
-            if cnt>0: tmp_strands[-1].is_RNA=True
-            else: tmp_strands[-1].is_RNA=False
-        self.strands=tmp_strands
-
-class DNAFileInterface(BaseStrandInterface):
-    def __init__(self,path):
+class PoolInterface(BaseStrandInterface):
+    #multiplicity encoded reads, a list of (strand,copies) as fault injection makes them. Reads come out in a shuffled
+    #order fixed when the pool is set, decoding works on strands in place so each read is a shallow copy of its pool
+    #entry made when its batch is handed out: the pool itself is never modified and is only expanded one batch at a time
+    def __init__(self,pool=[]):
         BaseStrandInterface.__init__(self)
-        assert os.path.exists(path)
-        tmp_strands=[]
-        with open(path,'r') as in_fd:
-            while True:
-                s = in_fd.readline()        
-                if len(s) == 0:
-                    break
-                s = s.strip()
-                if s.startswith('%'):
-                    continue
-                tmp_strands.append(BaseDNA(dna_strand=s))
-        self.strands = tmp_strands
-
-class Fast5Interface(BaseStrandInterface):
+        self.pool = pool
+    @property
+    def pool(self):
+        return self._pool
+    @pool.setter
+    def pool(self,pool):
+        self._pool = pool
+        self._order = [i for i,(s,copies) in enumerate(pool) for _ in range(copies)] #pool entry of each read
+        random.shuffle(self._order)
+        self._strands = None
+    @property
+    def read_count(self):
+        return len(self._order)
+    @property
+    def strands(self):
+        if self._strands is None:
+            self._strands = [copy.copy(self._pool[i][0]) for i in self._order]
+        return self._strands
+    @strands.setter
+    def strands(self,s):
+        self._strands = s
+    def batches(self,batch_size=DEFAULT_BATCH_SIZE):
+        if self._strands is not None:
+            yield from BaseStrandInterface.batches(self,batch_size)
+            return
+        self.reads_read = 0
+        for i in range(0,len(self._order),batch_size):
+            batch = [copy.copy(self._pool[j][0]) for j in self._order[i:i+batch_size]]
+            self.reads_read+=len(batch)
+            yield batch
+
+class StreamingInterface(BaseStrandInterface):
+    #reads come from parse(), a generator of records (record id, sequence bytes, ...) handed to make_strand, and are only
+    #materialized when strands is used
     def __init__(self,path):
         BaseStrandInterface.__init__(self)
         assert os.path.exists(path)
+        self._path = path
+        self._strands = None
+    def parse(self):
+        raise NotImplementedError()
+    def make_strand(self,record_id,seq):
+        return read_to_strand(record_id,seq)
+    @property
+    def strands(self):
+        if self._strands is None:
+            self._strands = [self.make_strand(*record) for record in self.parse()]
+        return self._strands
+    @strands.setter
+    def strands(self,s):
+        self._strands = s
+    def batches(self,batch_size=DEFAULT_BATCH_SIZE):
+        if self._strands is not None:
+            yield from BaseStrandInterface.batches(self,batch_size)
+            return
+        self.reads_read = 0
+        batch=[]
+        for record in self.parse():
+            batch.append(self.make_strand(*record))
+            if len(batch)==batch_size:
+                self.reads_read+=len(batch)
+                yield batch
+                batch=[]
+        if len(batch)>0:
+            self.reads_read+=len(batch)
+            yield batch
+
+class FastqInterface(StreamingInterface):
+    def parse(self):
+        return iter_fastq(self._path)
+
+class FastaInterface(StreamingInterface):
+    def parse(self):
+        return iter_fasta(self._path)
+
+class DNAFileInterface(StreamingInterface):
+    def parse(self):
+        return iter_dna_lines(self._path)
+    def make_strand(self,record_id,seq):
+        return BaseDNA(dna_strand=seq.decode())
 
+_fast5_fastq_path = "Analyses/Basecall_1D_000/BaseCalled_template/Fastq"
+
+def _read_fast5_file(path):
+    #(read id, sequence bytes, fast5 path, read group) for every read of one fast5 file, runs in the loader pool.
+    #Only the base calls are kept, quality scores and channel are read again from the file if someone asks for them
+    import h5py
+    reads=[]
+    with h5py.File(path,'r',libver="latest") as hd_fd:
+        for key,group in hd_fd["/"].items():
+            if not isinstance(group,h5py.Group): continue
+            fastq_read = group[_fast5_fastq_path][()]
+            reads.append((group["Raw"].attrs["read_id"].decode("utf-8"),fastq_read.split(b"\n")[1],path,key))
+    return reads
+
+class Fast5Read(BaseDNA):
+    #read from a fast5 file, quality scores and channel id are loaded from the file on first use
+    def __init__(self,dna_strand,fast5_path,read_group):
+        BaseDNA.__init__(self,dna_strand=dna_strand)
+        self._fast5_path = fast5_path
+        self._read_group = read_group
+    def _load_metadata(self):
+        import h5py
+        with h5py.File(self._fast5_path,'r',libver="latest") as hd_fd:
+            group = hd_fd["/"][self._read_group]
+            parsed_fastq = group[_fast5_fastq_path][()].decode("utf-8").split("\n")
+            if not hasattr(self,"_quality_scores"): self._quality_scores = parsed_fastq[-2]
+            if not hasattr(self,"_channel_id"): self._channel_id = int(group["channel_id"].attrs["channel_number"])
+    @property
+    def quality_scores(self):
+        if not hasattr(self,"_quality_scores"): self._load_metadata()
+        return self._quality_scores
+    @quality_scores.setter
+    def quality_scores(self,q):
+        self._quality_scores = q
+    @property
+    def channel_id(self):
+        if not hasattr(self,"_channel_id"): self._load_metadata()
+        return self._channel_id
+    @channel_id.setter
+    def channel_id(self,c):
+        self._channel_id = c
+
+_rna_to_dna = bytes.maketrans(b"U",b"T")
+
+class Fast5Interface(StreamingInterface):
+    #processes: loader pool size for directories, defaults to one process per core
+    def __init__(self,path,processes=None):
+        StreamingInterface.__init__(self,path)
+        self._processes = processes if processes is not None else os.cpu_count()
         if os.path.isfile(path):
-            self.strands=self._extract_fast5_file(path)
+            self._files = [path]
         elif os.path.isdir(path):
             #Assumed that if a direct file is not given, then we are using Oxford Nanopore's fast5 directory layout
-            for p in os.listdir(path):
+            self._files = []
+            for p in sorted(os.listdir(path)):
                 if p!="fast5_pass" and p!="fast5_fail": raise ValueError("Nanopore fast5 directory format not followed")
                 fast5_dir = os.path.join(path,p)
-                for f5 in os.listdir(fast5_dir):
+                for f5 in sorted(os.listdir(fast5_dir)):
                     if not ".fast5" in f5: raise ValueError("Non fast5 file in fast5 directory")
-                    self.strands = self.strands + self._extract_fast5_file(os.path.join(fast5_dir,f5))
+                    self._files.append(os.path.join(fast5_dir,f5))
         else:
             raise ValueError("Fast5 path is not a file or directory")
-        
-    def _extract_fast5_file(self,path):
-        tmp_strands =[]
-        assert os.path.exists(path) and os.path.isfile(path)
-        #extract strands from a given file, along with other interesting meta data
-        hd_fd=h5py.File(path,'r',libver="latest")
-        root_group = hd_fd["/"]
-        for key in root_group.keys():
-            if not isinstance(root_group[key],h5py.Group): continue
-            fastq_read = root_group[key]["Analyses/Basecall_1D_000/BaseCalled_template/Fastq"][()].decode("utf-8")
-            parsed_fastq=fastq_read.split("\n")
-            quality_scores = parsed_fastq[-2]
-            DNA = parsed_fastq[1].replace("U","T")
-            tmp_strands.append(BaseDNA(dna_strand=DNA))
-            tmp_strands[-1].record_id = root_group[key]["Raw"].attrs["read_id"].decode("utf-8")
-            tmp_strands[-1].quality_scores=quality_scores
-            tmp_strands[-1].is_RNA=True
-            tmp_strands[-1].channel_id = int(root_group[key]["channel_id"].attrs["channel_number"])
-        return tmp_strands
+
+    def parse(self):
+        if self._processes>1 and len(self._files)>1:
+            with multiprocessing.Pool(min(self._processes,len(self._files))) as pool:
+                for reads in pool.imap(_read_fast5_file,self._files):
+                    yield from reads
+        else:
+            for path in self._files:
+                yield from _read_fast5_file(path)
+
+    def make_strand(self,record_id,seq,fast5_path,read_group):
+        strand = Fast5Read(seq.translate(_rna_to_dna).decode(),fast5_path,read_group)
+        strand.record_id = record_id
+        strand.is_RNA = True
+        return strand
 
 if __name__=="__main__":
     #test out the interface on fast5 files
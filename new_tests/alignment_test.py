@@ -0,0 +1,19 @@
+import unittest
+
+from dnastorage.alignment.star import CenterStarAlign,center_star_alignment
+from dnastorage.strand_representation import BaseDNA
+
+class center_star_test(unittest.TestCase):
+    """ in-process MSA must keep every strand recoverable and line columns up across strands. """
+    def test_gapped_rows(self):
+        strands = ["ACGTACGT","ACGACGT","ACGTTACGT","ACGTACGA"]
+        aligned = center_star_alignment(strands)
+        assert len(set(len(a) for a in aligned)) == 1
+        assert [a.replace("-","") for a in aligned] == strands
+
+    def test_run_batch(self):
+        clusters = [[BaseDNA(dna_strand=s) for s in ("AAGGTTCC","AAGTTCC","AAGGTTCC")],[BaseDNA(dna_strand="ACGT")]]
+        aligned = CenterStarAlign(15).RunBatch(clusters)
+        assert [s.dna_strand.replace("-","") for s in aligned[0]] == ["AAGGTTCC","AAGTTCC","AAGGTTCC"]
+        assert [len(s.dna_strand) for s in aligned[0]] == [8,8,8]
+        assert [s.dna_strand for s in aligned[1]] == ["ACGT"]
@@ -0,0 +1,61 @@
+import random
+import unittest
+
+import Levenshtein as ld
+
+import dnastorage.cluster.lsh as lsh
+from dnastorage.cluster.lsh import LocalitySensitiveHashCluster,UnionFind,bounded_pair_distances
+from dnastorage.strand_representation import BaseDNA
+
+class lsh_test(unittest.TestCase):
+    """ vectorized min hashes must match the per-kmer definition. """
+    def test_min_hashes(self):
+        strands = [ BaseDNA(dna_strand="".join(random.choices("ACGT",k=random.randint(10,120)))) for _ in range(50) ]
+        cluster = LocalitySensitiveHashCluster(20,4,2,4,100)
+        rng = LocalitySensitiveHashCluster(20,4,2,4,100)._rng #same seed, so the same permutation tables
+        tables = [ rng.permutation(4**4) for _ in range(20) ]
+        for s,min_hashes in cluster.calculate_min_hashes(strands):
+            kmers = [ cluster.convert_dna_to_index(k) for k in cluster.calculate_kmers(s.dna_strand[:100]) ]
+            assert min_hashes == [ min(table[k] for k in kmers) for table in tables ]
+
+    def test_union_find(self):
+        uf = UnionFind(100000)
+        for i in range(1,100000): #a long chain must not recurse
+            uf.union(i-1,i)
+        uf.union(100,5)
+        assert uf.find(0) == uf.find(99999)
+        assert [ len(g) for g in uf.groups() ] == [100000]
+
+class verify_pairs_test(unittest.TestCase):
+    """ bounded verification must keep exactly the pairs the unbounded Levenshtein.distance check kept, with or without rapidfuzz. """
+    def mutate(self,rng,strand,edits):
+        strand = list(strand)
+        for _ in range(edits):
+            i = rng.randrange(len(strand))
+            edit = rng.choice("SID")
+            if edit=="S": strand[i] = rng.choice("ACGT")
+            elif edit=="I": strand.insert(i,rng.choice("ACGT"))
+            elif len(strand)>1: del strand[i]
+        return "".join(strand)
+
+    def test_verify_pairs(self):
+        rng = random.Random(12)
+        strands = []
+        for _ in range(600): #edit counts around the 0.338 threshold, and unrelated strands
+            base = "".join(rng.choices("ACGT",k=rng.randint(20,150)))
+            strands += [BaseDNA(dna_strand=base),BaseDNA(dna_strand=self.mutate(rng,base,rng.randint(0,int(0.5*len(base)))))]
+        pairs = [(i,i+1) for i in range(0,len(strands),2)]+[(rng.randrange(len(strands)),rng.randrange(len(strands))) for _ in range(600)]
+        old = [ld.distance(strands[r].dna_strand,strands[m].dna_strand)<0.338*len(strands[r].dna_strand) for r,m in pairs]
+        assert 0<sum(old)<len(old)
+        rf_process = lsh.rf_process
+        try:
+            for backend in ([rf_process] if rf_process is not None else [])+[None]:
+                lsh.rf_process = backend #None takes the Levenshtein.distance fallback
+                for workers in (1,2):
+                    assert LocalitySensitiveHashCluster(20,4,2,4,100,workers=workers).verify_pairs(strands,pairs) == old
+                a,b = [s.dna_strand for s in strands[0::2]],[s.dna_strand for s in strands[1::2]]
+                exact = [ld.distance(x,y) for x,y in zip(a,b)]
+                bounded = bounded_pair_distances(a,b,20).tolist()
+                assert all(d==e if e<=20 else d>20 for d,e in zip(bounded,exact))
+        finally:
+            lsh.rf_process = rf_process
@@ -0,0 +1,221 @@
+import os
+import sys
+import random
+import gzip
+import pickle
+import tempfile
+import itertools
+import unittest
+import numpy as np
+import editdistance as ed
+
+from dnastorage.fi.fault_injector import BaseFI, AliasTable
+from dnastorage.fi.read_store import ReadStore
+from dnastorage.strand_representation import BaseDNA
+from dnastorage.util.strandinterface import BaseStrandInterface
+
+def random_strands(rng, n, length):
+    strands = [BaseDNA(dna_strand="".join(rng.choice("ACGT") for _ in range(length))) for _ in range(n)]
+    for i, s in enumerate(strands): s.index_ints = (i,)
+    return strands
+
+class fault_pool_test(unittest.TestCase):
+    """ fault models must give the same read count and error statistics over the multiplicity encoded pool as read by read. """
+    def error_stats(self, out, strands):
+        distances = np.array([ed.eval(r.dna_strand, strands[r.encoded_index_ints[0]].dna_strand) for r, c in out for _ in range(c)])
+        return len(distances), (distances > 0).mean(), distances.mean()
+
+    def test_run_pool(self):
+        strands = random_strands(random.Random(0), 100, 100)
+        pool = [(s, 40) for s in strands]
+        for model in ("fixed_rate", "fixed_rate_vectorized"):
+            random.seed(1)
+            fi = BaseFI.open(model, fault_rate=0.01, seed=1)
+            fi.set_library([s for s, c in pool for _ in range(c)])
+            n, faulty, distance = self.error_stats([(r, 1) for r in fi.Run()], strands)
+            fi = BaseFI.open(model, fault_rate=0.01, seed=2)
+            fi.set_pool(pool)
+            out = fi.RunPool()
+            n_pool, faulty_pool, distance_pool = self.error_stats(out, strands)
+            assert n == n_pool == 4000
+            assert abs(faulty - faulty_pool) < 0.05 and abs(faulty - (1 - 0.99 ** 100)) < 0.05
+            assert abs(distance - distance_pool) < 0.1
+
+    def test_pool_interface(self):
+        strands = random_strands(random.Random(2), 10, 20)
+        interface = BaseStrandInterface.open("pool")
+        interface.pool = [(s, i) for i, s in enumerate(strands)]
+        for _ in range(2): # streamed twice, as open_files does
+            reads = [r for batch in interface.batches(7) for r in batch]
+            assert interface.reads_read == interface.read_count == len(reads) == 45
+            assert sorted(r.index_ints[0] for r in reads) == [i for i in range(10) for _ in range(i)]
+            assert not any(r is s for r in reads for s in strands) # decoding may rewrite reads, never the pool
+
+class dnarsim_test(unittest.TestCase):
+    """ the numpy DNArSim channel must match a base by base reading of channel.jl on small synthetic tables, without Julia. """
+    k = 3
+    edits = "MDIS"
+
+    def setUp(self):
+        rng = random.Random(5)
+        self.directory = tempfile.mkdtemp()
+        root = os.path.join(self.directory, "k{}".format(self.k))
+        os.mkdir(root)
+        def write(name, text):
+            with open(os.path.join(root, name), "w") as f: f.write(text)
+        self.ends = {"Beg": (0.1, (0.3, 0.3, 0.4), (0.6, 0.4)), "End": (0.2, (0.2, 0.5, 0.3), (0.5, 0.3, 0.2))}
+        for prefix, (edit, (ins, dele, mis), lengths) in self.ends.items():
+            write(prefix + "ErrByPosAvg.txt", "{}\n".format(edit))
+            write(prefix + "InsByPosAvg.txt", "{}\n".format(ins))
+            write(prefix + "DelByPosAvg.txt", "{}\n".format(dele))
+            write(prefix + "MisAvg.txt", "{}\n".format(mis))
+            write("insLen{}Rates.txt".format(prefix), " ".join(map(str, lengths)) + " 0\n")
+        self.transitions = {}
+        for a in "ACGT":
+            weights = [rng.uniform(1, 3) for _ in range(3)]
+            for b, w in zip([b for b in "ACGT" if b != a], weights):
+                write("{}2{}_Avg.txt".format(a, b), "{}\n".format(w))
+                self.transitions[a + b] = w / sum(weights)
+        kmers = ["".join(p) for p in itertools.product("ACGT", repeat=self.k)][::3] # the other k-mers use the AVG row
+        self.rates, self.lengths = {}, {}
+        for e in self.edits:
+            self.rates[e] = {kmer: (rng.uniform(0, 0.1), rng.uniform(0, 0.1), rng.uniform(0, 0.1)) for kmer in kmers + ["AVG"]}
+            write("KmerYi_prevYi{}_RatesAvg.txt".format(e), "".join("{} {} {} {} 0 0\n".format(kmer, *r) for kmer, r in self.rates[e].items()))
+            self.lengths[e] = {kmer: (rng.uniform(0.5, 1), rng.uniform(0, 0.5)) for kmer in kmers + ["AVG"]}
+            write("KmerInsLen_prevYi{}_RatesAvg2.txt".format(e), "".join("{} {},{}\n".format(kmer, *l) for kmer, l in self.lengths[e].items()))
+
+    def reference(self, seq, rng):
+        def insert(lengths):
+            r, total, n = rng.random(), 0, 1
+            for j, p in enumerate(lengths):
+                total += p
+                if r <= total:
+                    n = j + 1
+                    break
+            return [rng.choice("ACGT") for _ in range(n)]
+        def substitute(base):
+            r, total = rng.random(), 0
+            for b in "ACGT":
+                if b == base: continue
+                total += self.transitions[base + b]
+                if r <= total: return b
+            return b
+        out, prev = [], None
+        for i, base in enumerate(seq):
+            if i == 0 or i == len(seq) - 1:
+                edit, rates, lengths = self.ends["Beg" if i == 0 else "End"]
+                if rng.random() > edit:
+                    out.append(base)
+                    prev = "M"
+                    continue
+                r = rng.random() * sum(rates)
+                if r <= rates[0]:
+                    out += insert(lengths)
+                    prev = "I"
+                elif r <= rates[0] + rates[1]:
+                    prev = "D"
+                else:
+                    out.append(substitute(base))
+                    prev = "S"
+                continue
+            r = rng.random()
+            if i < self.k - 1: continue # channel.jl emits nothing for these positions
+            kmer = seq[i - self.k + 1:i + 1]
+            ins, dele, sub = self.rates[prev].get(kmer, self.rates[prev]["AVG"])
+            if r <= dele + sub:
+                if rng.random() <= dele / (dele + sub):
+                    prev = "D"
+                    continue
+                out.append(substitute(base))
+                prev = "S"
+            else:
+                out.append(base)
+                prev = "M"
+            if rng.random() <= ins:
+                out += insert(self.lengths[prev].get(kmer, self.lengths[prev]["AVG"]))
+                prev = "I"
+        return "".join(out)
+
+    def test_channel(self):
+        strands = random_strands(random.Random(6), 3000, 40)
+        fi = BaseFI.open("DNArSim_vectorized", probability_path=self.directory, kmer_length=self.k, seed=7)
+        fi.set_library(strands)
+        vectorized = [r.dna_strand for r in fi.Run()]
+        assert "julia" not in sys.modules
+        rng = random.Random(8)
+        direct = [self.reference(s.dna_strand, rng) for s in strands]
+        unedited_length = lambda out, s: float(len(out) == len(s.dna_strand) - (self.k - 2)) # positions 0<i<k-1 are always dropped
+        for measure in (lambda out, s: len(out), lambda out, s: ed.eval(out, s.dna_strand), unedited_length):
+            a = np.array([measure(out, s) for out, s in zip(vectorized, strands)])
+            b = np.array([measure(out, s) for out, s in zip(direct, strands)])
+            assert abs(a.mean() - b.mean()) < 4 * np.sqrt((a.var() + b.var()) / len(strands))
+            assert abs(a.std() - b.std()) < 0.1 * b.std() + 0.05
+
+class read_store_test(unittest.TestCase):
+    """ mapped reads of a (gzipped) FASTQ must come back from the 2-bit store, non ACGTUN bases as A, U as T. """
+    def test_round_trip(self):
+        directory = tempfile.mkdtemp()
+        fastq = os.path.join(directory, "reads.fastq.gz")
+        sequences = {"r0": "ACGTACGTA", "r1": "GGUUNACxT", "r2": "TTT", "r3": "CAGT" * 9, "r4": "A"}
+        with gzip.open(fastq, "wt") as f:
+            for record_id, seq in sequences.items():
+                f.write("@{} extra\n{}\n+\n{}\n".format(record_id, seq, "I" * len(seq)))
+        mapping = os.path.join(directory, "map.txt")
+        with open(mapping, "w") as f: f.write("mapping\n")
+        record_map = {"r0": (1, 2), "r1": (3,), "r3": (1, 2), "r4": (7,)} # r2 is not mapped and is left out
+        loads = []
+        def load_map():
+            loads.append(1)
+            return record_map
+        path = os.path.join(directory, "store")
+        for _ in range(2): # built, then reopened from disk
+            store = ReadStore.open(path, fastq, [mapping], load_map)
+            assert len(loads) == 1 and len(store) == 4
+            assert store.reads([3, 1, 0, 2]) == ["A", "GGTTAACAT", "ACGTACGTA", "CAGT" * 9]
+            assert [store.index_table[i] for i in store.index_ids] == [(1, 2), (3,), (1, 2), (7,)]
+        assert isinstance(store.bases, np.memmap)
+        os.utime(mapping, (0, 0)) # sources changed, the store is rebuilt
+        ReadStore.open(path, fastq, [mapping], load_map)
+        assert len(loads) == 2
+
+class pattern_fault_test(unittest.TestCase):
+    """ the alias table must follow its weights, and bulk burst sampling must keep the per nucleotide skip/break rules. """
+    def test_alias_table(self):
+        weights = np.array([5, 2, 2, 0.5, 0.5, 0, 3])
+        samples = AliasTable(weights).sample(np.random.default_rng(9), 200000)
+        p = weights / weights.sum()
+        frequencies = np.bincount(samples, minlength=len(weights)) / len(samples)
+        assert np.all(np.abs(frequencies - p) <= 4 * np.sqrt(p * (1 - p) / len(samples)))
+        assert frequencies[5] == 0
+
+    def old_sites(self, strands, rates, pattern):
+        # the per nucleotide loop bursts were drawn with before, for a single pattern and rates of 0 or 1
+        sites = {}
+        for strand_index, strand in enumerate(strands):
+            sites[strand_index] = []
+            skip_to_index = -1
+            for nuc_index in range(len(strand)):
+                if nuc_index < skip_to_index or rates[nuc_index] == 0: continue
+                inject_index = nuc_index
+                for e in pattern:
+                    if e == "I":
+                        sites[strand_index].append((inject_index, "2"))
+                    elif e in "DR":
+                        if inject_index >= len(strand): break
+                        sites[strand_index].append((inject_index, "1" if e == "D" else "0"))
+                        inject_index += 1
+                skip_to_index = inject_index + 1
+        return sites
+
+    def test_fixed_pattern(self):
+        directory = tempfile.mkdtemp()
+        rates = [1, 0, 1, 1, 1, 0, 0, 1, 1, 1, 1, 1]
+        with open(os.path.join(directory, "rates.pickle"), "wb") as f: pickle.dump(rates, f)
+        strands = random_strands(random.Random(10), 12, 12)
+        for i, s in enumerate(strands): s.dna_strand = s.dna_strand[:i + 1]
+        for pattern in ("R", "I", "RDI", "DDR", "IRD", "DRRRR"):
+            with open(os.path.join(directory, "patterns.pickle"), "wb") as f: pickle.dump({pattern: 1.0}, f)
+            fi = BaseFI.open("pattern_fixed_rate", error_rate_path=os.path.join(directory, "rates.pickle"),
+                             pattern_dist_path=os.path.join(directory, "patterns.pickle"), seed=11)
+            fi.set_library(strands)
+            assert fi.injection_sites() == self.old_sites([s.dna_strand for s in strands], rates, pattern)
@@ -0,0 +1,96 @@
+import unittest
+import random
+import numpy as np
+
+from dnastorage.lt_codes_python.core import Symbol,generate_indexes,generate_graph,philox4x32,GraphCache,GRAPH_RANDOM,GRAPH_FORMATS
+from dnastorage.lt_codes_python.encoder import encode_matrix, crc8_rows, HEADER_SIZE
+from dnastorage.lt_codes_python.decoder import decode
+from dnastorage.lt_codes_python.fountain import LTFountain
+
+def recoverable_blocks(droplets, blocks_n, systematic):
+    # brute force: block b can be recovered iff its unit vector is in the GF(2) span of the droplet neighbor sets
+    indexes = (droplets[:, 2:HEADER_SIZE - 1].astype(np.int64) << np.arange(0, 24, 8)).sum(axis=1)
+    _, pointers, neighbors = generate_graph(indexes, droplets[:, 1], blocks_n, systematic, int(droplets[0, HEADER_SIZE - 1]))
+    basis = {}
+    def reduce(row):
+        while row and row.bit_length() - 1 in basis: row ^= basis[row.bit_length() - 1]
+        return row
+    for i in range(len(droplets)):
+        row = reduce(sum(1 << int(b) for b in neighbors[pointers[i]:pointers[i + 1]]))
+        if row: basis[row.bit_length() - 1] = row
+    return np.array([reduce(1 << b) == 0 for b in range(blocks_n)])
+
+class lt_decode_test(unittest.TestCase):
+    """ blocks must come back at low redundancy (inactivation), and blocks no droplet determines must stay zeros. """
+    def test_recover(self):
+        blocks = np.random.default_rng(0).integers(0, 256, (200, 16), dtype=np.uint8)
+        droplets = encode_matrix(blocks, 220, False, 16, 1)
+        decoded, solved = decode([Symbol(0, 0, row.tobytes()) for row in droplets], 200, False, 16, 1)
+        assert solved == 200
+        assert np.array_equal(decoded, blocks)
+
+    def test_partial(self):
+        blocks = np.random.default_rng(1).integers(0, 256, (50, 16), dtype=np.uint8)
+        droplets = encode_matrix(blocks, 50, True, 16, 1)
+        droplets[3, 0] ^= 1 # corrupted droplet is dropped by its checksum
+        decoded, solved = decode([Symbol(0, 0, row.tobytes()) for row in droplets[1:]], 50, True, 16, 1)
+        recovered = (decoded == blocks).all(axis=1)
+        assert solved == recovered.sum() == 48
+        assert not decoded[~recovered].any()
+
+    def test_rank(self):
+        random.seed(12) # degrees are drawn from the global random state
+        blocks = np.random.default_rng(12).integers(0, 256, (125, 8), dtype=np.uint8)
+        droplets = encode_matrix(blocks, 125, False, 8, 1)[:120]
+        decoded, solved = decode([Symbol(0, 0, row.tobytes()) for row in droplets], 125, False, 8, 1)
+        recovered = (decoded == blocks).all(axis=1)
+        assert solved == recovered.sum() and np.array_equal(recovered, recoverable_blocks(droplets, 125, False))
+
+    def test_degree_range(self):
+        blocks = np.random.default_rng(4).integers(0, 256, (20, 8), dtype=np.uint8)
+        droplets = encode_matrix(blocks, 40, False, 8, 1)
+        droplets[5, 1] = 21 # degree past the block count, with a checksum that still matches
+        droplets[5, 0] = crc8_rows(droplets[5:6, 1:])[0]
+        decoded, solved = decode([Symbol(0, 0, row.tobytes()) for row in droplets], 20, False, 8, 1)
+        assert solved == 20 and np.array_equal(decoded, blocks)
+
+class lt_graph_test(unittest.TestCase):
+    """ neighbor generation must be stable per graph format, batched or not, and leave the global random state alone. """
+    def test_philox(self):
+        # Random123 known answer
+        assert philox4x32(np.array([[0x243f6a88, 0x85a308d3, 0x13198a2e, 0x03707344]], dtype=np.uint32), 0xa4093822, 0x299f31d0).tolist() == [[0xd16cfe09, 0x94fdcceb, 0x5001e420, 0x24126ea1]]
+
+    def test_formats(self):
+        random.seed(3)
+        expected = random.sample(range(100), 5)
+        state = random.getstate()
+        assert generate_indexes(3, 5, 100, False, GRAPH_RANDOM)[0] == expected
+        assert random.getstate() == state
+        degrees = np.random.default_rng(0).integers(1, 30, 300)
+        for graph_format in GRAPH_FORMATS:
+            used, pointers, neighbors = generate_graph(np.arange(300), degrees, 100, True, graph_format)
+            assert used[50] == 1 and neighbors[pointers[50]] == 50
+            for i in (120, 299):
+                assert neighbors[pointers[i]:pointers[i + 1]].tolist() == generate_indexes(i, int(degrees[i]), 100, True, graph_format)[0]
+            cached = GraphCache()
+            cached.generate(np.arange(200), degrees[:200], 100, True, graph_format)
+            assert all(np.array_equal(a, b) for a, b in zip(cached.generate(np.arange(300)[::-1], degrees[::-1], 100, True, graph_format),
+                                                             generate_graph(np.arange(300)[::-1], degrees[::-1], 100, True, graph_format)))
+
+    def test_legacy_droplets(self):
+        blocks = np.random.default_rng(2).integers(0, 256, (100, 8), dtype=np.uint8)
+        droplets = encode_matrix(blocks, 140, False, 8, 1, graph_format=GRAPH_RANDOM)
+        assert not droplets[:, 5].any() # GRAPH_RANDOM droplets look like the ones written before the format byte
+        decoded, solved = decode([Symbol(0, 0, row.tobytes()) for row in droplets], 100, False, 8, 1)
+        assert solved == 100 and np.array_equal(decoded, blocks)
+
+class lt_fountain_test(unittest.TestCase):
+    """ the in memory stage must give back the exact bytes, whatever the size modulo the packet size. """
+    def test_buffers(self):
+        for size in (640, 650):
+            data = np.random.default_rng(size).integers(0, 256, size, dtype=np.uint8).tobytes()
+            fountain = LTFountain(1.4, True, 32, 1)
+            droplets = fountain.encode(data)
+            assert len(droplets) == int(fountain.blocks_n * 1.4) * 38
+            assert fountain.decode(droplets[38:-5]) == data # a lost droplet, a truncated one
+            assert LTFountain(1.4, True, 32, 1, cache=False).decode(droplets, fountain.blocks_n, size) == data
@@ -0,0 +1,48 @@
+import random
+import unittest
+
+import dnastorage.codec.fasthedges as fasthedges
+from dnastorage.codec.hedges import FastHedgesPipeline
+from dnastorage.strand_representation import BaseDNA
+from dnastorage.primer.primer_util import reverse_complement
+
+def noisy_strands(rng, codec, n, length, index_bytes=2):
+    # encoded strands with substitutions, insertions and deletions, some of them reverse complemented
+    reads = []
+    for i in range(n):
+        s = BaseDNA(codewords=[rng.randrange(256) for _ in range(length)], index_bytes=index_bytes)
+        dna = list(codec._encode(s).dna_strand)
+        for _ in range(rng.randrange(4)):
+            j, edit = rng.randrange(len(dna)), rng.choice("SID")
+            if edit == "S": dna[j] = rng.choice("ACGT")
+            elif edit == "I": dna.insert(j, rng.choice("ACGT"))
+            else: del dna[j]
+        dna = "".join(dna)
+        if i % 10 == 0: dna = dna[:len(dna) // 3] # too damaged to decode fully
+        reads.append(reverse_complement(dna) if rng.random() < 0.3 else dna)
+    return reads
+
+class bulk_decode_test(unittest.TestCase):
+    """ threaded bulk decoding must give exactly what per strand decoding gives, whatever the thread count. """
+    def test_bulk_decode(self):
+        rng = random.Random(3)
+        codec = FastHedgesPipeline(rate=0.5, guess_limit=2000)
+        reads = noisy_strands(rng, codec, 60, 12)
+        single = [fasthedges.decode(d, codec._hedges_state, 2000) for d in reads]
+        assert any(None in r["return_bytes"] for r in single) and not all(None in r["return_bytes"] for r in single)
+        for threads in (1, 4, 0):
+            assert fasthedges.bulk_decode(reads, codec._hedges_state, 2000, threads) == single
+
+    def test_decode_batch(self):
+        rng = random.Random(4)
+        def strands(reads):
+            out = [BaseDNA(dna_strand=d) for d in reads]
+            for i, s in enumerate(out): s.orientation_known = i % 7 == 0 # oriented by the primers, skips the trial decodes
+            return out
+        for try_reverse in (False, True):
+            codec = FastHedgesPipeline(rate=0.5, guess_limit=2000, try_reverse=try_reverse)
+            reads = noisy_strands(rng, codec, 60, 12)
+            single = [codec._decode(s).codewords for s in strands(reads)]
+            for threads in (1, 4, 0):
+                codec._decode_threads = threads
+                assert [s.codewords for s in codec._decode_batch(strands(reads))] == single
@@ -0,0 +1,39 @@
+import unittest
+
+from dnastorage.primer.primer_util import locate_primer,locate_primer_batch,_myers_locate,PrimerOrientation,reverse_complement
+from dnastorage.codec.phys import PrependSequence,AppendSequence
+
+class locate_primer_test(unittest.TestCase):
+    """ primer location must agree between the native and python engines and give the end of the best match. """
+    def test_locate(self):
+        primer = "TTGCATGCAAGCTTGGCCAA"
+        read = "GG"+primer[:5]+primer[6:]+"ACGTACGT" #one deletion inside the primer
+        matches,end = locate_primer(read,primer)
+        assert matches == len(primer)-1
+        assert read[end+1:] == "ACGTACGT"
+        assert _myers_locate(read,primer) == (len(primer)-matches,end)
+        assert locate_primer_batch([read,""],primer) == [(matches,end),(0,-1)]
+
+    def test_trim(self):
+        p5 = "TTGCATGCAAGCTTGGCCAA"
+        p3 = "ACGTACGTACGTACGTACGT"
+        payload = "CCCAAAGGGTTTCACA"
+        read = p5[:3]+"A"+p5[4:]+payload+p3[:10]+p3[11:]
+        prepend = PrependSequence(p5,handler="align",search_range=100)
+        append = AppendSequence(p3,handler="align",search_range=100)
+        assert append._decode(prepend._decode(read)) == payload
+        assert append._decode_batch(prepend._decode_batch([read,p5+payload+p3])) == [payload,payload]
+        assert prepend._decode("ACGT"*10) == "ACGT"*10 #no primer, strand is left alone
+
+class orientation_test(unittest.TestCase):
+    """ reads are oriented from the primer k-mers at their ends, reads without primers stay undecided. """
+    def test_classify(self):
+        p5 = "TTGCATGCAAGCTTGGCCAA"
+        p3 = "ACGTACGTACGTACGTACGT" #its own reverse complement, only usable through its position
+        read = p5+"CCCAAAGGGTTTCACAGGATCAAGT"+p3
+        orientation = PrimerOrientation([p5],[p3],40)
+        assert orientation.classify(read) == 1
+        assert orientation.classify(reverse_complement(read)) == -1
+        assert orientation.classify("CCCAAAGGGTTTCACAGGATCAAGT") == 0
+        assert reverse_complement("AACGT") == "ACGTT"
+        self.assertRaises(KeyError,reverse_complement,"ACNT")
@@ -0,0 +1,80 @@
+from random import randint
+import unittest
+
+import numpy as np
+
+from dnastorage.codec.reedsolomon.rs import get_reed_solomon,ReedSolomon,ReedSolomonError,fastrs
+from dnastorage.codec.reedsolomon.columnar import ColumnarReedSolomon
+
+class columnar_py_test(unittest.TestCase):
+    """ columnar RS engine must agree with the scalar codec column by column. """
+    def test_encode_matches_scalar(self):
+        rs = get_reed_solomon(c_exp=8)
+        crs = ColumnarReedSolomon(rs)
+        messages = np.array([ [ randint(0,255) for _ in range(20) ] for _ in range(50) ],dtype=np.uint8)
+        parity = crs.encode_columns(messages,16)
+        for c in range(messages.shape[1]):
+            column = messages[:,c].tolist()
+            assert rs.rs_encode_msg(column,16)[len(column):] == parity[:,c].tolist()
+
+    def test_dirty_columns(self):
+        rs = get_reed_solomon(c_exp=8)
+        crs = ColumnarReedSolomon(rs)
+        messages = np.array([ [ randint(0,255) for _ in range(20) ] for _ in range(50) ],dtype=np.uint8)
+        codewords = np.vstack([messages,crs.encode_columns(messages,16)])
+        assert len(crs.dirty_columns(codewords,16)) == 0
+        codewords[3,7] ^= 0x5a
+        codewords[60,11] ^= 0x01
+        assert crs.dirty_columns(codewords,16).tolist() == [7,11]
+
+    def test_erasure_only_recovery(self):
+        rs = get_reed_solomon(c_exp=8)
+        crs = ColumnarReedSolomon(rs)
+        messages = np.array([ [ randint(0,255) for _ in range(20) ] for _ in range(50) ],dtype=np.uint8)
+        codewords = np.vstack([messages,crs.encode_columns(messages,16)])
+        erased = codewords.copy()
+        erase_pos = (0,9,10,49,55)
+        erased[list(erase_pos)] = 0
+        filled,valid = crs.correct_erasures(erased,16,erase_pos)
+        assert valid.all()
+        assert (filled == codewords).all()
+        #an extra unknown error should be flagged for the full decoder
+        erased[20,4] ^= 0x11
+        filled,valid = crs.correct_erasures(erased,16,erase_pos)
+        assert valid.tolist() == [ i!=4 for i in range(20) ]
+
+
+@unittest.skipIf(fastrs is None, "fastrs extension not built")
+class fastrs_test(unittest.TestCase):
+    """ native codec must produce the same codewords and corrections as the python reference. """
+    def test_matches_python(self):
+        for c_exp,prim in [(8,0x18d),(16,0x1002d)]:
+            ref = ReedSolomon(generator=2, c_exp=c_exp, prim=prim)
+            fast = get_reed_solomon(c_exp=c_exp)
+            for _ in range(200):
+                message = [ randint(0,ref.field_charac) for _ in range(30) ]
+                codeword = ref.rs_encode_msg(message,12)
+                assert fast.rs_encode_msg(message,12) == codeword
+                codeword[2] ^= 0x3
+                codeword[17] ^= 0x1
+                codeword[33] = 0
+                assert fast.rs_correct_msg(codeword,12,erase_pos=[33]) == ref.rs_correct_msg(codeword,12,erase_pos=[33])
+
+    def test_symbol_range(self):
+        # symbols index the field tables, out of field values must be rejected rather than read past them
+        for message in ([300], [-1], [2**40]):
+            with self.assertRaises(ValueError):
+                fastrs.encode(message, 4, 8, 0x18d, 2, 0, 2)
+        with self.assertRaises(ValueError):
+            fastrs.syndromes([1, 256], 4, 8, 0x18d, 2, 0, 2)
+        with self.assertRaises(ValueError):
+            fastrs.correct([1, None, 256], 2, 8, 0x18d, 2, 0, 2, [1])
+        assert fastrs.encode([255, 0, 1], 4, 8, 0x18d, 2, 0, 2)[:3] == [255, 0, 1]
+
+    def test_uncorrectable(self):
+        rs = get_reed_solomon(c_exp=8)
+        codeword = rs.rs_encode_msg(list(range(30)),4)
+        for i in range(5):
+            codeword[i] ^= 0xff
+        with self.assertRaises(ReedSolomonError):
+            rs.rs_correct_msg(codeword,4)
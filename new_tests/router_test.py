@@ -0,0 +1,65 @@
+import os
+import random
+import tempfile
+import unittest
+
+from dnastorage.system.pipeline_dnafile import DNAFilePipeline
+from dnastorage.codec.PipeLine import PipeLine
+from dnastorage.util.strandinterface import BaseStrandInterface
+from dnastorage.strand_representation import BaseDNA
+from dnastorage.primer.primer_util import reverse_complement
+
+class read_router_test(unittest.TestCase):
+    """ reads of several barcoded files are routed to their header pipelines, then streamed again to their payload pipelines. """
+    def test_open_files(self):
+        rng = random.Random(1)
+        header_params = {"primer3":"","primer5":"","hedges_rate":0.25,"strandSizeInBytes":5,"blockSizeInBytes":100,"outerECCStrands":36,
+                         "dna_length":400,"title":"router_header","hedges_guesses":1000,"crc_type":"strand","reverse_payload":False}
+        encoder_params = {"primer3":"ACGTACGTACGTACGTACGT","primer5":"TTGCATGCAAGCTTGGCCAA","packeted_inner_strand_size":[4,30],
+                          "index_bytes":4,"using_DNA_consolidator":"ideal","blockSizeInBytes":3000,"outerECCStrands":40,"dna_length":400,"title":"router_payload","fi":True}
+        directory = tempfile.mkdtemp()
+        params,datas,reads = [],[],[]
+        for barcode in ((1,),(2,)):
+            prefix = os.path.join(directory,str(barcode[0]))
+            data = bytes(rng.getrandbits(8) for _ in range(1000))
+            w = DNAFilePipeline.open("w",format_name="ReedSolomon_Base4_Pipeline",header_params=header_params,header_version="0.5",
+                                     encoder_params=encoder_params,fsmd_header_filename=prefix+".h",payload_header_filename=prefix+".p",
+                                     file_barcode=barcode,do_write=False,dna_file_name=prefix+".dna",store_header=True)
+            w.write(data)
+            w.close()
+            for s in w.strands:
+                reads.append(BaseDNA(dna_strand=s.dna_strand))
+                reads[-1].encoded_index_ints = s.index_ints #ideal clustering groups reads by their encoded index
+            params.append({"header_version":"0.5","header_params":header_params,"encoder_params":encoder_params,
+                           "fsmd_header_filename":prefix+".h","payload_header_filename":prefix+".p","file_barcode":barcode})
+            datas.append(data)
+        rng.shuffle(reads)
+        strand_interface = BaseStrandInterface.open("array")
+        strand_interface.strands = reads
+        trims = []
+        trim_batch = PipeLine.trim_batch
+        PipeLine.trim_batch = lambda pipeline,strands: trims.extend([pipeline]*len(strands)) or trim_batch(pipeline,strands)
+        try:
+            files,returned = DNAFilePipeline.open_files(params,strand_interface)
+        finally:
+            PipeLine.trim_batch = trim_batch
+        assert [f.read(len(d)) for f,d in zip(files,datas)] == datas
+        filtered = [s for f in files for s in f.pipe.get_filtered()]
+        assert all(any(s is t for t in filtered) for s in returned) #every read found a pipeline, only the pipelines gave any back
+        assert strand_interface.reads_read == len(reads) #counted once although read twice
+        payload_reads = sum(f.pipe._strand_count for f in files)
+        payload_pipes = [f.pipe for f in files]
+        for pipeline in set(trims): #every read is trimmed once per header trim key, only the payload reads once more per payload key
+            assert trims.count(pipeline) == (payload_reads if pipeline in payload_pipes else len(reads))
+        noisy = []
+        for r in reads[:200]: #substitutions, reverse complements and reads without primers
+            dna = list(r.before_decode)
+            for _ in range(rng.randrange(4)): dna[rng.randrange(len(dna))] = rng.choice("ACGT")
+            dna = "".join(dna)
+            noisy.append(reverse_complement(dna) if rng.random()<0.3 else dna if rng.random()<0.8 else dna[30:-30])
+        pipeline = files[0].pipe
+        single = [BaseDNA(dna_strand=d) for d in noisy]
+        batch = [BaseDNA(dna_strand=d) for d in noisy]
+        kept = [pipeline.trim(s) for s in single]
+        assert pipeline.trim_batch(batch) == kept and 0<sum(kept)<len(kept)
+        assert [(s.dna_strand,s.is_reversed,s.orientation_known) for s in batch] == [(s.dna_strand,s.is_reversed,s.orientation_known) for s in single]
@@ -1,11 +1,16 @@
 from io import BytesIO
 import os
 import sys
+import gzip
+import tempfile
 from random import randint
 import unittest
 
 from dnastorage.codec.base_conversion import *
 from dnastorage.util.packetizedfile import *
+from dnastorage.util.strandinterface import BaseStrandInterface,Fast5Interface
+from dnastorage.util.file_compare import compare_files
+from dnastorage.util.stats import dnastats
 
 class packetizedfile_py_test(unittest.TestCase):
     """ test packetizedfile support. """
@@ -59,5 +64,65 @@ class stats_py_test(unittest.TestCase):
         assert stats["askdfjakjalk2"]==1
 
             
+
+class strandinterface_py_test(unittest.TestCase):
+    """ test streaming fastq/fasta parsing. """
+    def test_fastq(self):
+        ''' wrapped and gzipped records, U/N normalization '''
+        path = os.path.join(tempfile.mkdtemp(),"reads.fastq.gz")
+        with gzip.open(path,"wb") as fd:
+            fd.write(b"@r0 extra\nACGU\nNA\n+\n@@@@\n@@\n@r1\nACGT\n+r1\n!!!!\n")
+        interface = BaseStrandInterface.open("fastq",path)
+        batches = [[(s.record_id,s.dna_strand,s.is_RNA) for s in b] for b in interface.batches(1)]
+        assert batches == [[("r0","ACGTAA",True)],[("r1","ACGT",False)]]
+        assert interface.reads_read == 2
+        assert [s.dna_strand for s in interface.strands] == ["ACGTAA","ACGT"]
+
+    def test_fasta(self):
+        path = os.path.join(tempfile.mkdtemp(),"reads.fasta")
+        with open(path,"w") as fd:
+            fd.write(">r0\nACG\nTT\n>r1 x\nGGN\n")
+        assert [(s.record_id,s.dna_strand) for s in BaseStrandInterface.open("fasta",path)] == [("r0","ACGTT"),("r1","GGA")]
+
+    def test_fast5(self):
+        ''' fast5 directories load through the pool, quality scores and channel are read when first used '''
+        import h5py
+        import numpy as np
+        root = tempfile.mkdtemp()
+        for sub,reads in (("fast5_pass",("ACGU","GGU")),("fast5_fail",("CCA",))):
+            os.makedirs(os.path.join(root,sub))
+            with h5py.File(os.path.join(root,sub,"run.fast5"),"w") as fd:
+                for i,seq in enumerate(reads):
+                    group = fd.create_group("read_{}_{}".format(sub,i))
+                    group.create_dataset("Analyses/Basecall_1D_000/BaseCalled_template/Fastq",data=np.bytes_("@x\n{}\n+\n{}\n".format(seq,"!"*len(seq))))
+                    group.create_group("Raw").attrs["read_id"] = np.bytes_("{}_{}".format(sub,i))
+                    group.create_group("channel_id").attrs["channel_number"] = np.bytes_(str(i+5))
+        strands = BaseStrandInterface.open("fast5",root).strands
+        assert [(s.record_id,s.dna_strand) for s in strands] == [("fast5_fail_0","CCA"),("fast5_pass_0","ACGT"),("fast5_pass_1","GGT")]
+        assert not hasattr(strands[1],"_quality_scores")
+        assert (strands[1].quality_scores,strands[1].channel_id) == ("!!!!",5)
+        assert [s.dna_strand for s in Fast5Interface(root,processes=2).strands] == ["CCA","ACGT","GGT"]
+
+
+class file_compare_py_test(unittest.TestCase):
+    """ file comparison must agree with a byte by byte walk and place errors in their packets. """
+    def test_compare(self):
+        original = bytes(randint(0,255) for _ in range(1000))
+        decoded = bytearray(original[:950])
+        decoded[10] ^= 0x81
+        decoded[500] ^= 0x01
+        result = compare_files(bytes(decoded),original,packet_size=100)
+        mismatched = sum(1 for a,b in zip(decoded,original) if a!=b)
+        assert (result.compared_bytes,result.mismatched_bytes,result.size_difference,result.bit_errors) == (950,mismatched,50,3)
+        assert result.packet_errors.tolist() == [1,0,0,0,0,1,0,0,0,50]
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(original)
+            f.flush()
+            assert not compare_files(f.name,BytesIO(original)).error
+        collected = dnastats()
+        result.record(collected,"_after_fountain")
+        assert collected["error_after_fountain"] == 1 and collected["total_bit_errors_after_fountain"] == 3
+
+
 if __name__ == "__main__":
     unittest.main()
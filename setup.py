@@ -17,7 +17,19 @@ fasthedges = Extension('dnastorage.codec.fasthedges',
                        sources = ['dnastorage/codec/fasthedges/module.cpp', \
                                   'dnastorage/codec/fasthedges/fast_hedges.cpp'],
                       #extra_compile_args=["-std=c++11", "-Wall", "-Wextra","-O0",'-g3','-D DEBUG'],
-                      extra_compile_args=["-std=c++11", "-Wall", "-Wextra","-O3"],
+                      extra_compile_args=["-std=c++11", "-Wall", "-Wextra","-O3","-pthread"],
+                       extra_link_args=["-pthread"],
+                       language='c++',)
+
+fastrs = Extension('dnastorage.codec.fastrs',
+                   sources = ['dnastorage/codec/fastrs/module.cpp', \
+                              'dnastorage/codec/fastrs/fast_rs.cpp'],
+                   extra_compile_args=["-std=c++11", "-Wall", "-Wextra","-O3"],
+                   language='c++',)
+
+fastprimer = Extension('dnastorage.primer.fastprimer',
+                       sources = ['dnastorage/primer/fastprimer/module.cpp'],
+                       extra_compile_args=["-std=c++11", "-Wall", "-Wextra","-O3"],
                        language='c++',)
 
 generate = Extension('dnastorage.util.generate',                                                                                                                           
@@ -38,5 +50,5 @@ setup(
     url='',
     license=license,
     packages=find_packages(exclude=( 'tests','docs', 'tools', 'other_software')),
-    ext_modules = [fasthedges,generate]
+    ext_modules = [fasthedges,fastrs,fastprimer,generate]
 )
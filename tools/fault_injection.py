@@ -4,8 +4,8 @@ Main script for running fault injection analysis on different encoding architect
 import mpi4py
 from mpi4py import MPI
 from dnastorage.fi.fi_env import *
-from dnastorage.lt_codes_python.encode import encode_file
-from dnastorage.lt_codes_python.decode import decode_file
+from dnastorage.lt_codes_python.fountain import LTFountain
+from dnastorage.util.file_compare import compare_files
 import dnastorage.fi.dna_processes as dna_process
 from dnastorage.system.pipeline_dnafile import *
 from dnastorage.system.formats import *
@@ -52,29 +52,25 @@ def _monte_kernel(monte_start,monte_end,args,comm=None): #function that will run
     #We cant use the data_keeper object here, should be private per process, need data structures to propagate results back up to parent process
     results=[] #each element will be an object that encapsulates the entire statistics
     stats.clear()
-    strand_interface = BaseStrandInterface.open("array")
+    strand_interface = BaseStrandInterface.open("pool")
     encoding_params,header_params,strand_proc_dict,fault_args,dist_args,fi_env_args = get_param_files(args)
     header_data_path = os.path.join(args.out_dir,"header_pipeline{}.header".format(monte_end)) #binary data output for header of the header's pipeline
     payload_header_data_path = os.path.join(args.out_dir,"payload_pipeline{}.header".format(monte_end)) #binary data output for header of the payload pipeline
     #non-master ranks don't really need to encode
     if is_master(comm):
         
-        fountainless_file_size = os.path.getsize(args.file)
-        fountain_encode_basename = f"{os.path.basename(args.file)}{monte_end}.bin"
-
-        systematic_true = False
-        if encoding_params["systematic"] == 1:
-            systematic_true = True
-        if encoding_params["fountain_redundancy"] != 1:
-            file_blocks_n = encode_file(args.file, fountain_encode_basename, encoding_params["fountain_redundancy"], systematic_true, encoding_params["packet_size"], encoding_params["rs_size_fountain"])
-            file_to_fault_inject= open(fountain_encode_basename, "rb")
+        with open(args.file,"rb") as original_file:
+            fountainless_data = original_file.read()
+        packet_size = encoding_params.get("packet_size",1024) #granularity of the error position histograms
+
+        fountain = None
+        if encoding_params["fountain_redundancy"] != 1: #LT coding stays in memory, decoding reuses its droplet graph
+            fountain = LTFountain.from_params(encoding_params)
+            data_to_fault_inject = fountain.encode(fountainless_data)
             logger.info("fountain encoding finished")
         else:
-            file_to_fault_inject= open(args.file, "rb")
-        
-        file_to_fault_inject.seek(0,2)
-        file_to_inject_size=file_to_fault_inject.tell()
-        file_to_fault_inject.seek(0,0)
+            data_to_fault_inject = fountainless_data
+        file_to_inject_size=len(data_to_fault_inject)
         #we give the .dna to each instance, whether we actually write it, to make sure header data is consistent across runs
         base_file_path  = os.path.basename(args.file)
         if monte_end!=args.num_sims: 
@@ -88,7 +84,7 @@ def _monte_kernel(monte_start,monte_end,args,comm=None): #function that will run
                                              payload_header_filename = payload_header_data_path,do_write=True,dna_file_name=os.path.join(args.out_dir,"{}.dna".format(base_file_path)),
                                              store_header=args.store_header)
 
-        write_dna.write(file_to_fault_inject.read())
+        write_dna.write(data_to_fault_inject)
         write_dna.close()
         stats["total_encoded_strands"]=len(write_dna.strands)
         stats["header_strand_length"]=len(write_dna.strands[0].dna_strand) #header strands should be first
@@ -109,11 +105,9 @@ def _monte_kernel(monte_start,monte_end,args,comm=None): #function that will run
     stats.experiment_counter=monte_start
     for sim_number in range(monte_start,monte_end):
         logger.info("Monte Carlo Sim: {}".format(sim_number))
-        strands=None
         if is_master(comm):
             fault_environment.Run()
-            strands = fault_environment.get_strands()
-            strand_interface.strands=strands
+            strand_interface.pool=fault_environment.get_pool() #reads are copied out of the pool batch by batch while decoding
 
         read_dna = DNAFilePipeline.open("r",header_params=header_params,
                                         header_version=args.header_version,format_name=args.arch,encoder_params=encoding_params,
@@ -124,77 +118,17 @@ def _monte_kernel(monte_start,monte_end,args,comm=None): #function that will run
         if not is_master(comm): continue
         
         stats.inc("total_file_data_bytes",stats["file_size_bytes"])
-        stats.inc("total_strands_analyzed",len(fault_environment.get_strands()))
+        stats.inc("total_strands_analyzed",strand_interface.read_count)
         #calculate missing bytes
-        file_to_fault_inject.seek(0,0)
-        total_mismatch_data=0
-        length_fi_data=0
-        index=0
-        while True:
-            fi_data=read_dna.read(1)
-            if len(fi_data)==0: break
-            original_data=file_to_fault_inject.read(1)
-            if len(original_data)==0: break
-            length_fi_data+=1
-            index+=1
-            if fi_data==original_data:
-                continue
-            else:
-                total_mismatch_data+=1
-        stats.inc("total_mismatch_bytes",total_mismatch_data)
-        stats.inc("file_size_difference_bytes",abs(file_to_inject_size-length_fi_data))
-        if total_mismatch_data>0 or file_to_inject_size!=length_fi_data:
-            stats.inc("error",1)
-        else:
-            stats.inc("error",0)
+        read_dna.reset()
+        decoded_data = read_dna.read(-1)
+        compare_files(decoded_data,data_to_fault_inject,packet_size).record(stats)
         logger.info("Finished decoding erroneous file")
 
-        if encoding_params["fountain_redundancy"] != 1:
-
-            fountainless_file = open(args.file, "rb")
-            fountainless_file.seek(0,0)
-            total_mismatch_data=0
-            length_fi_data=0
-            index=0
-            fountain_to_decode_filename = f"{fountain_encode_basename}.{sim_number}.bin"
-            with open(fountain_to_decode_filename, "wb") as decoded_fountain_file: 
-                logger.info("starting to put fountain file in")
-                read_dna.reset()
-                while True:
-                    x = read_dna.read(1)
-                    if len(x) == 0:
-                        break
-                    decoded_fountain_file.write(x)
-                logger.info("finished writing fountain file in")
-
-            decoded_fountain_filename = f"{fountain_encode_basename}.{sim_number}.decoded.bin"
-
-            bol = decode_file(fountain_to_decode_filename, decoded_fountain_filename, file_blocks_n, fountainless_file_size, systematic_true, encoding_params["packet_size"], encoding_params["rs_size_fountain"])
-        
+        if fountain is not None:
+            fountain_decoded_data = fountain.decode(decoded_data)
             logger.info("finished decoding")
-            decodedFountain = open(decoded_fountain_filename, "rb")
-            decodedFountain.seek(0,0)
-            fountain_total_mismatch_data=0
-            fountain_length_fi_data=0
-            index=0
-            while True: #make comparision a function to use for before and after fountain
-                #check this while loop
-                fi_data=decodedFountain.read(1)
-                if len(fi_data)==0: break
-                original_data=fountainless_file.read(1)
-                if len(original_data)==0: break
-                fountain_length_fi_data+=1
-                index+=1
-                if fi_data==original_data:
-                    continue
-                else:
-                    fountain_total_mismatch_data+=1
-            stats.inc("total_mismatch_bytes_after_fountain",fountain_total_mismatch_data)
-            stats.inc("file_size_difference_bytes_after_fountain",abs(fountainless_file_size-fountain_length_fi_data))
-            if fountain_total_mismatch_data>0 or fountainless_file_size!=fountain_length_fi_data:
-                stats.inc("error_after_fountain",1)
-            else:
-                stats.inc("error_after_fountain",0)
+            compare_files(fountain_decoded_data,fountainless_data,packet_size).record(stats,"_after_fountain")
             logger.info("Finished decoding erroneous fountain file")
         else:
             logger.info("failed_fountain_decoding")
@@ -213,7 +147,6 @@ def _monte_kernel(monte_start,monte_end,args,comm=None): #function that will run
     if monte_end!=args.num_sims: #save last header data incase we want to keep it
         os.remove(header_data_path)
         os.remove(payload_header_data_path)
-    file_to_fault_inject.close()    
     return results
 
 
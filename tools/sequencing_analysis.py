@@ -51,6 +51,8 @@ if __name__=="__main__":
             if os.path.isfile(args.sequencing_data_path):
                 if ".fastq" in args.sequencing_data_path:
                     strand_interface = BaseStrandInterface.open("fastq",args.sequencing_data_path)
+                elif args.sequencing_data_path.endswith((".fasta",".fa",".fasta.gz",".fa.gz")):
+                    strand_interface = BaseStrandInterface.open("fasta",args.sequencing_data_path)
                 elif ".fast5" in args.sequencing_data_path:
                     strand_interface = BaseStrandInterface.open("fast5",args.sequencing_data_path)
             elif os.path.isdir(args.sequencing_data_path):
@@ -58,8 +60,6 @@ if __name__=="__main__":
         except Exception as e:
             logger.fatal("Could not find sequencing data: {}".format(e))
             exit(1)
-        stats["total_sequencing_strands"]=len(strand_interface.strands)
-        logger.info("Total Reads Read in {}".format(len(strand_interface.strands)))
     #At this point, we have sequencing data loaded into strand interface, now load dna file params to launch
     try:
         with open(args.dna_file_params,'rb') as param_file:
@@ -71,7 +71,8 @@ if __name__=="__main__":
 
     file_list = dna_file_params["file_list"]
     
-    for file_index,file_params in enumerate(dna_file_params["file_list"]): #Inner loop, allows for multiple encoders to analyze the sequencing data in one run, could be useful for multi-filed data sets
+    read_params=[]
+    for file_index,file_params in enumerate(dna_file_params["file_list"]): #allows for multiple encoders to analyze the sequencing data in one run, could be useful for multi-filed data sets
         #load up required values, throw exceptions as necessary
         try:
             arch = file_params["arch"]
@@ -92,17 +93,20 @@ if __name__=="__main__":
         except Exception as e:
             logger.fatal("Fatal issue in a file_params dictionary : {}".format(e))
             exit(1)
-        #Now, construct the DNA file and allow the decoder to run
-        logger.info("Analyzing File {} ".format(file_index))
-        read_dna = DNAFilePipeline.open("r",format_name=arch,header_params=header_params,
-                                        header_version=header_version,encoder_params=encoder_params,
-                                        fsmd_header_filename=header_header_file,file_barcode=barcode,
-                                        payload_header_filename = payload_header_file,mpi=world_comm,strand_interface=strand_interface)
+        read_params.append({"header_version":header_version,"header_params":header_params,"encoder_params":encoder_params,
+                            "fsmd_header_filename":header_header_file,"payload_header_filename":payload_header_file,"file_barcode":barcode})
 
-        #recoordinate strands
-        gather_strands=object_gather(read_dna.get_returned_strands(),world_comm)
-        strand_interface.strands=gather_strands
-        logger.info("Recoordinated strands")
+    #Now, construct the DNA files and let the decoders run, reads are routed to every file's header pipelines, then streamed again to the payload pipelines
+    logger.info("Analyzing {} Files".format(len(read_params)))
+    read_files,returned_strands = DNAFilePipeline.open_files(read_params,strand_interface,mpi=world_comm)
+    if is_master(world_comm): #reads are streamed from the sequencing data during decoding, so they are only counted now
+        stats["total_sequencing_strands"]=strand_interface.reads_read
+        logger.info("Total Reads Read in {}".format(strand_interface.reads_read))
+
+    #recoordinate strands
+    gather_strands=object_gather(returned_strands,world_comm)
+    strand_interface.strands=gather_strands
+    logger.info("Recoordinated strands")
         
     #merge together stats that were collecting during decoding for all processes
     logger.info("Gathering stats")